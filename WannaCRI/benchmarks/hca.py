@@ -0,0 +1,86 @@
+"""Times reading the header and frames of a full-length song's HCA.
+
+Compares iter_hca_frames, which reads frames in batches, with one read per
+frame, and times streaming the HCA as a Usm audio.
+
+Usage: python benchmarks/hca.py [seconds] [frame size]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from wannacri.usm import HCA, iter_hca_frames, read_hca_header
+from wannacri.usm.media.hca import COMP_BLOCK, FMT_BLOCK, HCA_HEADER
+
+SAMPLE_RATE = 48000
+SAMPLES_PER_FRAME = 1024
+
+
+def write_hca(path: str, frame_count: int, frame_size: int):
+    blocks = FMT_BLOCK.pack(
+        b"fmt\x00", 2, SAMPLE_RATE.to_bytes(3, "big"), frame_count, 0, 0
+    ) + COMP_BLOCK.pack(b"comp", frame_size, 1, 15, 1, 0, 128, 128, 0, 0, 0, 0)
+    header_size = 0x60
+    header = HCA_HEADER.pack(b"HCA\x00", 2, 0, header_size) + blocks + b"pad\x00"
+    frame = bytes(range(256)) * (frame_size // 256 + 1)
+    with open(path, "wb") as hca:
+        hca.write(header + bytes(header_size - len(header)))
+        for _ in range(frame_count):
+            hca.write(frame[:frame_size])
+
+
+def read_per_frame(path: str, header_size: int, frame_count: int, frame_size: int):
+    with open(path, "rb") as hca:
+        yield hca.read(header_size)
+        for _ in range(frame_count):
+            yield hca.read(frame_size)
+
+
+def best_time(function, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 180
+    frame_size = int(sys.argv[2], 0) if len(sys.argv) > 2 else 0x300
+    frame_count = round(seconds * SAMPLE_RATE / SAMPLES_PER_FRAME)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "song.hca")
+        write_hca(path, frame_count, frame_size)
+        header = read_hca_header(path)
+        size = os.path.getsize(path)
+        print(f"{frame_count} frames of {frame_size} bytes, {size / 1e6:.1f} MB")
+
+        results = [
+            ("header", best_time(lambda: read_hca_header(path), repeat=1000)),
+            (
+                "read per frame",
+                best_time(
+                    lambda: sum(
+                        map(len, read_per_frame(path, 0x60, frame_count, frame_size))
+                    )
+                ),
+            ),
+            (
+                "iter_hca_frames",
+                best_time(lambda: sum(map(len, iter_hca_frames(path, header)))),
+            ),
+            ("HCA stream", best_time(lambda: sum(map(len, HCA(path).stream())))),
+        ]
+
+    print(f"{'':>16} {'ms':>9} {'MB/s':>9}")
+    for name, elapsed in results:
+        throughput = "" if name == "header" else f"{size / elapsed / 1e6:>9.0f}"
+        print(f"{name:>16} {elapsed * 1e3:>9.3f} {throughput:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Times indexing and streaming all-intra VP9 ivfs of growing length.
+
+Every frame is a keyframe, so a keyframe lookup that scans a list makes
+the time per frame grow with the number of frames. With constant time
+lookups the time per frame stays flat.
+
+Usage: python benchmarks/keyframes.py [frames ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from wannacri.usm.media import Vp9
+from wannacri.usm.media.ivf import IVF_FILE_HEADER, IVF_FRAME_HEADER
+
+KEYFRAME = b"\x82" + bytes(15)
+
+
+def write_ivf(path: str, num_frames: int):
+    with open(path, "wb") as ivf:
+        ivf.write(
+            IVF_FILE_HEADER.pack(
+                b"DKIF", 0, IVF_FILE_HEADER.size, b"VP90", 64, 64, 30, 1, num_frames
+            )
+        )
+        for timestamp in range(num_frames):
+            ivf.write(IVF_FRAME_HEADER.pack(len(KEYFRAME), timestamp) + KEYFRAME)
+
+
+def run(num_frames: int) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "intra.ivf")
+        write_ivf(path, num_frames)
+
+        start = time.perf_counter()
+        video = Vp9(path)
+        keyframes = sum(is_keyframe for _, is_keyframe in video.stream())
+        elapsed = time.perf_counter() - start
+
+    assert keyframes == num_frames
+    return elapsed
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [2500, 5000, 10000, 20000]
+    print(f"{'frames':>8} {'seconds':>9} {'us/frame':>9}")
+    for num_frames in sizes:
+        elapsed = min(run(num_frames) for _ in range(3))
+        print(f"{num_frames:>8} {elapsed:>9.3f} {elapsed / num_frames * 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compares writing a USM in one pass with packing its stream section into a
+temporary file first, in bytes written and time.
+
+The temporary file holds the whole stream section, which is then copied into
+the USM, so the old path writes almost twice the size of the USM.
+
+Usage: python benchmarks/mux.py [frames] [frame size]
+"""
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from wannacri.usm import OpMode, Usm, Vp9
+from wannacri.usm import usm as usm_module
+from wannacri.usm.media.ivf import IVF_FILE_HEADER, IVF_FRAME_HEADER
+
+# Profile 0 VP9 frame headers: shown keyframe and shown inter frame
+KEYFRAME = b"\x82"
+INTER_FRAME = b"\x86"
+KEYFRAME_INTERVAL = 30
+
+
+class CountingFile:
+    """Counts the bytes written to a file."""
+
+    def __init__(self, file) -> None:
+        self.file = file
+        self.written = 0
+
+    def write(self, data) -> int:
+        written = self.file.write(data)
+        self.written += written
+        return written
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def write_ivf(path: str, num_frames: int, frame_size: int):
+    payload = bytes(range(256)) * (frame_size // 256 + 1)
+    with open(path, "wb") as ivf:
+        ivf.write(
+            IVF_FILE_HEADER.pack(
+                b"DKIF", 0, IVF_FILE_HEADER.size, b"VP90", 1920, 1080, 30, 1, num_frames
+            )
+        )
+        for timestamp in range(num_frames):
+            header = KEYFRAME if timestamp % KEYFRAME_INTERVAL == 0 else INTER_FRAME
+            ivf.write(IVF_FRAME_HEADER.pack(frame_size, timestamp))
+            ivf.write(header + payload[: frame_size - 1])
+
+
+def run(ivf_path: str, usm_path: str, one_pass: bool):
+    temporary_files = []
+
+    def counting_temporary_file(*args, **kwargs):
+        temporary_files.append(CountingFile(tempfile.TemporaryFile(*args, **kwargs)))
+        return temporary_files[-1]
+
+    with mock.patch.object(usm_module, "TemporaryFile", counting_temporary_file):
+        plan_stream = usm_module._plan_stream if one_pass else lambda *args: None
+        with mock.patch.object(usm_module, "_plan_stream", plan_stream):
+            usm = Usm(videos=[Vp9(ivf_path)], key=0x0123456789ABCDEF)
+            start = time.perf_counter()
+            with open(usm_path, "wb") as f:
+                usmfile = CountingFile(f)
+                usm.write(usmfile, OpMode.ENCRYPT)
+
+            elapsed = time.perf_counter() - start
+
+    written = usmfile.written + sum(f.written for f in temporary_files)
+    for f in temporary_files:
+        f.close()
+
+    return written, elapsed
+
+
+def main():
+    num_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    frame_size = int(sys.argv[2]) if len(sys.argv) > 2 else 0x4000
+
+    with tempfile.TemporaryDirectory() as directory:
+        ivf_path = os.path.join(directory, "video.ivf")
+        write_ivf(ivf_path, num_frames, frame_size)
+        usm_path = os.path.join(directory, "video.usm")
+
+        print(f"{num_frames} frames of {frame_size} bytes")
+        print(f"{'path':>14} {'MB written':>11} {'seconds':>9}")
+        results = {}
+        for name, one_pass in (("temporary file", False), ("one pass", True)):
+            written, elapsed = run(ivf_path, usm_path, one_pass)
+            results[name] = written
+            print(f"{name:>14} {written / 1e6:>11.1f} {elapsed:>9.3f}")
+
+        usm_size = os.path.getsize(usm_path)
+        print(f"USM size: {usm_size / 1e6:.1f} MB")
+        print(f"Written ratio: {results['one pass'] / results['temporary file']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Measures video and audio packet encryption and decryption throughput in MB/s
+at a few packet sizes, next to the per-byte loops they replaced.
+
+Usage: python benchmarks/xor.py [packet size ...]
+"""
+import random
+import sys
+import time
+
+from wannacri.usm.tools import (
+    decrypt_audio_packet,
+    decrypt_video_packet,
+    encrypt_audio_packet,
+    encrypt_video_packet,
+    generate_keys,
+)
+
+KEY = 0x0030D9E8
+# Bytes processed per measurement
+TOTAL_SIZE = 16 * 1024 * 1024
+# The per-byte loops are slow, so they get less data
+PER_BYTE_TOTAL_SIZE = 512 * 1024
+
+
+def per_byte_encrypt_video_packet(packet: bytes, video_key: bytes) -> bytes:
+    data = bytearray(packet)
+    if len(data) >= 0x240:
+        encrypted_part_size = len(data) - 0x40
+        rolling = bytearray(video_key)
+        for i in range(0x100):
+            rolling[i % 0x20] ^= data[0x140 + i]
+            data[0x40 + i] ^= rolling[i % 0x20]
+
+        for i in range(0x100, encrypted_part_size):
+            plainbyte = data[0x40 + i]
+            data[0x40 + i] ^= rolling[0x20 + i % 0x20]
+            rolling[0x20 + i % 0x20] = plainbyte ^ video_key[0x20 + i % 0x20]
+
+    return bytes(data)
+
+
+def per_byte_decrypt_video_packet(packet: bytes, video_key: bytes) -> bytes:
+    data = bytearray(packet)
+    encrypted_part_size = len(data) - 0x40
+    if encrypted_part_size >= 0x200:
+        rolling = bytearray(video_key)
+        for i in range(0x100, encrypted_part_size):
+            data[0x40 + i] ^= rolling[0x20 + i % 0x20]
+            rolling[0x20 + i % 0x20] = data[0x40 + i] ^ video_key[0x20 + i % 0x20]
+
+        for i in range(0x100):
+            rolling[i % 0x20] ^= data[0x140 + i]
+            data[0x40 + i] ^= rolling[i % 0x20]
+
+    return bytes(data)
+
+
+def per_byte_crypt_audio_packet(packet: bytes, key: bytes) -> bytes:
+    data = bytearray(packet)
+    if len(data) > 0x140:
+        for i in range(0x140, len(data)):
+            data[i] ^= key[i % 0x20]
+
+    return bytes(data)
+
+
+def throughput(crypt, packet: bytes, key: bytes, total_size: int) -> float:
+    count = max(1, total_size // len(packet))
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(count):
+            crypt(packet, key)
+        best = min(best, time.perf_counter() - start)
+
+    return count * len(packet) / best / 1e6
+
+
+def main():
+    sizes = [int(arg, 0) for arg in sys.argv[1:]] or [0x800, 0x10000, 0x100000]
+    video_key, audio_key = generate_keys(KEY)
+    functions = [
+        ("video encrypt", encrypt_video_packet, per_byte_encrypt_video_packet, video_key),
+        ("video decrypt", decrypt_video_packet, per_byte_decrypt_video_packet, video_key),
+        ("audio encrypt", encrypt_audio_packet, per_byte_crypt_audio_packet, audio_key),
+        ("audio decrypt", decrypt_audio_packet, per_byte_crypt_audio_packet, audio_key),
+    ]
+
+    rng = random.Random(0)
+    print(f"{'':>13} {'size':>8} {'MB/s':>9} {'per byte':>9} {'speedup':>8}")
+    for size in sizes:
+        packet = bytes(rng.getrandbits(8) for _ in range(size))
+        for name, crypt, per_byte_crypt, key in functions:
+            fast = throughput(crypt, packet, key, TOTAL_SIZE)
+            slow = throughput(per_byte_crypt, packet, key, PER_BYTE_TOTAL_SIZE)
+            print(f"{name:>13} {size:>#8x} {fast:>9.1f} {slow:>9.2f} {fast / slow:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import pytest
+
+from wannacri.usm.media.hca import (
+    COMM_BLOCK,
+    COMP_BLOCK,
+    FMT_BLOCK,
+    HCA_HEADER,
+    LOOP_BLOCK,
+)
+from wannacri.usm.media.ivf import IVF_FILE_HEADER, IVF_FRAME_HEADER
+
+# Profile 0 VP9 frame headers: shown keyframe and shown inter frame
+KEYFRAME = b"\x82" + bytes(15)
+INTER_FRAME = b"\x86" + bytes(15)
+
+
+@pytest.fixture
+def make_ivf(tmp_path):
+    """Writes a VP9 ivf of the given frames and returns its path."""
+
+    def make(frames, name="video.ivf"):
+        data = bytearray(
+            IVF_FILE_HEADER.pack(
+                b"DKIF", 0, IVF_FILE_HEADER.size, b"VP90", 64, 64, 30, 1, len(frames)
+            )
+        )
+        for timestamp, frame in enumerate(frames):
+            data += IVF_FRAME_HEADER.pack(len(frame), timestamp) + frame
+
+        path = tmp_path / name
+        path.write_bytes(bytes(data))
+        return path
+
+    return make
+
+
+def hca_frame(number, frame_size):
+    """Frame contents that differ between frames, so that order matters."""
+    return bytes((number + i) % 256 for i in range(frame_size))
+
+
+@pytest.fixture
+def make_hca(tmp_path):
+    """Writes a stereo 48kHz HCA of frame_count frames with a loop block and a
+    comment, so its header isn't the usual 96 bytes, and returns its path.
+    Frames are filled by hca_frame and aren't decodable."""
+
+    def make(frame_count, frame_size=0x200, comment="test", name="audio.hca"):
+        comment_bytes = comment.encode("UTF-8") + b"\x00"
+        blocks = (
+            FMT_BLOCK.pack(b"fmt\x00", 2, (48000).to_bytes(3, "big"), frame_count, 0, 0)
+            + COMP_BLOCK.pack(b"comp", frame_size, 1, 15, 1, 0, 128, 128, 0, 0, 0, 0)
+            + LOOP_BLOCK.pack(b"loop", 0, frame_count - 1, 0x80, 0x100)
+            + COMM_BLOCK.pack(b"comm", len(comment_bytes))
+            + comment_bytes
+        )
+        # The header ends with a crc16 which nothing here checks
+        header_size = HCA_HEADER.size + len(blocks) + 2
+        data = bytearray(HCA_HEADER.pack(b"HCA\x00", 2, 0, header_size) + blocks)
+        data += bytes(2)
+        for number in range(frame_count):
+            data += hca_frame(number, frame_size)
+
+        path = tmp_path / name
+        path.write_bytes(bytes(data))
+        return path
+
+    return make
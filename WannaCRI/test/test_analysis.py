@@ -0,0 +1,43 @@
+import shutil
+
+import pytest
+
+from conftest import INTER_FRAME, KEYFRAME
+from wannacri import build_usm
+from wannacri.usm import ChunkType, Usm, probe_keyframe
+from wannacri.usm.analysis import _keyframe_input
+from wannacri.usm.media import probe_ivf
+
+
+def build(make_ivf, tmp_path, frames):
+    path = make_ivf(frames)
+    return Usm.open(build_usm(str(path), out=str(tmp_path / "video.usm")))
+
+
+@pytest.mark.parametrize(
+    "frames, keyframe",
+    [
+        ([KEYFRAME, INTER_FRAME, INTER_FRAME], 0),
+        ([INTER_FRAME, INTER_FRAME, KEYFRAME, INTER_FRAME], 2),
+    ],
+)
+def test_keyframe_input_is_one_frame_ivf(make_ivf, tmp_path, frames, keyframe):
+    usm = build(make_ivf, tmp_path, frames)
+    data, input_format = _keyframe_input(usm, 0, ChunkType.VIDEO)
+    assert input_format == "ivf"
+
+    # Decode what ffprobe would get with the native ivf indexer
+    path = tmp_path / "keyframe.ivf"
+    path.write_bytes(data)
+    probe = probe_ivf(path)
+    assert len(probe["packets"]) == 1
+    assert probe["packets"][0]["flags"].startswith("K")
+    assert (probe["streams"][0]["width"], probe["streams"][0]["height"]) == (64, 64)
+    assert data.endswith(frames[keyframe])
+
+
+@pytest.mark.skipif(shutil.which("ffprobe") is None, reason="ffprobe not found")
+def test_probe_keyframe(make_ivf, tmp_path):
+    usm = build(make_ivf, tmp_path, [INTER_FRAME, KEYFRAME, INTER_FRAME])
+    probe = probe_keyframe(usm)
+    assert probe["streams"][0]["codec_name"] == "vp9"
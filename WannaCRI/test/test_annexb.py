@@ -0,0 +1,153 @@
+import shutil
+
+import pytest
+
+from wannacri.usm.media import is_h264_annexb, probe_h264, probe_packets
+from wannacri.usm.media.annexb import parse_sps, remove_emulation_prevention
+
+
+class BitWriter:
+    def __init__(self) -> None:
+        self.value = 0
+        self.length = 0
+
+    def bits(self, value: int, count: int) -> "BitWriter":
+        self.value = (self.value << count) | value
+        self.length += count
+        return self
+
+    def ue(self, value: int) -> "BitWriter":
+        code = value + 1
+        return self.bits(0, code.bit_length() - 1).bits(code, code.bit_length())
+
+    def rbsp(self) -> bytes:
+        """Payload with its stop bit and trailing zero bits."""
+        self.bits(1, 1)
+        padding = -self.length % 8
+        self.bits(0, padding)
+        return self.value.to_bytes(self.length // 8, "big")
+
+
+def add_emulation_prevention(payload: bytes) -> bytes:
+    out = bytearray()
+    zeros = 0
+    for byte in payload:
+        if zeros >= 2 and byte <= 3:
+            out.append(3)
+            zeros = 0
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return bytes(out)
+
+
+def baseline_sps() -> bytes:
+    """1920x1080 baseline SPS with 60000/1001 timing info."""
+    writer = BitWriter().bits(66, 8).bits(0x0028, 16).ue(0)
+    writer.ue(0).ue(2).ue(1).bits(0, 1)  # frame num, poc type, ref frames, gaps
+    writer.ue(119).ue(67).bits(1, 1).bits(1, 1)  # 120x68 macroblocks, frame only
+    writer.bits(1, 1).ue(0).ue(0).ue(0).ue(4)  # crop 8 rows off the bottom
+    writer.bits(1, 1)  # vui
+    writer.bits(0, 1).bits(0, 1).bits(0, 1).bits(0, 1)
+    writer.bits(1, 1).bits(1001, 32).bits(60000, 32).bits(1, 1)
+    return b"\x67" + add_emulation_prevention(writer.rbsp())
+
+
+def high_sps() -> bytes:
+    """1280x720 high profile SPS without vui."""
+    writer = BitWriter().bits(100, 8).bits(0x001F, 16).ue(0)
+    writer.ue(1).ue(0).ue(0).bits(0, 1).bits(0, 1)  # 4:2:0, 8 bit, no matrices
+    writer.ue(0).ue(0).ue(4)  # frame num, poc type 0, poc lsb
+    writer.ue(2).bits(0, 1)
+    writer.ue(79).ue(44).bits(1, 1).bits(1, 1)
+    writer.bits(0, 1).bits(0, 1)  # no cropping, no vui
+    return b"\x67" + add_emulation_prevention(writer.rbsp())
+
+
+PPS = b"\x68\xce\x3c\x80"
+SEI = b"\x06\x05\x01\xaa\x80"
+AUD = b"\x09\xf0"
+
+
+def slice_nal(nal_type: int, is_first: bool) -> bytes:
+    header = 0x60 | nal_type if nal_type == 5 else 0x40 | nal_type
+    # first_mb_in_slice is ue(0) "1" for the first slice and ue(1) "010" after
+    return bytes([header, 0x88 if is_first else 0x40]) + b"\xaa" * 30
+
+
+def write_stream(path, sps: bytes):
+    """Writes an H.264 stream, returning its access unit positions and
+    keyframe indexes."""
+    access_units = [
+        [sps, PPS, slice_nal(5, True), slice_nal(5, False)],
+        [slice_nal(1, True)],
+        [SEI, slice_nal(1, True), slice_nal(1, False)],
+        [AUD, slice_nal(5, True)],
+        [slice_nal(1, True)],
+    ]
+    keyframes = [0, 3]
+
+    data = bytearray()
+    positions = []
+    for index, nals in enumerate(access_units):
+        positions.append(len(data))
+        for number, nal in enumerate(nals):
+            # Four byte start codes at the start of odd access units
+            long = number == 0 and index % 2 == 1
+            data += (b"\x00\x00\x00\x01" if long else b"\x00\x00\x01") + nal
+
+    path.write_bytes(bytes(data))
+    return positions, keyframes
+
+
+@pytest.mark.parametrize(
+    "sps, expected",
+    [(baseline_sps(), (1920, 1080, "60000/2002")), (high_sps(), (1280, 720, None))],
+)
+def test_parse_sps(sps, expected):
+    assert parse_sps(sps) == expected
+
+
+def test_remove_emulation_prevention():
+    assert remove_emulation_prevention(b"\x00\x00\x03\x01\x05") == b"\x00\x00\x01\x05"
+
+
+@pytest.mark.parametrize("sps", [baseline_sps(), high_sps()])
+def test_probe_h264(tmp_path, sps):
+    path = tmp_path / "video.h264"
+    positions, keyframes = write_stream(path, sps)
+    width, height, framerate = parse_sps(sps)
+
+    assert is_h264_annexb(path)
+    probe = probe_h264(path)
+    stream = probe["streams"][0]
+    assert (stream["codec_name"], stream["width"], stream["height"]) == (
+        "h264",
+        width,
+        height,
+    )
+    assert stream["r_frame_rate"] == (framerate or "25/1")
+
+    packets = probe["packets"]
+    assert [int(packet["pos"]) for packet in packets] == positions
+    assert [i for i, p in enumerate(packets) if p["flags"][0] == "K"] == keyframes
+
+
+def test_not_annexb(tmp_path):
+    path = tmp_path / "video.ivf"
+    path.write_bytes(b"DKIF" + bytes(28))
+    assert not is_h264_annexb(path)
+
+
+@pytest.mark.skipif(shutil.which("ffprobe") is None, reason="ffprobe not found")
+def test_probe_h264_matches_ffprobe(tmp_path):
+    path = tmp_path / "video.h264"
+    write_stream(path, baseline_sps())
+
+    native = probe_h264(path)
+    probed = probe_packets(str(path))
+    video = next(s for s in probed["streams"] if s["codec_type"] == "video")
+    assert (video["width"], video["height"]) == (1920, 1080)
+    assert len(probed["packets"]) == len(native["packets"])
+    assert [p["flags"][0] == "K" for p in probed["packets"]] == [
+        p["flags"][0] == "K" for p in native["packets"]
+    ]
@@ -0,0 +1,147 @@
+import pytest
+
+from conftest import hca_frame
+from wannacri.usm import HCA, iter_hca_frames, parse_hca_header, read_hca_header
+from wannacri.usm.media import HcaLoop
+from wannacri.usm.media.hca import (
+    ATH_BLOCK,
+    CIPH_BLOCK,
+    COMM_BLOCK,
+    COMP_BLOCK,
+    DEC_BLOCK,
+    FMT_BLOCK,
+    HCA_HEADER,
+    LOOP_BLOCK,
+    RVA_BLOCK,
+    VBR_BLOCK,
+)
+
+
+def mask(data, offset):
+    """Sets the high bits of a block signature like encrypted HCAs do."""
+    data[offset : offset + 4] = bytes(byte | 0x80 for byte in data[offset : offset + 4])
+
+
+def test_parse_header(make_hca):
+    header = read_hca_header(make_hca(10, comment="a comment"))
+    assert header.version == (2, 0)
+    blocks = (FMT_BLOCK, COMP_BLOCK, LOOP_BLOCK, COMM_BLOCK)
+    # Blocks, the comment with its null byte, then the crc16
+    assert header.header_size == (
+        HCA_HEADER.size + sum(block.size for block in blocks) + len("a comment") + 1 + 2
+    )
+    assert (header.channel_count, header.sample_rate) == (2, 48000)
+    assert (header.frame_count, header.frame_size) == (10, 0x200)
+    assert (header.min_resolution, header.max_resolution) == (1, 15)
+    assert (header.total_band_count, header.base_band_count) == (128, 128)
+    assert header.loop == HcaLoop(0, 9, 0x80, 0x100)
+    assert header.comment == "a comment"
+    # Blocks that aren't there
+    assert header.ath_type == 0
+    assert header.cipher_type == 0
+    assert header.volume == 1.0
+    assert header.max_frame_size is None
+
+
+def test_parse_masked_header(make_hca):
+    data = bytearray(make_hca(10).read_bytes())
+    expected = parse_hca_header(data)
+    for offset in (0, HCA_HEADER.size, HCA_HEADER.size + FMT_BLOCK.size):
+        mask(data, offset)
+
+    assert parse_hca_header(data) == expected
+
+
+def test_parse_older_header():
+    blocks = (
+        FMT_BLOCK.pack(b"fmt\x00", 1, (44100).to_bytes(3, "big"), 4, 0x80, 0x20)
+        + DEC_BLOCK.pack(b"dec\x00", 0x100, 0, 15, 127, 63, 0x12, 1)
+        + VBR_BLOCK.pack(b"vbr\x00", 0x1FF, 3)
+        + ATH_BLOCK.pack(b"ath\x00", 0)
+        + CIPH_BLOCK.pack(b"ciph", 56)
+        + RVA_BLOCK.pack(b"rva\x00", 0.5)
+    )
+    # Padded to 0x60 bytes
+    data = bytearray(HCA_HEADER.pack(b"HCA\x00", 1, 3, 0x60) + blocks)
+    data += b"pad\x00"
+    data += bytes(0x60 - len(data))
+    mask(data, HCA_HEADER.size + FMT_BLOCK.size + DEC_BLOCK.size + VBR_BLOCK.size)
+
+    header = parse_hca_header(bytes(data))
+    assert header.version == (1, 3)
+    assert header.header_size == 0x60
+    assert (header.channel_count, header.sample_rate, header.frame_count) == (1, 44100, 4)
+    assert (header.inserted_samples, header.appended_samples) == (0x80, 0x20)
+    assert header.frame_size == 0x100
+    assert (header.total_band_count, header.base_band_count) == (128, 64)
+    assert (header.track_count, header.channel_config) == (1, 2)
+    assert (header.max_frame_size, header.noise_level) == (0x1FF, 3)
+    # The ath block overrides the default of versions before 2.0
+    assert header.ath_type == 0
+    assert header.cipher_type == 56
+    assert header.volume == 0.5
+    assert header.loop is None
+
+
+def test_parse_header_without_ath_block():
+    data = (
+        HCA_HEADER.pack(b"HCA\x00", 1, 3, 0x20)
+        + FMT_BLOCK.pack(b"fmt\x00", 1, (44100).to_bytes(3, "big"), 4, 0, 0)
+        + DEC_BLOCK.pack(b"dec\x00", 0x100, 0, 15, 127, 63, 0x12, 0)
+    )
+    header = parse_hca_header(data)
+    assert header.ath_type == 1
+    # Without a stereo type, every band is a base band
+    assert header.base_band_count == 128
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"RIFF" + bytes(0x60),
+        # Truncated
+        HCA_HEADER.pack(b"HCA\x00", 2, 0, 0x60) + bytes(0x20),
+        # Unknown block
+        HCA_HEADER.pack(b"HCA\x00", 2, 0, 0x10) + b"abc\x00" + bytes(4),
+        # No fmt block
+        HCA_HEADER.pack(b"HCA\x00", 2, 0, 0x10) + b"pad\x00" + bytes(4),
+    ],
+)
+def test_parse_invalid_header(data):
+    with pytest.raises(ValueError):
+        parse_hca_header(data)
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 25, 256])
+def test_iter_frames(make_hca, batch_size):
+    path = make_hca(25)
+    frames = list(iter_hca_frames(path, read_hca_header(path), batch_size))
+    assert frames == [hca_frame(number, 0x200) for number in range(25)]
+
+
+def test_iter_frames_of_truncated_file(make_hca):
+    path = make_hca(25)
+    header = read_hca_header(path)
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        list(iter_hca_frames(path, header))
+
+    with pytest.raises(ValueError):
+        list(iter_hca_frames(path, header, batch_size=0))
+
+
+def test_hca_packets(make_hca):
+    path = make_hca(25)
+    header = read_hca_header(path)
+    assert header.header_size != 96
+
+    audio = HCA(str(path))
+    assert len(audio) == 26
+    assert audio.packet_sizes == [header.header_size] + [0x200] * 25
+
+    packets = list(audio.stream())
+    # The whole header is the first packet
+    assert packets[0] == path.read_bytes()[: header.header_size]
+    assert packets[1:] == [hca_frame(number, 0x200) for number in range(25)]
+    assert [len(packet) for packet in packets] == audio.packet_sizes
@@ -0,0 +1,246 @@
+import mmap
+import os
+import pickle
+from collections import defaultdict
+
+import pytest
+
+from conftest import INTER_FRAME, KEYFRAME
+from wannacri import build_usm
+from wannacri.usm import (
+    ChunkType,
+    PayloadType,
+    Usm,
+    UsmChunk,
+    UsmIndex,
+    UsmIndexCache,
+)
+from wannacri.usm.page import SeekTable
+
+
+@pytest.fixture
+def usm_path(make_ivf, tmp_path):
+    path = make_ivf([KEYFRAME, INTER_FRAME, INTER_FRAME])
+    return build_usm(str(path), out=str(tmp_path / "video.usm"))
+
+
+def index_usm(path, encoding="UTF-8"):
+    with open(path, "rb") as usmfile:
+        return UsmIndex.from_file(usmfile, os.path.getsize(path), encoding)
+
+
+@pytest.fixture
+def av_usm_path(make_ivf, make_hca, tmp_path):
+    frames = [
+        (KEYFRAME if number % 4 == 0 else INTER_FRAME) + bytes(number * 0x30)
+        for number in range(12)
+    ]
+    return build_usm(
+        str(make_ivf(frames)),
+        str(make_hca(20)),
+        key=0x0123456789ABCDEF,
+        out=str(tmp_path / "av.usm"),
+    )
+
+
+def parse_chunks(path):
+    """Every chunk of a Usm along with the file offset of its payload."""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    chunks = []
+    offset = 0
+    while offset < len(data):
+        chunk_size = int.from_bytes(data[offset + 4 : offset + 8], "big")
+        payload_offset = data[offset + 9]
+        chunk = UsmChunk.from_bytes(data[offset : offset + 8 + chunk_size])
+        chunks.append((offset + 8 + payload_offset, chunk))
+        offset += 8 + chunk_size
+
+    return data, chunks
+
+
+def entry_files(cache):
+    return sorted(path.name for path in cache.directory.iterdir())
+
+
+def test_cache_hit(usm_path, tmp_path, monkeypatch):
+    cache = UsmIndexCache(tmp_path / "cache")
+    assert cache.get(usm_path) is None
+
+    with Usm.open(usm_path, index_cache=cache) as usm:
+        frames = list(usm.iter_frames(0))
+    assert len(entry_files(cache)) == 1
+
+    index = cache.get(usm_path)
+    assert list(index.videos[0].stream) == list(index_usm(usm_path).videos[0].stream)
+
+    def rescan(*args, **kwargs):
+        raise AssertionError("Indexed a cached usm")
+
+    monkeypatch.setattr(UsmIndex, "from_file", rescan)
+    with Usm.open(usm_path, index_cache=cache) as usm:
+        assert list(usm.iter_frames(0)) == frames
+
+
+def test_cache_is_per_encoding(usm_path, tmp_path):
+    cache = UsmIndexCache(tmp_path / "cache")
+    cache.put(usm_path, index_usm(usm_path))
+    assert cache.get(usm_path, "shift-jis") is None
+
+
+def test_cache_miss_after_mtime_change(usm_path, tmp_path):
+    cache = UsmIndexCache(tmp_path / "cache")
+    cache.put(usm_path, index_usm(usm_path))
+
+    stat = os.stat(usm_path)
+    os.utime(usm_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.get(usm_path) is None
+
+
+def test_cache_miss_after_size_change(usm_path, tmp_path):
+    cache = UsmIndexCache(tmp_path / "cache")
+    cache.put(usm_path, index_usm(usm_path))
+
+    stat = os.stat(usm_path)
+    with open(usm_path, "ab") as usmfile:
+        usmfile.write(bytes(0x20))
+    os.utime(usm_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.get(usm_path) is None
+
+
+def test_cache_miss_on_other_version(usm_path, tmp_path):
+    cache = UsmIndexCache(tmp_path / "cache")
+    cache.put(usm_path, index_usm(usm_path))
+
+    newer = UsmIndexCache(tmp_path / "cache")
+    newer.VERSION = cache.VERSION + 1
+    assert newer.get(usm_path) is None
+
+
+@pytest.mark.parametrize(
+    "index",
+    [
+        # Truncated
+        None,
+        # Classes that were renamed or moved
+        b"cwannacri.usm.index\nMissingIndex\n.",
+        b"cwannacri.missing_module\nUsmIndex\n.",
+    ],
+)
+def test_cache_ignores_unreadable_entries(usm_path, tmp_path, index):
+    cache = UsmIndexCache(tmp_path / "cache")
+    cache.put(usm_path, index_usm(usm_path))
+    entry_path = cache.directory / entry_files(cache)[0]
+
+    data = pickle.dumps((cache.VERSION, cache._stamp(usm_path)))
+    entry_path.write_bytes(data if index is None else data + index)
+    assert cache.get(usm_path) is None
+
+    # Indexed again and replaced
+    with Usm.open(usm_path, index_cache=cache):
+        pass
+    assert cache.get(usm_path) is not None
+
+
+def test_cache_put_removes_temporary_file(usm_path, tmp_path):
+    cache = UsmIndexCache(tmp_path / "cache")
+    with pytest.raises(Exception):
+        # Lambdas can't be pickled
+        cache.put(usm_path, lambda: None)
+    assert entry_files(cache) == []
+
+
+def test_cache_evicts_least_recently_used(usm_path, tmp_path):
+    cache = UsmIndexCache(tmp_path / "cache", max_entries=2)
+    index = index_usm(usm_path)
+    # Entries are keyed by encoding too, so one usm can fill the cache
+    cache.put(usm_path, index, "a")
+    cache.put(usm_path, index, "b")
+    for second, encoding in enumerate(["a", "b"], 1):
+        os.utime(cache._entry_path(usm_path, encoding), ns=(0, second * 1_000_000_000))
+
+    assert cache.get(usm_path, "a") is not None
+    cache.put(usm_path, index, "c")
+    assert len(entry_files(cache)) == 2
+    assert cache.get(usm_path, "b") is None
+    assert cache.get(usm_path, "a") is not None
+    assert cache.get(usm_path, "c") is not None
+
+
+def test_cache_rejects_non_positive_max_entries(tmp_path):
+    with pytest.raises(ValueError):
+        UsmIndexCache(tmp_path, max_entries=0)
+
+
+def index_with_mmap(path):
+    with open(path, "rb") as usmfile, mmap.mmap(
+        usmfile.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        with memoryview(data) as view:
+            return UsmIndex.from_file(view, os.path.getsize(path))
+
+
+@pytest.mark.parametrize("make_index", [index_usm, index_with_mmap])
+def test_index_matches_full_parse(av_usm_path, make_index):
+    data, chunks = parse_chunks(av_usm_path)
+    index = make_index(av_usm_path)
+    channels = {
+        ChunkType.VIDEO: index.videos,
+        ChunkType.AUDIO: index.audios,
+        ChunkType.ALPHA: index.alphas,
+    }
+
+    streams = defaultdict(list)
+    crids = []
+    for payload_offset, chunk in chunks:
+        key = (chunk.chunk_type, chunk.channel_number)
+        if chunk.chunk_type is ChunkType.INFO:
+            crids.extend(chunk.payload)
+        elif chunk.payload_type is PayloadType.STREAM:
+            streams[key].append((payload_offset, bytes(chunk.payload)))
+        elif chunk.payload_type is PayloadType.HEADER:
+            header = channels[chunk.chunk_type][chunk.channel_number].header
+            assert header.dict == chunk.payload[0].dict
+        elif chunk.payload_type is PayloadType.METADATA:
+            channel = channels[chunk.chunk_type][chunk.channel_number]
+            if chunk.payload[0].name == SeekTable.PAGE_NAME:
+                expected = SeekTable.from_pages(chunk.payload)
+                assert list(channel.seek_table.ofs_byte) == list(expected.ofs_byte)
+                assert list(channel.seek_table.ofs_frmid) == list(expected.ofs_frmid)
+            else:
+                assert [page.dict for page in channel.metadata] == [
+                    page.dict for page in chunk.payload
+                ]
+
+    assert [page.dict for page in index.crids] == [page.dict for page in crids]
+    assert set(streams) == {
+        (chunk_type, number)
+        for chunk_type, numbered in channels.items()
+        for number, channel in numbered.items()
+        if len(channel) != 0
+    }
+    assert len(streams[ChunkType.VIDEO, 0]) == 12
+    for (chunk_type, number), payloads in streams.items():
+        channel = channels[chunk_type][number]
+        assert list(channel.offsets) == [offset for offset, _ in payloads]
+        # Reading payloads through the index gives the same bytes
+        assert [data[offset : offset + size] for offset, size in channel.stream] == [
+            payload for _, payload in payloads
+        ]
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_streams_read_through_index(av_usm_path, use_mmap):
+    _, chunks = parse_chunks(av_usm_path)
+    payloads = defaultdict(list)
+    for _, chunk in chunks:
+        if chunk.payload_type is PayloadType.STREAM:
+            payloads[chunk.chunk_type].append(bytes(chunk.payload))
+
+    with Usm.open(av_usm_path, encoding="shift-jis", use_mmap=use_mmap) as usm:
+        video = [bytes(packet) for packet, _ in usm.videos[0].stream()]
+        audio = [bytes(packet) for packet in usm.audios[0].stream()]
+
+    assert video == payloads[ChunkType.VIDEO]
+    assert audio == payloads[ChunkType.AUDIO]
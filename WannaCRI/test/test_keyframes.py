@@ -0,0 +1,20 @@
+from conftest import INTER_FRAME, KEYFRAME
+from wannacri.usm.media import Vp9
+
+
+def test_all_intra_keyframes(make_ivf):
+    path = make_ivf([KEYFRAME] * 10000)
+
+    video = Vp9(str(path))
+    assert isinstance(video.keyframes, frozenset)
+    assert video.keyframes == frozenset(range(10000))
+    assert all(is_keyframe for _, is_keyframe in video.stream())
+
+
+def test_keyframes_are_frame_indexes(make_ivf):
+    path = make_ivf([KEYFRAME if i % 30 == 0 else INTER_FRAME for i in range(100)])
+
+    video = Vp9(str(path))
+    assert video.keyframes == frozenset({0, 30, 60, 90})
+    flags = [is_keyframe for _, is_keyframe in video.stream()]
+    assert [i for i, is_keyframe in enumerate(flags) if is_keyframe] == [0, 30, 60, 90]
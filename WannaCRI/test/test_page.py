@@ -0,0 +1,183 @@
+import pytest
+
+from wannacri.usm import ElementType, UsmPage, get_pages, pack_pages
+from wannacri.usm.page import SeekTable
+
+VALUES = {
+    "i8": (ElementType.I8, [5, 127, 0]),
+    "u8": (ElementType.U8, [200, 0, 255]),
+    "i16": (ElementType.I16, [-300, 32767, 0]),
+    "u16": (ElementType.U16, [60000, 1, 0]),
+    "i32": (ElementType.I32, [-70000, 2**31 - 1, 0]),
+    "u32": (ElementType.U32, [4_000_000_000, 1, 0]),
+    "i64": (ElementType.I64, [-(2**40), 2**63 - 1, 0]),
+    "u64": (ElementType.U64, [2**63 + 1, 1, 0]),
+    "f32": (ElementType.F32, [1.5, -0.25, 0.0]),
+    "string": (ElementType.STRING, ["ムービー", "", "a/b.ivf"]),
+    "bytes": (ElementType.BYTES, [bytearray(b"\x00\x01\x02"), bytearray(), bytearray(b"x")]),
+}
+
+
+def make_pages(num_pages, recurring=()):
+    pages = []
+    for i in range(num_pages):
+        page = UsmPage("CRIUSF_DIR_STREAM")
+        for name, (element_type, values) in VALUES.items():
+            page.update(name, element_type, values[0 if name in recurring else i])
+        pages.append(page)
+
+    return pages
+
+
+@pytest.mark.parametrize("encoding", ["UTF-8", "shift-jis"])
+@pytest.mark.parametrize(
+    "num_pages, recurring",
+    [(1, ()), (3, ()), (3, tuple(VALUES)), (3, ("u8", "f32", "string", "bytes"))],
+)
+def test_round_trip(encoding, num_pages, recurring):
+    pages = make_pages(num_pages, recurring)
+    packed = pack_pages(pages, encoding)
+
+    unpacked = get_pages(bytearray(packed), encoding)
+    assert [page.name for page in unpacked] == [page.name for page in pages]
+    assert [page.dict for page in unpacked] == [page.dict for page in pages]
+    assert pack_pages(unpacked, encoding) == packed
+
+
+@pytest.mark.parametrize("name", list(VALUES))
+def test_round_trip_per_element_type(name):
+    element_type, values = VALUES[name]
+    pages = []
+    for value in values:
+        page = UsmPage("CRIUSF_DIR_STREAM")
+        page.update(name, element_type, value)
+        pages.append(page)
+
+    assert [page[name] for page in get_pages(bytearray(pack_pages(pages, "UTF-8")))] == [
+        page[name] for page in pages
+    ]
+
+
+def test_recurring_values_are_stored_once():
+    shared = pack_pages(make_pages(3, tuple(VALUES)), "UTF-8")
+    unique = pack_pages(make_pages(3), "UTF-8")
+    assert len(shared) < len(unique)
+    # One page's worth of numbers in the unique array per page
+    assert int.from_bytes(shared[26:28], "big") == 0
+
+
+def test_string_table_follows_element_order():
+    packed = pack_pages(make_pages(1), "UTF-8")
+    names = [packed.index(name.encode() + b"\x00") for name in VALUES]
+    assert names == sorted(names)
+
+
+def test_filename_uses_forward_slashes():
+    page = UsmPage("CRIUSF_DIR_STREAM")
+    page.update("filename", ElementType.STRING, "a\\b.ivf")
+    assert page["filename"].val == "a/b.ivf"
+
+    # Written by another tool
+    page.dict["filename"] = page["filename"]._replace(val="c\\d.ivf")
+    assert get_pages(bytearray(pack_pages([page], "UTF-8")))[0]["filename"].val == "c/d.ivf"
+
+
+def test_pack_rejects_unsupported_element_types():
+    page = UsmPage("CRIUSF_DIR_STREAM")
+    page.update("f64", ElementType.F64, 1.0)
+    with pytest.raises(ValueError):
+        pack_pages([page], "UTF-8")
+
+
+def test_pack_rejects_mismatched_pages():
+    first, second = make_pages(2)
+    second.update("extra", ElementType.U8, 1)
+    with pytest.raises(ValueError):
+        pack_pages([first, second], "UTF-8")
+
+    with pytest.raises(ValueError):
+        pack_pages([first, UsmPage("VIDEO_SEEKINFO", dict(first.dict))], "UTF-8")
+
+
+def test_get_pages_rejects_other_data():
+    with pytest.raises(ValueError):
+        get_pages(bytearray(b"CRID" + bytes(28)))
+
+
+def make_seek_table():
+    return SeekTable(
+        ofs_byte=[0x800, 0x4000, 0x9000, 0xC000],
+        ofs_frmid=[5, 30, 60, 90],
+        num_skip=[0, 0, 0, 0],
+        resv=[0, 0, 0, 0],
+    )
+
+
+def seek_columns(table):
+    return [list(getattr(table, name)) for name in SeekTable.DEFAULT_ELEMENT_TYPES]
+
+
+@pytest.mark.parametrize("length", [1, 4])
+def test_seek_table_round_trip(length):
+    table = make_seek_table()
+    table = SeekTable(*[column[:length] for column in seek_columns(table)])
+    packed = table.pack()
+    # Same as packing its pages
+    assert packed == pack_pages(table.to_pages(), "UTF-8")
+
+    loaded = SeekTable.from_bytes(bytearray(packed))
+    assert seek_columns(loaded) == seek_columns(table)
+    assert loaded.element_types == table.element_types
+    assert loaded.pack() == packed
+
+    from_pages = SeekTable.from_pages(get_pages(bytearray(packed)))
+    assert seek_columns(from_pages) == seek_columns(table)
+
+
+def test_seek_table_keeps_element_types():
+    element_types = dict(SeekTable.DEFAULT_ELEMENT_TYPES, ofs_frmid=ElementType.I32)
+    table = SeekTable([0x800], [0], element_types=element_types)
+    packed = table.pack()
+    assert SeekTable.from_bytes(bytearray(packed)).element_types == element_types
+    assert get_pages(bytearray(packed))[0]["ofs_frmid"].type is ElementType.I32
+
+
+def test_seek_table_find():
+    table = make_seek_table()
+    assert table.find(5) == (5, 0x800)
+    assert table.find(29) == (5, 0x800)
+    assert table.find(30) == (30, 0x4000)
+    assert table.find(89) == (60, 0x9000)
+    assert table.find(1000) == (90, 0xC000)
+    assert table.keyframes == frozenset([5, 30, 60, 90])
+
+
+def test_seek_table_find_before_first_keyframe():
+    table = make_seek_table()
+    with pytest.raises(ValueError):
+        table.find(4)
+    with pytest.raises(ValueError):
+        SeekTable().find(0)
+
+
+def test_seek_table_shift():
+    table = make_seek_table()
+    table.shift(0x100)
+    assert list(table.ofs_byte) == [0x900, 0x4100, 0x9100, 0xC100]
+    assert table.find(45) == (30, 0x4100)
+    assert list(SeekTable.from_bytes(bytearray(table.pack())).ofs_byte) == list(
+        table.ofs_byte
+    )
+
+
+def test_seek_table_rejects_other_pages():
+    with pytest.raises(ValueError):
+        SeekTable.from_bytes(bytearray(pack_pages(make_pages(2), "UTF-8")))
+
+    page = UsmPage("VIDEO_SEEKINFO")
+    page.update("ofs_byte", ElementType.STRING, "0")
+    with pytest.raises(ValueError):
+        SeekTable.from_bytes(bytearray(pack_pages([page], "UTF-8")))
+
+    with pytest.raises(ValueError):
+        SeekTable([0], [0, 1])
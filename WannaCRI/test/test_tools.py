@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from wannacri.usm.tools import (
+    _audio_key_tile,
+    _xor_scan,
+    decrypt_audio_packet,
+    decrypt_video_packet,
+    encrypt_audio_packet,
+    encrypt_video_packet,
+    generate_keys,
+)
+
+KEY = 0x0030D9E8
+# Below, at and around the 0x240 and 0x140 thresholds, and a few whole packets
+SIZES = [0, 0x13F, 0x140, 0x141, 0x23F, 0x240, 0x241, 0x260, 0x261, 0x800, 0x1F3D]
+
+
+def reference_decrypt_video_packet(packet: bytes, video_key: bytes) -> bytes:
+    """Per-byte implementation the vectorized one replaced."""
+    data = bytearray(packet)
+    encrypted_part_size = len(data) - 0x40
+    if encrypted_part_size >= 0x200:
+        rolling = bytearray(video_key)
+        for i in range(0x100, encrypted_part_size):
+            data[0x40 + i] ^= rolling[0x20 + i % 0x20]
+            rolling[0x20 + i % 0x20] = data[0x40 + i] ^ video_key[0x20 + i % 0x20]
+
+        for i in range(0x100):
+            rolling[i % 0x20] ^= data[0x140 + i]
+            data[0x40 + i] ^= rolling[i % 0x20]
+
+    return bytes(data)
+
+
+def reference_encrypt_video_packet(packet: bytes, video_key: bytes) -> bytes:
+    data = bytearray(packet)
+    if len(data) >= 0x240:
+        encrypted_part_size = len(data) - 0x40
+        rolling = bytearray(video_key)
+        for i in range(0x100):
+            rolling[i % 0x20] ^= data[0x140 + i]
+            data[0x40 + i] ^= rolling[i % 0x20]
+
+        for i in range(0x100, encrypted_part_size):
+            plainbyte = data[0x40 + i]
+            data[0x40 + i] ^= rolling[0x20 + i % 0x20]
+            rolling[0x20 + i % 0x20] = plainbyte ^ video_key[0x20 + i % 0x20]
+
+    return bytes(data)
+
+
+def reference_crypt_audio_packet(packet: bytes, key: bytes) -> bytes:
+    data = bytearray(packet)
+    if len(data) > 0x140:
+        for i in range(0x140, len(data)):
+            data[i] ^= key[i % 0x20]
+
+    return bytes(data)
+
+
+def random_bytes(size: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+
+@pytest.mark.parametrize("stride", [1, 0x20])
+@pytest.mark.parametrize("size", [0x20, 0x40, 0x100, 0x101, 0x7E3])
+def test_xor_scan(stride, size):
+    data = random_bytes(size, size)
+    expected = bytearray(data)
+    for i in range(stride, size):
+        expected[i] ^= expected[i - stride]
+
+    result = _xor_scan(int.from_bytes(data, "big"), stride, size)
+    assert result.to_bytes(size, "big") == bytes(expected)
+
+
+@pytest.mark.parametrize("size", [1, 0x1F, 0x20, 0x21, 0x6C0])
+def test_audio_key_tile(size):
+    _, audio_key = generate_keys(KEY)
+    expected = bytes(audio_key[i % 0x20] for i in range(size))
+    assert _audio_key_tile(audio_key, size).to_bytes(size, "big") == expected
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_video_packet(size):
+    video_key, _ = generate_keys(KEY)
+    packet = random_bytes(size, size)
+
+    encrypted = encrypt_video_packet(packet, video_key)
+    assert encrypted == reference_encrypt_video_packet(packet, video_key)
+    assert decrypt_video_packet(encrypted, video_key) == packet
+    assert decrypt_video_packet(packet, video_key) == reference_decrypt_video_packet(
+        packet, video_key
+    )
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_audio_packet(size):
+    _, audio_key = generate_keys(KEY)
+    packet = random_bytes(size, size)
+
+    encrypted = encrypt_audio_packet(packet, audio_key)
+    assert encrypted == reference_crypt_audio_packet(packet, audio_key)
+    assert decrypt_audio_packet(encrypted, audio_key) == packet
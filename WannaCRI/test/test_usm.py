@@ -0,0 +1,181 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import INTER_FRAME, KEYFRAME, hca_frame
+from wannacri import build_usm
+from wannacri.usm import HCA, ChunkType, OpMode, Usm, Vp9
+
+KEY = 0x0123456789ABCDEF
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def usm_path(make_ivf, tmp_path):
+    path = make_ivf([KEYFRAME, INTER_FRAME, INTER_FRAME])
+    return build_usm(str(path), out=str(tmp_path / "video.usm"))
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_close(usm_path, use_mmap):
+    with Usm.open(usm_path, use_mmap=use_mmap) as usm:
+        frame = usm.read_frame(0, 0)
+
+    with pytest.raises(ValueError):
+        usm.read_frame(0, 0)
+    # Closing twice is fine
+    usm.close()
+
+    # Nothing holds the file anymore, so it can be replaced
+    os.replace(usm_path, usm_path + ".moved")
+    with Usm.open(usm_path + ".moved", use_mmap=use_mmap) as moved:
+        assert moved.read_frame(0, 0) == frame
+
+
+def test_close_with_live_payload_view(usm_path):
+    usm = Usm.open(usm_path, use_mmap=True)
+    payload, _ = next(usm.videos[0].stream())
+    usm.close()
+    assert bytes(payload)[:4] == b"DKIF"
+
+
+@pytest.fixture
+def media_paths(make_ivf, make_hca):
+    # Large enough to be encrypted, ending with their frame number
+    frames = [
+        (KEYFRAME if number % 10 == 0 else INTER_FRAME)
+        + bytes(0x240 + number * 7)
+        + bytes([number])
+        for number in range(40)
+    ]
+    return make_ivf(frames), make_hca(60)
+
+
+def write_usm(media_paths, key=None, **kwargs):
+    ivf_path, hca_path = media_paths
+    usm = Usm(videos=[Vp9(str(ivf_path))], audios=[HCA(str(hca_path))], key=key)
+    usmfile = io.BytesIO()
+    mode = OpMode.NONE if key is None else OpMode.ENCRYPT
+    written = usm.write(usmfile, mode, encoding="shift-jis", **kwargs)
+    assert written == len(usmfile.getvalue())
+    return usmfile.getvalue()
+
+
+@pytest.mark.parametrize("key", [None, KEY])
+@pytest.mark.parametrize("workers, batch_size", [(1, 64), (2, 1), (3, 2), (2, 7)])
+def test_write_with_workers(media_paths, tmp_path, key, workers, batch_size):
+    expected = write_usm(media_paths, key)
+    assert write_usm(media_paths, key, workers=workers, batch_size=batch_size) == expected
+
+    if key is None:
+        return
+
+    # Packets are in order and decrypt back to the original media
+    path = tmp_path / "encrypted.usm"
+    path.write_bytes(expected)
+    with Usm.open(str(path), key=key, encoding="shift-jis") as usm:
+        assert [frame[-1] for frame in usm.iter_frames(0)] == list(range(40))
+        # HCA numbers its channel by its channel count
+        audio = list(usm.iter_frames(2, chunk_type=ChunkType.AUDIO))
+    assert audio[1:] == [hca_frame(number, 0x200) for number in range(60)]
+
+
+@pytest.mark.parametrize("key", [None, KEY])
+def test_one_pass_matches_temporary_file(media_paths, monkeypatch, key):
+    one_pass = write_usm(media_paths, key)
+
+    # Without a layout the stream section is packed into a temporary file first
+    monkeypatch.setattr("wannacri.usm.usm._plan_stream", lambda *args: None)
+    assert write_usm(media_paths, key) == one_pass
+
+
+def test_write_is_independent_of_hash_seed(media_paths):
+    ivf_path, hca_path = media_paths
+    script = (
+        "import sys; from wannacri.usm import HCA, Usm, Vp9\n"
+        "usm = Usm(videos=[Vp9(sys.argv[1])], audios=[HCA(sys.argv[2])])\n"
+        "usm.write(sys.stdout.buffer, encoding='shift-jis')\n"
+    )
+    outputs = [
+        subprocess.run(
+            [sys.executable, "-c", script, str(ivf_path), str(hca_path)],
+            check=True,
+            stdout=subprocess.PIPE,
+            env={**os.environ, "PYTHONHASHSEED": seed, "PYTHONPATH": ROOT},
+        ).stdout
+        for seed in ("1", "2")
+    ]
+    assert outputs[0] == outputs[1] == write_usm(media_paths)
+
+
+@pytest.fixture
+def encrypted_usm_path(media_paths, tmp_path):
+    path = tmp_path / "encrypted.usm"
+    path.write_bytes(write_usm(media_paths, KEY))
+    return str(path)
+
+
+def frame_numbers(usm, *args, **kwargs):
+    return [frame[-1] for frame in usm.iter_frames(0, *args, **kwargs)]
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_read_frame(encrypted_usm_path, use_mmap):
+    with Usm.open(
+        encrypted_usm_path, key=KEY, encoding="shift-jis", use_mmap=use_mmap
+    ) as usm:
+        frames = list(usm.iter_frames(0))
+        for index in (17, 3, 39, 0, 20):
+            assert usm.read_frame(0, index) == frames[index]
+            assert usm.read_frame(0, index)[-1] == index
+
+        assert usm.read_frame(0, -1) == frames[39]
+        assert usm.read_frame(2, 5, ChunkType.AUDIO) == hca_frame(4, 0x200)
+
+        for index in (40, -41):
+            with pytest.raises(IndexError):
+                usm.read_frame(0, index)
+        with pytest.raises(ValueError):
+            usm.read_frame(1, 0)
+
+
+def test_iter_frames_slices(encrypted_usm_path):
+    with Usm.open(encrypted_usm_path, key=KEY, encoding="shift-jis") as usm:
+        assert frame_numbers(usm, 5, 9) == [5, 6, 7, 8]
+        assert frame_numbers(usm, -3) == [37, 38, 39]
+        assert frame_numbers(usm, 38, 100) == [38, 39]
+        assert frame_numbers(usm, 10, 10) == []
+
+
+def test_iter_frames_from_keyframe(encrypted_usm_path):
+    with Usm.open(encrypted_usm_path, key=KEY, encoding="shift-jis") as usm:
+        seek_table = usm.videos[0].seek_table
+        assert seek_table.keyframes == frozenset([0, 10, 20, 30])
+
+        # Every seek table offset is the start of the keyframe's chunk
+        with open(encrypted_usm_path, "rb") as f:
+            data = f.read()
+        with Usm.open(encrypted_usm_path, encoding="shift-jis") as encrypted:
+            for frame, offset in zip(seek_table.ofs_frmid, seek_table.ofs_byte):
+                packet = encrypted.read_frame(0, frame)
+                assert packet != usm.read_frame(0, frame)
+                assert data[offset : offset + 4] == b"@SFV"
+                assert data.index(packet, offset) == offset + 0x20
+
+        assert frame_numbers(usm, 25, 28, from_keyframe=True) == list(range(20, 28))
+        assert frame_numbers(usm, 20, 22, from_keyframe=True) == [20, 21]
+        assert frame_numbers(usm, 9, 11, from_keyframe=True) == list(range(11))
+        assert frame_numbers(usm, -1, from_keyframe=True) == list(range(30, 40))
+
+        with pytest.raises(ValueError):
+            list(usm.iter_frames(2, chunk_type=ChunkType.AUDIO, from_keyframe=True))
+
+
+def test_frames_need_a_loaded_usm(media_paths):
+    ivf_path, _ = media_paths
+    usm = Usm(videos=[Vp9(str(ivf_path))])
+    with pytest.raises(ValueError):
+        usm.read_frame(0, 0)
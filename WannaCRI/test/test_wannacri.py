@@ -0,0 +1,78 @@
+import sys
+
+import pytest
+
+from conftest import INTER_FRAME, KEYFRAME
+from wannacri import build_usm
+from wannacri.usm import Usm, rekey_usm
+from wannacri.wannacri import create_usm, encrypt_usm
+
+KEY = 0x0123456789ABCDEF
+OTHER_KEY = 0x0030D9E8
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """Runs a command line operation with the given arguments."""
+
+    def run_operation(operation, *args):
+        monkeypatch.setattr(sys, "argv", ["wannacri", *map(str, args)])
+        operation()
+
+    return run_operation
+
+
+def test_create_usm(make_ivf, run):
+    path = make_ivf([KEYFRAME, INTER_FRAME])
+    run(create_usm, "createusm", path)
+
+    with Usm.open(str(path.with_suffix(".dat"))) as usm:
+        assert len(list(usm.iter_frames(0))) == 2
+
+
+@pytest.mark.parametrize("output", ["out", "out/nested"])
+def test_create_usm_to_output(make_ivf, run, tmp_path, output):
+    path = make_ivf([KEYFRAME, INTER_FRAME])
+    run(create_usm, "createusm", path, "-o", tmp_path / output)
+
+    assert not path.with_suffix(".dat").exists()
+    with Usm.open(str(tmp_path / output / "video.dat")) as usm:
+        assert len(list(usm.iter_frames(0))) == 2
+
+
+@pytest.fixture
+def usm_paths(make_ivf, make_hca, tmp_path):
+    """Paths of a shift-jis USM with a Japanese file name, unencrypted and
+    encrypted with KEY and OTHER_KEY."""
+    frames = [KEYFRAME + bytes(0x300), INTER_FRAME + bytes(0x400), INTER_FRAME + bytes(0x10)]
+    video = str(make_ivf(frames, "動画.ivf"))
+    audio = str(make_hca(10))
+    paths = {}
+    for name, key in (("plain", None), ("key", KEY), ("other_key", OTHER_KEY)):
+        (tmp_path / name).mkdir()
+        paths[name] = build_usm(video, audio, key, out=str(tmp_path / name / "動画.usm"))
+
+    return paths
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_encrypt_usm(usm_paths, run, tmp_path):
+    run(encrypt_usm, "encryptusm", usm_paths["plain"], KEY, "-o", tmp_path)
+    assert read(tmp_path / "動画.usm") == read(usm_paths["key"])
+
+
+def test_rekey_usm_round_trip(usm_paths, run, tmp_path):
+    run(encrypt_usm, "encryptusm", usm_paths["plain"], KEY, "--rekey", "-o", tmp_path)
+    path = tmp_path / "動画.usm"
+    assert read(path) == read(usm_paths["key"])
+
+    # In place
+    run(encrypt_usm, "encryptusm", path, OTHER_KEY, "--rekey", "--old_key", KEY)
+    assert read(path) == read(usm_paths["other_key"])
+
+    rekey_usm(path, None, old_key=OTHER_KEY, encoding="shift-jis")
+    assert read(path) == read(usm_paths["plain"])
@@ -1,5 +1,7 @@
 from importlib.metadata import version, PackageNotFoundError
 from .wannacri import main
+from .create import build_usm
+from .codec import Sofdec2Codec
 
 try:
     __version__ = version("wannacri")
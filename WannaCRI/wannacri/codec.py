@@ -3,6 +3,8 @@ from __future__ import annotations
 from enum import Enum, auto
 import ffmpeg
 
+from .usm import is_vp9_ivf, is_h264_annexb
+
 
 class Sofdec2Codec(Enum):
     PRIME = auto()  # MPEG2
@@ -11,8 +13,16 @@ class Sofdec2Codec(Enum):
 
     @staticmethod
     def from_file(path: str, ffprobe_path: str = "ffprobe") -> Sofdec2Codec:
-        info = ffmpeg.probe(path, cmd=ffprobe_path)
+        if is_vp9_ivf(path):
+            return Sofdec2Codec.VP9
+        if is_h264_annexb(path):
+            return Sofdec2Codec.H264
 
+        return Sofdec2Codec.from_probe(ffmpeg.probe(path, cmd=ffprobe_path))
+
+    @staticmethod
+    def from_probe(info: dict) -> Sofdec2Codec:
+        """Detect the codec from the result of ffmpeg.probe."""
         if len(info.get("streams")) == 0:
             raise ValueError("File has no video streams.")
 
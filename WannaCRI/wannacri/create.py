@@ -0,0 +1,67 @@
+import os
+from typing import Optional
+
+from .codec import Sofdec2Codec
+from .usm import (
+    Usm,
+    OpMode,
+    Vp9,
+    H264,
+    HCA,
+    probe_packets,
+    is_vp9_ivf,
+    probe_ivf,
+    is_h264_annexb,
+    probe_h264,
+)
+
+
+def build_usm(
+    video_path: str,
+    audio_path: Optional[str] = None,
+    key: Optional[int] = None,
+    out: Optional[str] = None,
+    encoding: str = "shift-jis",
+    probe: Optional[dict] = None,
+    ffprobe_path: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> str:
+    """Creates a USM from a VP9 ivf or H.264 video and an optional HCA audio.
+    Encrypts the USM if given a key. Writes to out, or next to the video
+    with a .dat extension if not given, and returns the path written to.
+
+    probe is the video's packet listing and stream info, as returned by
+    probe_packets, probe_ivf, or probe_h264. Pass it when the video is
+    already probed so it isn't read twice. When omitted, VP9 ivfs and raw
+    H.264 streams are indexed natively and anything else is probed with
+    ffprobe, found at ffprobe_path or on PATH."""
+    if probe is None:
+        if is_vp9_ivf(video_path):
+            probe = probe_ivf(video_path)
+        elif is_h264_annexb(video_path):
+            probe = probe_h264(video_path)
+        else:
+            probe = probe_packets(video_path, ffprobe_path)
+
+    # TODO: Add support for more video codecs and audio codecs
+    codec = Sofdec2Codec.from_probe(probe)
+    if codec is Sofdec2Codec.VP9:
+        video = Vp9(video_path, probe=probe)
+    elif codec is Sofdec2Codec.H264:
+        video = H264(video_path, probe=probe)
+    else:
+        raise NotImplementedError("Non-Vp9/H.264 files are not yet implemented.")
+
+    audios = None
+    if audio_path is not None:
+        audios = [HCA(audio_path)]
+
+    if out is None:
+        out = os.path.splitext(video_path)[0] + ".dat"
+
+    usm = Usm(videos=[video], audios=audios, key=key)
+    mode = OpMode.NONE if key is None else OpMode.ENCRYPT
+    with open(out, "wb") as f:
+        usm.write(f, mode, encoding=encoding, workers=workers)
+
+    return out
@@ -11,6 +11,9 @@ from .tools import (
 from .page import UsmPage, get_pages, pack_pages
 from .usm import Usm
 from .chunk import UsmChunk
+from .index import UsmIndex, UsmIndexCache
+from .analysis import analyze_usm, probe_keyframe
+from .rekey import rekey_usm
 from .media import (
     UsmMedia,
     UsmVideo,
@@ -20,6 +23,15 @@ from .media import (
     Vp9,
     H264,
     HCA,
+    probe_packets,
+    is_vp9_ivf,
+    probe_ivf,
+    is_h264_annexb,
+    probe_h264,
+    HcaHeader,
+    parse_hca_header,
+    read_hca_header,
+    iter_hca_frames,
 )
 from .types import OpMode, ElementOccurrence, ElementType, PayloadType, ChunkType
 
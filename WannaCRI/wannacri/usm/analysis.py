@@ -0,0 +1,202 @@
+import json
+import subprocess
+from fractions import Fraction
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+
+import ffmpeg
+
+from .media import UsmAudio, UsmVideo
+from .media.ivf import IVF_FILE_HEADER
+from .page import UsmPage
+from .types import ChunkType
+from .usm import Usm
+
+# Values of mpeg_codec in VIDEO_HDRINFO pages
+VIDEO_CODECS = {1: "mpeg1", 5: "h264", 9: "vp9"}
+# Values of audio_codec in AUDIO_HDRINFO pages
+AUDIO_CODECS = {2: "adx", 4: "hca"}
+
+
+def analyze_usm(usm: Usm) -> dict:
+    """Describes the streams of a Usm from its crid and header pages and the
+    sizes of its stream payloads, without reading any payload. Gives each
+    video's codec, resolution, framerate, frame count, keyframe spacing, and
+    bitrate, each audio's codec and format, and the packet size statistics
+    of every stream."""
+    return {
+        "format_version": usm.version,
+        "videos": [analyze_video(video) for video in usm.videos],
+        "audios": [analyze_audio(audio) for audio in usm.audios],
+        "alphas": [analyze_video(alpha) for alpha in usm.alphas],
+    }
+
+
+def analyze_video(video: UsmVideo) -> dict:
+    """Describes a video of a Usm from its pages, packet sizes, and keyframes."""
+    header = video.header_page
+    codec = _page_value(header, "mpeg_codec")
+    framerate_n = _page_value(header, "framerate_n")
+    framerate_d = _page_value(header, "framerate_d")
+
+    framerate: Optional[Fraction] = None
+    if framerate_n and framerate_d:
+        framerate = Fraction(framerate_n, framerate_d)
+
+    info = {
+        "channel_number": video.channel_number,
+        "filename": _page_value(video.crid_page, "filename"),
+        "codec_name": VIDEO_CODECS.get(codec),
+        "mpeg_codec": codec,
+        "width": _page_value(header, "width"),
+        "height": _page_value(header, "height"),
+        "disp_width": _page_value(header, "disp_width"),
+        "disp_height": _page_value(header, "disp_height"),
+        "r_frame_rate": None
+        if framerate is None
+        else f"{framerate.numerator}/{framerate.denominator}",
+        "total_frames": _page_value(header, "total_frames"),
+        "nb_packets": len(video),
+        "avbps": _page_value(video.crid_page, "avbps"),
+    }
+
+    sizes = video.packet_sizes
+    if sizes is not None and framerate is not None and len(sizes) > 0:
+        duration = len(sizes) / framerate
+        info["duration"] = float(duration)
+        info["bit_rate"] = int(sum(sizes) * 8 / duration)
+
+    info["keyframes"] = keyframe_stats(video.keyframes)
+    info["packet_sizes"] = packet_size_stats(sizes)
+    return info
+
+
+def analyze_audio(audio: UsmAudio) -> dict:
+    """Describes an audio of a Usm from its pages and packet sizes."""
+    header = audio.header_page
+    codec = _page_value(header, "audio_codec")
+    return {
+        "channel_number": audio.channel_number,
+        "filename": _page_value(audio.crid_page, "filename"),
+        "codec_name": AUDIO_CODECS.get(codec),
+        "audio_codec": codec,
+        "sample_rate": _page_value(header, "sampling_rate"),
+        "channels": _page_value(header, "num_channels"),
+        "nb_packets": len(audio),
+        "avbps": _page_value(audio.crid_page, "avbps"),
+        "packet_sizes": packet_size_stats(audio.packet_sizes),
+    }
+
+
+def packet_size_stats(sizes: Optional[Sequence[int]]) -> Optional[dict]:
+    """Count, total, min, max, mean, and median of packet sizes in bytes.
+    Returns None if there are no sizes."""
+    if sizes is None or len(sizes) == 0:
+        return None
+
+    ordered = sorted(sizes)
+    middle = len(ordered) // 2
+    if len(ordered) % 2 == 1:
+        median: float = ordered[middle]
+    else:
+        median = (ordered[middle - 1] + ordered[middle]) / 2
+
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "total": total,
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": total / len(ordered),
+        "median": median,
+    }
+
+
+def keyframe_stats(keyframes: Optional[Collection[int]]) -> Optional[dict]:
+    """Count, first keyframe, and min, max, and mean number of frames between
+    consecutive keyframes. Returns None if there are no keyframes."""
+    if keyframes is None or len(keyframes) == 0:
+        return None
+
+    ordered = sorted(keyframes)
+    spacings = [after - before for before, after in zip(ordered, ordered[1:])]
+    stats: Dict[str, Optional[float]] = {
+        "count": len(ordered),
+        "first": ordered[0],
+        "min_spacing": None,
+        "max_spacing": None,
+        "mean_spacing": None,
+    }
+    if len(spacings) > 0:
+        stats["min_spacing"] = min(spacings)
+        stats["max_spacing"] = max(spacings)
+        stats["mean_spacing"] = sum(spacings) / len(spacings)
+
+    return stats
+
+
+def probe_keyframe(
+    usm: Usm,
+    channel: int = 0,
+    chunk_type: ChunkType = ChunkType.VIDEO,
+    ffprobe_path: Optional[str] = None,
+) -> dict:
+    """Runs ffprobe on the first keyframe of a video of a Usm loaded with open.
+    Only that frame is read from the Usm and it's given to ffprobe through
+    stdin, in an ivf for VP9 videos. Returns ffprobe's format and streams."""
+    frame, input_format = _keyframe_input(usm, channel, chunk_type)
+
+    args: List[str] = [
+        "ffprobe" if ffprobe_path is None else ffprobe_path,
+        "-show_format",
+        "-show_streams",
+        "-of",
+        "json",
+        "-f",
+        input_format,
+        "-",
+    ]
+    process = subprocess.run(args, input=frame, capture_output=True)
+    if process.returncode != 0:
+        raise ffmpeg.Error("ffprobe", process.stdout, process.stderr)
+
+    return json.loads(process.stdout.decode("utf-8"))
+
+
+def _keyframe_input(usm: Usm, channel: int, chunk_type: ChunkType) -> Tuple[bytes, str]:
+    """The first keyframe of a video as ffprobe input, and its format."""
+    videos = usm.alphas if chunk_type is ChunkType.ALPHA else usm.videos
+    video = next((v for v in videos if v.channel_number == channel), None)
+    if video is None:
+        raise ValueError(f"No {chunk_type} channel {channel}.")
+
+    keyframes = video.keyframes
+    first_keyframe = 0 if not keyframes else min(keyframes)
+    frame = usm.read_frame(channel, first_keyframe, chunk_type)
+
+    codec = VIDEO_CODECS.get(_page_value(video.header_page, "mpeg_codec"))
+    if codec == "vp9":
+        # VP9 payloads keep their ivf framing. The first frame starts with the
+        # ivf file header and every frame with its own frame header, so only
+        # later frames need a file header in front.
+        if frame[:4] != b"DKIF":
+            width = _page_value(video.header_page, "width") or 0
+            height = _page_value(video.header_page, "height") or 0
+            frame = (
+                IVF_FILE_HEADER.pack(
+                    b"DKIF", 0, IVF_FILE_HEADER.size, b"VP90", width, height, 1, 1, 1
+                )
+                + frame
+            )
+        return frame, "ivf"
+    if codec == "h264":
+        return frame, "h264"
+
+    raise ValueError(f"Unsupported video codec {codec}.")
+
+
+def _page_value(page: Optional[UsmPage], name: str):
+    if page is None:
+        return None
+
+    element = page.get(name)
+    return None if element is None else element.val
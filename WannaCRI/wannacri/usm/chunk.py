@@ -1,11 +1,20 @@
 from __future__ import annotations
 import logging
-from typing import List, Union, Callable
+import struct
+from typing import List, Optional, Union, Callable
 
 from .types import ChunkType, PayloadType
 from .page import UsmPage, pack_pages, get_pages
 from .tools import bytes_to_hex, is_payload_list_pages
 
+# The 0x20 byte header at the start of every chunk: signature, chunk size after
+# the first 8 bytes, r08, payload offset, padding size, channel number, r0D, r0E,
+# payload type, frame time, frame rate, r18 and r1C.
+CHUNK_HEADER = struct.Struct(">4sIBBHBBBBII4s4s")
+
+# Source of padding bytes for pack_into. Covers paddings up to a CD sector.
+_ZEROS = memoryview(bytes(0x800))
+
 
 class UsmChunk:
     def __init__(
@@ -57,27 +66,49 @@ class UsmChunk:
 
         return 0x20 + payload_size + padding
 
+    @property
+    def payload(self) -> Union[bytes, List[UsmPage]]:
+        """Raw payload or list of pages of the chunk. Pages of chunks created
+        with from_bytes are only parsed when this is first accessed."""
+        if self._page_data is not None:
+            self._payload = get_pages(bytearray(self._page_data), self.encoding)
+            self._page_data = None
+
+        return self._payload
+
+    @payload.setter
+    def payload(self, payload: Union[bytes, List[UsmPage]]):
+        self._payload = payload
+        self._page_data: Optional[Union[bytes, memoryview]] = None
+
     @classmethod
-    def from_bytes(cls, chunk: bytes, encoding: str = "UTF-8") -> UsmChunk:
-        """Initialise UsmChunk from raw bytes."""
-        chunk = bytearray(chunk)
+    def from_bytes(
+        cls, chunk: Union[bytes, memoryview], encoding: str = "UTF-8"
+    ) -> UsmChunk:
+        """Initialise UsmChunk from raw bytes. Stream payloads are kept as a
+        zero-copy memoryview of the given chunk and page payloads are parsed lazily."""
+        chunk = memoryview(chunk)
+        (
+            signature,
+            chunksize,
+            r08,
+            payload_offset,
+            padding_size,
+            channel_number,
+            r0D,
+            r0E,
+            payload_type_raw,
+            frame_time,
+            frame_rate,
+            r18,
+            r1C,
+        ) = CHUNK_HEADER.unpack_from(chunk)
+        is_debug = logging.root.isEnabledFor(logging.DEBUG)
+
         try:
-            chunk_type: Union[ChunkType, bytes] = ChunkType.from_bytes(chunk[:0x4])
+            chunk_type: Union[ChunkType, bytes] = ChunkType.from_bytes(signature)
         except ValueError:
-            chunk_type = chunk[:0x4]
-
-        chunksize = int.from_bytes(chunk[0x4:0x8], "big")
-        # r08: 1 byte
-        payload_offset = chunk[0x9]
-        padding_size = int.from_bytes(chunk[0xA:0xC], "big")
-        channel_number = chunk[0xC]
-        # r0D: 1 byte
-        # r0E: 1 byte
-
-        frame_time = int.from_bytes(chunk[0x10:0x14], "big")
-        frame_rate = int.from_bytes(chunk[0x14:0x18], "big")
-        # r18: 4 bytes
-        # r1C: 4 bytes
+            chunk_type = signature
 
         payload_begin = 0x08 + payload_offset
         payload_size = chunksize - padding_size - payload_offset
@@ -85,33 +116,36 @@ class UsmChunk:
 
         try:
             payload_type: Union[PayloadType, int] = PayloadType.from_int(
-                chunk[0xF] & 0x3
+                payload_type_raw & 0x3
             )
         except ValueError:
+            if is_debug:
+                logging.debug(
+                    "Chunk unknown payload",
+                    extra={"payload": bytes_to_hex(payload_raw)},
+                )
+            payload_type = payload_type_raw
+
+        if is_debug:
             logging.debug(
-                "Chunk unknown payload", extra={"payload": bytes_to_hex(payload_raw)}
+                "Chunk info",
+                extra={
+                    "type": chunk_type
+                    if isinstance(chunk_type, ChunkType)
+                    else bytes_to_hex(chunk_type),
+                    "chunksize_after_header": chunksize,
+                    "r08": r08,
+                    "payload_offset": payload_offset,
+                    "padding_size": padding_size,
+                    "channel_number": channel_number,
+                    "r0D_r0E": bytes_to_hex(bytes([r0D, r0E])),
+                    "payload_type": payload_type,
+                    "frame_time": frame_time,
+                    "frame_rate": frame_rate,
+                    "r18_r1B": bytes_to_hex(r18),
+                    "r1C_r1F": bytes_to_hex(r1C),
+                },
             )
-            payload_type = chunk[0xF]
-
-        logging.debug(
-            "Chunk info",
-            extra={
-                "type": chunk_type
-                if isinstance(chunk_type, ChunkType)
-                else bytes_to_hex(chunk_type),
-                "chunksize_after_header": chunksize,
-                "r08": chunk[0x8],
-                "payload_offset": payload_offset,
-                "padding_size": padding_size,
-                "channel_number": channel_number,
-                "r0D_r0E": bytes_to_hex(chunk[0xD:0xF]),
-                "payload_type": payload_type,
-                "frame_time": frame_time,
-                "frame_rate": frame_rate,
-                "r18_r1B": bytes_to_hex(chunk[0x18:0x1C]),
-                "r1C_r1F": bytes_to_hex(chunk[0x1C:0x20]),
-            },
-        )
 
         if not isinstance(chunk_type, ChunkType):
             raise ValueError(f"Invalid signature: {bytes_to_hex(chunk_type)}")
@@ -119,35 +153,43 @@ class UsmChunk:
         if not isinstance(payload_type, PayloadType):
             raise ValueError(f"Invalid payload type: {payload_type}")
 
-        if is_payload_list_pages(payload_raw[:4]):
-            payload: Union[List[UsmPage], bytearray] = get_pages(payload_raw, encoding)
-            logging.debug(
-                "Page list payload content",
-                extra={
-                    "page_name": payload[0].name if len(payload) > 0 else None,
-                    "num_entries": len(payload),
-                    "contents": [page.dict for page in payload],
-                },
-            )
-        else:
-            payload = payload_raw
-
-        return cls(
+        result = cls(
             chunk_type,
             payload_type,
-            payload,
+            payload_raw,
             frame_rate,
             frame_time=frame_time,
             padding=padding_size,
             channel_number=channel_number,
             payload_offset=payload_begin,
+            encoding=encoding,
         )
 
+        if is_payload_list_pages(payload_raw[:4]):
+            result._page_data = payload_raw
+            if is_debug:
+                pages = result.payload
+                logging.debug(
+                    "Page list payload content",
+                    extra={
+                        "page_name": pages[0].name if len(pages) > 0 else None,
+                        "num_entries": len(pages),
+                        "contents": [page.dict for page in pages],
+                    },
+                )
+
+        return result
+
     def pack(self) -> bytes:
         """Transform UsmChunk to raw bytes."""
-        result = bytearray()
-        result += self.chunk_type.value
+        result = bytearray(len(self))
+        self.pack_into(result)
+        return bytes(result)
 
+    def pack_into(self, buffer: Union[bytearray, memoryview], offset: int = 0) -> int:
+        """Pack UsmChunk into a writable buffer such as a bytearray or a mmap,
+        starting at offset. The buffer must have room for len(self) bytes.
+        Returns the number of bytes written."""
         if isinstance(self.payload, list):
             payload = pack_pages(self.payload, self.encoding)
         else:
@@ -159,17 +201,29 @@ class UsmChunk:
             padding = self._padding(0x20 + len(payload))
 
         chunksize = 0x18 + len(payload) + padding
-        result += chunksize.to_bytes(4, "big")
-        result += bytes(1)
-        result += (0x18).to_bytes(1, "big")
-        result += padding.to_bytes(2, "big")
-        result += self.channel_number.to_bytes(1, "big")
-        result += bytes(2)
-        result += self.payload_type.value.to_bytes(1, "big")
-        result += self.frame_time.to_bytes(4, "big")
-        result += self.frame_rate.to_bytes(4, "big")
-
-        result += bytearray(8)
-        result += payload
-        result += bytearray(padding)
-        return bytes(result)
+        CHUNK_HEADER.pack_into(
+            buffer,
+            offset,
+            self.chunk_type.value,
+            chunksize,
+            0,
+            0x18,
+            padding,
+            self.channel_number,
+            0,
+            0,
+            self.payload_type.value,
+            self.frame_time,
+            self.frame_rate,
+            b"\x00\x00\x00\x00",
+            b"\x00\x00\x00\x00",
+        )
+
+        payload_end = offset + 0x20 + len(payload)
+        buffer[offset + 0x20 : payload_end] = payload
+        if padding <= len(_ZEROS):
+            buffer[payload_end : payload_end + padding] = _ZEROS[:padding]
+        else:
+            buffer[payload_end : payload_end + padding] = bytes(padding)
+
+        return 0x20 + len(payload) + padding
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+from .chunk import CHUNK_HEADER
+from .page import UsmPage, SeekTable, get_pages
+from .tools import bytes_to_hex, is_payload_list_pages
+from .types import ChunkType, PayloadType
+
+
+@dataclass
+class UsmChannel:
+    """Intermediate class for holding information on a UsmVideo
+    and UsmAudio from a parsed Usm. The file offsets and sizes of
+    its stream payloads are stored in two parallel columns."""
+
+    header: UsmPage
+    metadata: Optional[List[UsmPage]] = None
+    seek_table: Optional[SeekTable] = None
+    offsets: array = field(default_factory=lambda: array("Q"))
+    sizes: array = field(default_factory=lambda: array("Q"))
+
+    @property
+    def stream(self) -> Iterator[Tuple[int, int]]:
+        """Offset and size of every stream payload in chronological order."""
+        return zip(self.offsets, self.sizes)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+
+def _new_channel() -> UsmChannel:
+    return UsmChannel(header=UsmPage(""))
+
+
+class UsmIndex:
+    """Location of every stream payload in a Usm file along with its crid,
+    header, and metadata pages or seek table. Built by reading only the chunk headers,
+    except for chunks that contain pages."""
+
+    def __init__(
+        self,
+        crids: List[UsmPage],
+        videos: Dict[int, UsmChannel],
+        audios: Dict[int, UsmChannel],
+        alphas: Dict[int, UsmChannel],
+    ) -> None:
+        self.crids = crids
+        self.videos = videos
+        self.audios = audios
+        self.alphas = alphas
+
+    @classmethod
+    def from_file(
+        cls,
+        usmfile: Union[IO, memoryview],
+        filesize: int,
+        encoding: str = "UTF-8",
+    ) -> UsmIndex:
+        """Index a Usm given a file handle or a memoryview of the whole file."""
+        crids: List[UsmPage] = []
+        channels: Dict[ChunkType, Dict[int, UsmChannel]] = {
+            ChunkType.VIDEO: defaultdict(_new_channel),
+            ChunkType.AUDIO: defaultdict(_new_channel),
+            ChunkType.ALPHA: defaultdict(_new_channel),
+        }
+        is_debug = logging.root.isEnabledFor(logging.DEBUG)
+        is_buffer = isinstance(usmfile, memoryview)
+
+        offset = 0
+        while filesize > offset:
+            if is_buffer:
+                header = CHUNK_HEADER.unpack_from(usmfile, offset)
+            else:
+                usmfile.seek(offset, 0)
+                header = CHUNK_HEADER.unpack(usmfile.read(CHUNK_HEADER.size))
+
+            signature, chunksize, _, payload_offset, padding_size = header[:5]
+            channel_number = header[5]
+            payload_type_raw = header[8]
+
+            chunk_offset = offset
+            payload_begin = offset + 0x08 + payload_offset
+            payload_size = chunksize - payload_offset - padding_size
+            offset += 0x08 + chunksize
+
+            if is_debug:
+                logging.debug(
+                    "Chunk info",
+                    extra={
+                        "type": bytes_to_hex(signature),
+                        "offset": chunk_offset,
+                        "chunksize_after_header": chunksize,
+                        "payload_offset": payload_offset,
+                        "padding_size": padding_size,
+                        "channel_number": channel_number,
+                        "payload_type": payload_type_raw,
+                    },
+                )
+
+            try:
+                if payload_size < 0:
+                    raise ValueError("Negative size")
+
+                chunk_type = ChunkType.from_bytes(signature)
+                payload_type = PayloadType.from_int(payload_type_raw & 0x3)
+            except ValueError as e:
+                # If in debug mode, continue gathering information about the problematic usm
+                if is_debug:
+                    logging.error(e)
+                    continue
+                else:
+                    raise
+
+            if chunk_type is ChunkType.INFO:
+                pass
+            elif chunk_type not in channels:
+                continue
+            elif payload_type is PayloadType.STREAM:
+                channel = channels[chunk_type][channel_number]
+                channel.offsets.append(payload_begin)
+                channel.sizes.append(payload_size)
+                continue
+            elif payload_type is PayloadType.SECTION_END:
+                continue
+
+            # Only info, header, and metadata chunks have their payloads read
+            if is_buffer:
+                payload = bytearray(usmfile[payload_begin : payload_begin + payload_size])
+            else:
+                usmfile.seek(payload_begin, 0)
+                payload = bytearray(usmfile.read(payload_size))
+
+            if not is_payload_list_pages(payload):
+                logging.warning(
+                    "Received chunk payload that's not a list of pages",
+                    extra={
+                        "type": str(chunk_type),
+                        "payload_type": payload_type,
+                        "offset": chunk_offset,
+                    },
+                )
+                continue
+
+            if (
+                payload_type is PayloadType.METADATA
+                and chunk_type is not ChunkType.AUDIO
+            ):
+                try:
+                    channels[chunk_type][channel_number].seek_table = (
+                        SeekTable.from_bytes(payload, encoding)
+                    )
+                    continue
+                except ValueError:
+                    # Not a VIDEO_SEEKINFO, keep as pages
+                    pass
+
+            pages = get_pages(payload, encoding)
+            if chunk_type is ChunkType.INFO:
+                crids.extend(pages)
+            elif payload_type is PayloadType.HEADER:
+                channels[chunk_type][channel_number].header = pages[0]
+            elif payload_type is PayloadType.METADATA:
+                channels[chunk_type][channel_number].metadata = pages
+
+        return cls(
+            crids,
+            dict(channels[ChunkType.VIDEO]),
+            dict(channels[ChunkType.AUDIO]),
+            dict(channels[ChunkType.ALPHA]),
+        )
+
+
+class UsmIndexCache:
+    """A directory of UsmIndexes saved as sidecar files, so that reopening a
+    known Usm doesn't rescan it. Entries are keyed by the Usm's absolute path
+    and encoding and are only used while its size and modification time match.
+    The least recently used entries are removed past max_entries.
+
+    Entries are pickled, so only point this to a directory you trust."""
+
+    VERSION = 3
+    SUFFIX = ".usmidx"
+
+    def __init__(
+        self, directory: Union[str, pathlib.Path], max_entries: int = 1024
+    ) -> None:
+        if max_entries <= 0:
+            raise ValueError(f"Given non-positive max entries: {max_entries}")
+
+        self.directory = pathlib.Path(directory)
+        self.max_entries = max_entries
+
+    def _entry_path(
+        self, filepath: Union[str, pathlib.Path], encoding: str
+    ) -> pathlib.Path:
+        key = f"{os.path.abspath(filepath)}\0{encoding}".encode("UTF-8")
+        return self.directory.joinpath(hashlib.sha1(key).hexdigest() + self.SUFFIX)
+
+    @staticmethod
+    def _stamp(filepath: Union[str, pathlib.Path]) -> Tuple[str, int, int]:
+        stat = os.stat(filepath)
+        return os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns
+
+    def get(
+        self, filepath: Union[str, pathlib.Path], encoding: str = "UTF-8"
+    ) -> Optional[UsmIndex]:
+        """Returns the cached index of a Usm or None if there's none or the
+        Usm has changed since it was cached."""
+        entry_path = self._entry_path(filepath, encoding)
+        try:
+            with open(entry_path, "rb") as entry:
+                # The stamp is pickled before the index so that a stale entry
+                # is skipped without loading an index from an older version
+                version, stamp = pickle.load(entry)
+                if version != self.VERSION or stamp != self._stamp(filepath):
+                    return None
+
+                index = pickle.load(entry)
+        except FileNotFoundError:
+            return None
+        except (
+            OSError,
+            pickle.UnpicklingError,
+            EOFError,
+            ValueError,
+            TypeError,
+            AttributeError,
+            ImportError,
+        ):
+            # AttributeError and ImportError come from entries that
+            # refer to classes which have since been renamed or moved
+            logging.warning(
+                "Ignoring unreadable usm index cache entry",
+                extra={"entry": str(entry_path)},
+            )
+            return None
+
+        # Mark entry as recently used for eviction
+        os.utime(entry_path)
+        return index
+
+    def put(
+        self,
+        filepath: Union[str, pathlib.Path],
+        index: UsmIndex,
+        encoding: str = "UTF-8",
+    ) -> None:
+        """Saves the index of a Usm then evicts the least recently used
+        entries if there are more than max_entries."""
+        os.makedirs(self.directory, exist_ok=True)
+        entry_path = self._entry_path(filepath, encoding)
+        temp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(temp_path, "wb") as entry:
+                pickle.dump(
+                    (self.VERSION, self._stamp(filepath)),
+                    entry,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+                pickle.dump(index, entry, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.replace(temp_path, entry_path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for entry_path in self.directory.glob("*" + self.SUFFIX):
+            try:
+                entries.append((entry_path.stat().st_mtime_ns, entry_path))
+            except FileNotFoundError:
+                # Removed by another process
+                continue
+
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, entry_path in entries[: len(entries) - self.max_entries]:
+            try:
+                entry_path.unlink()
+            except FileNotFoundError:
+                continue
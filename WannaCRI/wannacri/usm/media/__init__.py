@@ -1,6 +1,9 @@
 from .protocols import UsmVideo, UsmAudio, UsmMedia
-from .video import GenericVideo, Vp9, H264
+from .video import GenericVideo, Vp9, H264, probe_packets
 from .audio import GenericAudio, HCA
+from .ivf import is_vp9_ivf, probe_ivf
+from .annexb import is_h264_annexb, probe_h264
+from .hca import HcaHeader, HcaLoop, parse_hca_header, read_hca_header, iter_hca_frames
 from .tools import (
     create_video_crid_page,
     create_video_header_page,
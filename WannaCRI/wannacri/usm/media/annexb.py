@@ -0,0 +1,260 @@
+import mmap
+import os
+import pathlib
+from typing import List, Optional, Tuple, Union
+
+START_CODE = b"\x00\x00\x01"
+
+NAL_SLICE = 1
+NAL_SLICE_DPA = 2
+NAL_IDR_SLICE = 5
+NAL_SEI = 6
+NAL_SPS = 7
+NAL_PPS = 8
+NAL_AUD = 9
+
+# NAL unit types that can hold the first slice of a picture
+_FIRST_SLICE_NALS = {NAL_SLICE, NAL_SLICE_DPA, NAL_IDR_SLICE}
+# Non-VCL NAL unit types that start a new access unit when following a slice
+_ACCESS_UNIT_DELIMITING_NALS = {NAL_SEI, NAL_SPS, NAL_PPS, NAL_AUD, 14, 15, 16, 17, 18}
+# Profiles with chroma format and bit depth fields in their SPS
+_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+# Framerate used by ffmpeg for raw H.264 streams without timing info
+DEFAULT_FRAMERATE = "25/1"
+
+
+def is_h264_annexb(filepath: Union[str, pathlib.Path]) -> bool:
+    """Checks if a file is a raw H.264 stream starting with an access unit
+    delimiter or a sequence parameter set."""
+    with open(filepath, "rb") as stream:
+        head = stream.read(5)
+
+    if head.startswith(b"\x00" + START_CODE):
+        head = head[1:]
+    elif not head.startswith(START_CODE) or len(head) < 4:
+        return False
+
+    return head[3] & 0x80 == 0 and head[3] & 0x1F in (NAL_SPS, NAL_AUD)
+
+
+def remove_emulation_prevention(data: bytes) -> bytes:
+    """Removes the emulation prevention 0x03 bytes in 0x000003 sequences
+    of a NAL unit payload."""
+    return data.replace(b"\x00\x00\x03", b"\x00\x00")
+
+
+class _BitReader:
+    def __init__(self, data: bytes) -> None:
+        self.value = int.from_bytes(data, "big")
+        self.remaining = len(data) * 8
+
+    def bits(self, count: int) -> int:
+        if count > self.remaining:
+            raise ValueError("Read past the end of the NAL unit.")
+
+        self.remaining -= count
+        return (self.value >> self.remaining) & ((1 << count) - 1)
+
+    def ue(self) -> int:
+        leading_zeros = 0
+        while self.bits(1) == 0:
+            leading_zeros += 1
+
+        return (1 << leading_zeros) - 1 + self.bits(leading_zeros)
+
+    def se(self) -> int:
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def parse_sps(nal: bytes) -> Tuple[int, int, Optional[str]]:
+    """Parses a sequence parameter set NAL unit, without its start code, for
+    the cropped width and height and the framerate if it has timing info."""
+    reader = _BitReader(remove_emulation_prevention(nal[1:]))
+    profile_idc = reader.bits(8)
+    reader.bits(16)  # Constraint flags and level
+    reader.ue()  # seq_parameter_set_id
+
+    chroma_format_idc = 1
+    separate_colour_plane = 0
+    if profile_idc in _HIGH_PROFILES:
+        chroma_format_idc = reader.ue()
+        if chroma_format_idc == 3:
+            separate_colour_plane = reader.bits(1)
+
+        reader.ue()  # bit_depth_luma_minus8
+        reader.ue()  # bit_depth_chroma_minus8
+        reader.bits(1)  # qpprime_y_zero_transform_bypass_flag
+        if reader.bits(1):  # seq_scaling_matrix_present_flag
+            for i in range(8 if chroma_format_idc != 3 else 12):
+                if not reader.bits(1):
+                    continue
+
+                last_scale, next_scale = 8, 8
+                for _ in range(16 if i < 6 else 64):
+                    if next_scale != 0:
+                        next_scale = (last_scale + reader.se()) % 256
+
+                    last_scale = next_scale if next_scale != 0 else last_scale
+
+    reader.ue()  # log2_max_frame_num_minus4
+    pic_order_cnt_type = reader.ue()
+    if pic_order_cnt_type == 0:
+        reader.ue()  # log2_max_pic_order_cnt_lsb_minus4
+    elif pic_order_cnt_type == 1:
+        reader.bits(1)  # delta_pic_order_always_zero_flag
+        reader.se()  # offset_for_non_ref_pic
+        reader.se()  # offset_for_top_to_bottom_field
+        for _ in range(reader.ue()):
+            reader.se()  # offset_for_ref_frame
+
+    reader.ue()  # max_num_ref_frames
+    reader.bits(1)  # gaps_in_frame_num_value_allowed_flag
+    width_in_mbs = reader.ue() + 1
+    height_in_map_units = reader.ue() + 1
+    frame_mbs_only = reader.bits(1)
+    if not frame_mbs_only:
+        reader.bits(1)  # mb_adaptive_frame_field_flag
+
+    reader.bits(1)  # direct_8x8_inference_flag
+    crop_left, crop_right, crop_top, crop_bottom = 0, 0, 0, 0
+    if reader.bits(1):  # frame_cropping_flag
+        crop_left, crop_right = reader.ue(), reader.ue()
+        crop_top, crop_bottom = reader.ue(), reader.ue()
+
+    chroma_array_type = 0 if separate_colour_plane else chroma_format_idc
+    if chroma_array_type == 0:
+        crop_unit_x, crop_unit_y = 1, 2 - frame_mbs_only
+    else:
+        sub_width = 1 if chroma_format_idc == 3 else 2
+        sub_height = 2 if chroma_format_idc == 1 else 1
+        crop_unit_x, crop_unit_y = sub_width, sub_height * (2 - frame_mbs_only)
+
+    width = width_in_mbs * 16 - crop_unit_x * (crop_left + crop_right)
+    height = (2 - frame_mbs_only) * height_in_map_units * 16 - crop_unit_y * (
+        crop_top + crop_bottom
+    )
+
+    framerate = None
+    try:
+        if reader.bits(1):  # vui_parameters_present_flag
+            framerate = _parse_vui_framerate(reader)
+    except ValueError:
+        # Truncated VUI, keep the default framerate
+        pass
+
+    return width, height, framerate
+
+
+def _parse_vui_framerate(reader: _BitReader) -> Optional[str]:
+    if reader.bits(1):  # aspect_ratio_info_present_flag
+        if reader.bits(8) == 255:  # Extended_SAR
+            reader.bits(32)  # sar_width and sar_height
+
+    if reader.bits(1):  # overscan_info_present_flag
+        reader.bits(1)  # overscan_appropriate_flag
+
+    if reader.bits(1):  # video_signal_type_present_flag
+        reader.bits(4)  # video_format and video_full_range_flag
+        if reader.bits(1):  # colour_description_present_flag
+            reader.bits(24)
+
+    if reader.bits(1):  # chroma_loc_info_present_flag
+        reader.ue()
+        reader.ue()
+
+    if not reader.bits(1):  # timing_info_present_flag
+        return None
+
+    num_units_in_tick = reader.bits(32)
+    time_scale = reader.bits(32)
+    if num_units_in_tick == 0 or time_scale == 0:
+        return None
+
+    return f"{time_scale}/{num_units_in_tick * 2}"
+
+
+def probe_h264(filepath: Union[str, pathlib.Path]) -> dict:
+    """Indexes the access units of a raw Annex B H.264 stream by scanning for
+    start codes. Access units with an IDR slice are keyframes. Returns a dict
+    in the same shape as probe_packets with only the entries used by H264, so
+    that it can be given to H264 through probe. Unlike ffprobe, the dts of
+    every packet is its index."""
+    filesize = os.path.getsize(filepath)
+    if filesize == 0:
+        raise ValueError("File is not a raw H.264 video stream.")
+
+    packets: List[dict] = []
+    sps: Optional[bytes] = None
+    with open(filepath, "rb") as stream, mmap.mmap(
+        stream.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+
+        def add_packet(position: int, is_keyframe: bool):
+            packets.append(
+                {
+                    "dts": len(packets),
+                    "pos": str(position),
+                    "flags": "K_" if is_keyframe else "__",
+                }
+            )
+
+        access_unit_start = -1
+        has_slice = False
+        is_keyframe = False
+        start = data.find(START_CODE)
+        while start != -1 and start + 3 < filesize:
+            nal_begin = start + 3
+            next_start = data.find(START_CODE, nal_begin)
+            nal_type = data[nal_begin] & 0x1F
+            # Include the extra zero byte of four byte start codes
+            position = start - 1 if start > 0 and data[start - 1] == 0 else start
+
+            if nal_type in _FIRST_SLICE_NALS:
+                # first_mb_in_slice is 0 if its exp-golomb code starts with 1
+                is_new = (
+                    has_slice
+                    and nal_begin + 1 < filesize
+                    and data[nal_begin + 1] & 0x80 != 0
+                )
+            else:
+                is_new = has_slice and nal_type in _ACCESS_UNIT_DELIMITING_NALS
+
+            if is_new:
+                add_packet(access_unit_start, is_keyframe)
+                has_slice, is_keyframe = False, False
+                access_unit_start = position
+            elif access_unit_start == -1:
+                access_unit_start = position
+
+            if 1 <= nal_type <= 5:
+                has_slice = True
+                is_keyframe = is_keyframe or nal_type == NAL_IDR_SLICE
+            elif nal_type == NAL_SPS and sps is None:
+                sps = data[nal_begin : filesize if next_start == -1 else next_start]
+
+            start = next_start
+
+        if has_slice:
+            add_packet(access_unit_start, is_keyframe)
+
+    if len(packets) == 0:
+        raise ValueError("File is not a raw H.264 video stream.")
+    if sps is None:
+        raise ValueError("H.264 stream has no sequence parameter set.")
+
+    width, height, framerate = parse_sps(sps)
+    return {
+        "format": {"format_name": "h264"},
+        "streams": [
+            {
+                "codec_type": "video",
+                "codec_name": "h264",
+                "width": width,
+                "height": height,
+                "r_frame_rate": DEFAULT_FRAMERATE if framerate is None else framerate,
+            }
+        ],
+        "packets": packets,
+    }
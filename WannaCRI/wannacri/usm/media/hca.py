@@ -0,0 +1,206 @@
+import pathlib
+import struct
+from typing import Generator, NamedTuple, Optional, Tuple, Union
+
+# Signature, major version, minor version, header size
+HCA_HEADER = struct.Struct(">4sBBH")
+# Channel count, 24-bit sample rate, frame count, inserted samples, appended samples
+FMT_BLOCK = struct.Struct(">4sB3sIHH")
+# Frame size, min resolution, max resolution, track count, channel config,
+# total band count, base band count, stereo band count, bands per hfr group,
+# two reserved bytes
+COMP_BLOCK = struct.Struct(">4sHBBBBBBBBBB")
+# Frame size, min resolution, max resolution, total band count - 1,
+# base band count - 1, track count and channel config nibbles, stereo type
+DEC_BLOCK = struct.Struct(">4sHBBBBBB")
+# Max frame size, noise level
+VBR_BLOCK = struct.Struct(">4sHH")
+# Ath table type
+ATH_BLOCK = struct.Struct(">4sH")
+# Start frame, end frame, start delay, end padding
+LOOP_BLOCK = struct.Struct(">4sIIHH")
+# Cipher type
+CIPH_BLOCK = struct.Struct(">4sH")
+# Volume
+RVA_BLOCK = struct.Struct(">4sf")
+# Comment length, followed by the comment
+COMM_BLOCK = struct.Struct(">4sB")
+
+# Block signatures may have their high bits set in encrypted HCAs
+_SIGNATURE_MASK = 0x7F7F7F7F
+
+
+class HcaLoop(NamedTuple):
+    start_frame: int
+    end_frame: int
+    start_delay: int
+    end_padding: int
+
+
+class HcaHeader(NamedTuple):
+    """Values of the blocks of an HCA header. Blocks missing from the header
+    are left as their defaults, which are the values decoders assume."""
+
+    version: Tuple[int, int]
+    header_size: int
+    channel_count: int
+    sample_rate: int
+    frame_count: int
+    inserted_samples: int
+    appended_samples: int
+    frame_size: int
+    min_resolution: int
+    max_resolution: int
+    track_count: int
+    channel_config: int
+    total_band_count: int
+    base_band_count: int
+    stereo_band_count: int = 0
+    bands_per_hfr_group: int = 0
+    max_frame_size: Optional[int] = None
+    noise_level: Optional[int] = None
+    ath_type: int = 0
+    loop: Optional[HcaLoop] = None
+    cipher_type: int = 0
+    volume: float = 1.0
+    comment: Optional[str] = None
+
+
+def _signature(data: Union[bytes, memoryview], offset: int) -> bytes:
+    value = int.from_bytes(data[offset : offset + 4], "big") & _SIGNATURE_MASK
+    return value.to_bytes(4, "big")
+
+
+def parse_hca_header(data: Union[bytes, memoryview]) -> HcaHeader:
+    """Parses an HCA header, given at least its first header size bytes.
+    Supports the fmt, comp or dec, vbr, ath, loop, ciph, rva, comm, and pad
+    blocks, which can be masked like in encrypted HCAs."""
+    if len(data) < HCA_HEADER.size or _signature(data, 0) != b"HCA\x00":
+        raise ValueError("Data is not an HCA.")
+
+    _, version_major, version_minor, header_size = HCA_HEADER.unpack_from(data)
+    if len(data) < header_size:
+        raise ValueError(f"HCA header is truncated. Expected {header_size} bytes.")
+
+    values: dict = {
+        "version": (version_major, version_minor),
+        "header_size": header_size,
+        # Versions before 2.0 don't have an ath block and use the first table
+        "ath_type": 1 if version_major < 2 else 0,
+    }
+    offset = HCA_HEADER.size
+    while offset + 4 <= header_size:
+        signature = _signature(data, offset)
+        if signature == b"fmt\x00":
+            (
+                _,
+                values["channel_count"],
+                sample_rate,
+                values["frame_count"],
+                values["inserted_samples"],
+                values["appended_samples"],
+            ) = FMT_BLOCK.unpack_from(data, offset)
+            values["sample_rate"] = int.from_bytes(sample_rate, "big")
+            offset += FMT_BLOCK.size
+        elif signature == b"comp":
+            (
+                _,
+                values["frame_size"],
+                values["min_resolution"],
+                values["max_resolution"],
+                values["track_count"],
+                values["channel_config"],
+                values["total_band_count"],
+                values["base_band_count"],
+                values["stereo_band_count"],
+                values["bands_per_hfr_group"],
+            ) = COMP_BLOCK.unpack_from(data, offset)[:10]
+            offset += COMP_BLOCK.size
+        elif signature == b"dec\x00":
+            (
+                _,
+                values["frame_size"],
+                values["min_resolution"],
+                values["max_resolution"],
+                total_band_count,
+                base_band_count,
+                track_and_config,
+                stereo_type,
+            ) = DEC_BLOCK.unpack_from(data, offset)
+            values["total_band_count"] = total_band_count + 1
+            values["base_band_count"] = base_band_count + 1
+            values["track_count"] = track_and_config >> 4
+            values["channel_config"] = track_and_config & 0xF
+            if stereo_type == 0:
+                values["base_band_count"] = values["total_band_count"]
+            offset += DEC_BLOCK.size
+        elif signature == b"vbr\x00":
+            _, values["max_frame_size"], values["noise_level"] = VBR_BLOCK.unpack_from(
+                data, offset
+            )
+            offset += VBR_BLOCK.size
+        elif signature == b"ath\x00":
+            _, values["ath_type"] = ATH_BLOCK.unpack_from(data, offset)
+            offset += ATH_BLOCK.size
+        elif signature == b"loop":
+            values["loop"] = HcaLoop(*LOOP_BLOCK.unpack_from(data, offset)[1:])
+            offset += LOOP_BLOCK.size
+        elif signature == b"ciph":
+            _, values["cipher_type"] = CIPH_BLOCK.unpack_from(data, offset)
+            offset += CIPH_BLOCK.size
+        elif signature == b"rva\x00":
+            _, values["volume"] = RVA_BLOCK.unpack_from(data, offset)
+            offset += RVA_BLOCK.size
+        elif signature == b"comm":
+            _, length = COMM_BLOCK.unpack_from(data, offset)
+            comment_begin = offset + COMM_BLOCK.size
+            comment = bytes(data[comment_begin : comment_begin + length])
+            values["comment"] = comment.split(b"\x00", 1)[0].decode("UTF-8", "replace")
+            offset = comment_begin + length
+        elif signature == b"pad\x00":
+            # Padding until the end of the header
+            break
+        else:
+            raise ValueError(f"Unknown HCA header block {signature!r} at {offset}.")
+
+    if "channel_count" not in values:
+        raise ValueError("HCA header has no fmt block.")
+    if "frame_size" not in values:
+        raise ValueError("HCA header has no comp or dec block.")
+
+    return HcaHeader(**values)
+
+
+def read_hca_header(filepath: Union[str, pathlib.Path]) -> HcaHeader:
+    """Reads and parses the header of an HCA file."""
+    with open(filepath, "rb") as hca:
+        data = hca.read(HCA_HEADER.size)
+        if len(data) == HCA_HEADER.size and _signature(data, 0) == b"HCA\x00":
+            data += hca.read(HCA_HEADER.unpack(data)[3] - HCA_HEADER.size)
+
+    return parse_hca_header(data)
+
+
+def iter_hca_frames(
+    filepath: Union[str, pathlib.Path],
+    header: HcaHeader,
+    batch_size: int = 256,
+) -> Generator[bytes, None, None]:
+    """Reads the frames of an HCA file after its header, batch_size frames
+    per read."""
+    if batch_size <= 0:
+        raise ValueError(f"Given non-positive batch size: {batch_size}")
+
+    frame_size = header.frame_size
+    with open(filepath, "rb") as hca:
+        hca.seek(header.header_size)
+        for first in range(0, header.frame_count, batch_size):
+            count = min(batch_size, header.frame_count - first)
+            batch = hca.read(frame_size * count)
+            if len(batch) != frame_size * count:
+                raise ValueError(
+                    f"HCA is truncated. Expected {header.frame_count} frames."
+                )
+
+            for begin in range(0, len(batch), frame_size):
+                yield batch[begin : begin + frame_size]
@@ -0,0 +1,137 @@
+import logging
+import os
+import struct
+from fractions import Fraction
+from typing import Union
+import pathlib
+
+# Signature, version, header size, fourcc, width, height,
+# timebase denominator, timebase numerator, number of frames, unused
+IVF_FILE_HEADER = struct.Struct("<4sHH4sHHIII4x")
+# Frame size excluding this header and timestamp
+IVF_FRAME_HEADER = struct.Struct("<IQ")
+
+
+def is_vp9_ivf(filepath: Union[str, pathlib.Path]) -> bool:
+    """Checks if a file is an ivf with VP9 frames from its file header."""
+    with open(filepath, "rb") as ivf:
+        header = ivf.read(IVF_FILE_HEADER.size)
+
+    if len(header) != IVF_FILE_HEADER.size:
+        return False
+
+    signature, _, _, fourcc = IVF_FILE_HEADER.unpack(header)[:4]
+    return signature == b"DKIF" and fourcc == b"VP90"
+
+
+def is_vp9_keyframe(frame: bytes) -> bool:
+    """Reads the frame type from the start of a VP9 uncompressed header.
+    Frames that only show an existing frame are never keyframes."""
+    if len(frame) == 0:
+        return False
+
+    bits = frame[0]
+    # Frame marker
+    if bits >> 6 != 0b10:
+        return False
+
+    profile = ((bits >> 5) & 1) | (((bits >> 4) & 1) << 1)
+    position = 3
+    if profile == 3:
+        # Reserved zero bit
+        position -= 1
+
+    show_existing_frame = (bits >> position) & 1
+    if show_existing_frame:
+        return False
+
+    frame_type = (bits >> (position - 1)) & 1
+    return frame_type == 0
+
+
+def probe_ivf(filepath: Union[str, pathlib.Path]) -> dict:
+    """Indexes the frames of a VP9 ivf by reading the ivf frame headers and
+    the first byte of every frame. Returns a dict in the same shape as
+    probe_packets with only the entries used by Vp9, so that it can be given
+    to Vp9 through probe."""
+    filesize = os.path.getsize(filepath)
+    packets = []
+    with open(filepath, "rb") as ivf:
+        header = ivf.read(IVF_FILE_HEADER.size)
+        if len(header) != IVF_FILE_HEADER.size:
+            raise ValueError("File is not an ivf.")
+
+        (
+            signature,
+            _,
+            header_size,
+            fourcc,
+            width,
+            height,
+            timebase_denominator,
+            timebase_numerator,
+            _,
+        ) = IVF_FILE_HEADER.unpack(header)
+        if signature != b"DKIF":
+            raise ValueError("File is not an ivf.")
+        if fourcc != b"VP90":
+            raise ValueError("File is not a VP9 videos.")
+        if timebase_denominator == 0 or timebase_numerator == 0:
+            raise ValueError("Ivf has an invalid timebase.")
+
+        offset = header_size
+        while offset + IVF_FRAME_HEADER.size <= filesize:
+            ivf.seek(offset, 0)
+            frame_header = ivf.read(IVF_FRAME_HEADER.size + 1)
+            frame_size, timestamp = IVF_FRAME_HEADER.unpack_from(frame_header)
+            packets.append(
+                {
+                    "dts": timestamp,
+                    "pos": str(offset),
+                    "flags": "K_"
+                    if is_vp9_keyframe(frame_header[IVF_FRAME_HEADER.size :])
+                    else "__",
+                }
+            )
+            offset += IVF_FRAME_HEADER.size + frame_size
+
+    if len(packets) == 0:
+        raise ValueError("Ivf has no frames.")
+    if offset > filesize:
+        logging.warning(
+            "Ivf last frame is truncated",
+            extra={"path": str(filepath), "missing": offset - filesize},
+        )
+
+    # Frame duration in timebase units. Encoders commonly use a finer timebase
+    # than the framerate, e.g. milliseconds.
+    frame_duration = 1
+    if len(packets) > 1:
+        frame_duration = max(
+            1, round((packets[-1]["dts"] - packets[0]["dts"]) / (len(packets) - 1))
+        )
+
+    timebase = Fraction(timebase_numerator, timebase_denominator)
+    framerate = 1 / (timebase * frame_duration)
+    duration = len(packets) / framerate
+    for packet in packets:
+        packet["pts_time"] = str(float(packet["dts"] * timebase))
+
+    return {
+        "format": {
+            "format_name": "ivf",
+            "duration": str(float(duration)),
+            "bit_rate": str(int(filesize * 8 / duration)),
+        },
+        "streams": [
+            {
+                "codec_type": "video",
+                "codec_name": "vp9",
+                "width": width,
+                "height": height,
+                "r_frame_rate": f"{framerate.numerator}/{framerate.denominator}",
+                "nb_frames": str(len(packets)),
+            }
+        ],
+        "packets": packets,
+    }
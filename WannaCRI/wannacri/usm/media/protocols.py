@@ -1,7 +1,7 @@
-from typing import Optional, Generator, Tuple, List, Protocol
+from typing import Optional, Generator, Tuple, List, Protocol, Sequence, Collection
 
 from wannacri.usm.types import ChunkType, PayloadType, OpMode
-from wannacri.usm.page import UsmPage, ElementType
+from wannacri.usm.page import UsmPage, ElementType, SeekTable
 from wannacri.usm.usm import UsmChunk
 from wannacri.usm.tools import (
     encrypt_video_packet,
@@ -26,6 +26,8 @@ class UsmMedia(Protocol):
     _length: int
     _channel_number: int
     _metadata_pages: Optional[List[UsmPage]]
+    # Optional. Sizes of every packet in the stream, when known before streaming
+    _packet_sizes: Optional[Sequence[int]] = None
 
     @property
     def crid_page(self) -> UsmPage:
@@ -48,6 +50,13 @@ class UsmMedia(Protocol):
 
         self._metadata_pages = pages
 
+    @property
+    def packet_sizes(self) -> Optional[Sequence[int]]:
+        """Sizes of every packet of stream in order, or None when they are only
+        known by streaming. Encryption and decryption keep packet sizes, so
+        Usm uses these to lay out a file before reading any packet."""
+        return self._packet_sizes
+
     @property
     def channel_number(self) -> int:
         return self._channel_number
@@ -107,6 +116,22 @@ class UsmVideo(UsmMedia, Protocol):
     # to use the default stream and chunks methods.
     _stream: Generator[Tuple[bytes, bool], None, None]
     is_alpha: bool
+    # Optional. Frame numbers of keyframes, when known before streaming
+    _keyframes: Optional[Collection[int]] = None
+    # Optional. Seek info the video was read with
+    _seek_table: Optional[SeekTable] = None
+
+    @property
+    def keyframes(self) -> Optional[Collection[int]]:
+        """Frame numbers of the keyframes in stream, or None when they are
+        only known by streaming."""
+        return self._keyframes
+
+    @property
+    def seek_table(self) -> Optional[SeekTable]:
+        """VIDEO_SEEKINFO of a video read from a Usm, or None. Usm generates a
+        new seek table from its own layout when packing."""
+        return self._seek_table
 
     def stream(
         self, mode: OpMode = OpMode.NONE, key: Optional[bytes] = None
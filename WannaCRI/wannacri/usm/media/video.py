@@ -1,11 +1,27 @@
 import os
-from typing import Generator, Tuple, Optional, List
+from typing import Generator, Tuple, Optional, List, Sequence, Collection
 
 import ffmpeg
 
 from .tools import create_video_crid_page, create_video_header_page
 from .protocols import UsmVideo
-from ..page import UsmPage
+from .ivf import probe_ivf
+from .annexb import probe_h264
+from ..page import UsmPage, SeekTable
+
+
+PROBE_PACKET_ENTRIES = "packet=dts,pts_time,pos,flags"
+
+
+def probe_packets(filepath: str, ffprobe_path: Optional[str] = None) -> dict:
+    """Probes a video file along with the packet entries needed by Vp9 and H264.
+    The result can be given to them through probe to skip probing again."""
+    if ffprobe_path is None:
+        return ffmpeg.probe(filepath, show_entries=PROBE_PACKET_ENTRIES)
+
+    return ffmpeg.probe(
+        filepath, cmd=ffprobe_path, show_entries=PROBE_PACKET_ENTRIES
+    )
 
 
 class GenericVideo(UsmVideo):
@@ -22,6 +38,9 @@ class GenericVideo(UsmVideo):
         channel_number: int = 0,
         metadata_pages: Optional[List[UsmPage]] = None,
         is_alpha: bool = False,
+        packet_sizes: Optional[Sequence[int]] = None,
+        keyframes: Optional[Collection[int]] = None,
+        seek_table: Optional[SeekTable] = None,
     ):
         self._stream = stream
         self._crid_page = crid_page
@@ -30,6 +49,9 @@ class GenericVideo(UsmVideo):
         self._channel_number = channel_number
         self._metadata_pages = metadata_pages
         self.is_alpha = is_alpha
+        self._packet_sizes = packet_sizes
+        self._keyframes = keyframes
+        self._seek_table = seek_table
 
 
 class Vp9(UsmVideo):
@@ -39,15 +61,17 @@ class Vp9(UsmVideo):
         channel_number: int = 0,
         format_version: int = 16777984,
         ffprobe_path: Optional[str] = None,
+        probe: Optional[dict] = None,
     ):
-        if ffprobe_path is None:
-            info = ffmpeg.probe(filepath, show_entries="packet=dts,pts_time,pos,flags")
+        if probe is not None:
+            info = probe
+        elif ffprobe_path is None:
+            # Index the ivf directly instead of running ffprobe
+            info = probe_ivf(filepath)
         else:
-            info = ffmpeg.probe(
-                filepath,
-                cmd=ffprobe_path,
-                show_entries="packet=dts,pts_time,pos,flags",
-            )
+            info = probe_packets(filepath, ffprobe_path)
+        if "packets" not in info:
+            raise ValueError("Given probe has no packets.")
 
         if len(info.get("streams")) == 0:
             raise ValueError("File has no videos streams.")
@@ -65,7 +89,9 @@ class Vp9(UsmVideo):
         )
 
         frames = info.get("packets")
-        keyframes = [kf.get("dts") for kf in frames if "K" in kf.get("flags")]
+        keyframes = frozenset(
+            index for index, frame in enumerate(frames) if "K" in frame.get("flags")
+        )
         max_size = 0
         sizes = []
         for i, frame in enumerate(frames):
@@ -103,7 +129,7 @@ class Vp9(UsmVideo):
         )
 
         def packet_gen(
-            path: str, packet_sizes: List[int], keyframe_indexes: List[int]
+            path: str, packet_sizes: List[int], keyframe_indexes: Collection[int]
         ) -> Generator[Tuple[bytes, bool], None, None]:
             video = open(path, "rb")
             for index, size in enumerate(packet_sizes):
@@ -116,6 +142,8 @@ class Vp9(UsmVideo):
         self._length = len(frames)
         self._channel_number = channel_number
         self._metadata_pages = None
+        self._packet_sizes = sizes
+        self._keyframes = keyframes
 
 class H264(UsmVideo):
     def __init__(
@@ -124,15 +152,17 @@ class H264(UsmVideo):
         channel_number: int = 0,
         format_version: int = 0,
         ffprobe_path: Optional[str] = None,
+        probe: Optional[dict] = None,
     ):
-        if ffprobe_path is None:
-            info = ffmpeg.probe(filepath, show_entries="packet=dts,pts_time,pos,flags")
+        if probe is not None:
+            info = probe
+        elif ffprobe_path is None:
+            # Scan the stream directly instead of running ffprobe
+            info = probe_h264(filepath)
         else:
-            info = ffmpeg.probe(
-                filepath,
-                cmd=ffprobe_path,
-                show_entries="packet=dts,pts_time,pos,flags",
-            )
+            info = probe_packets(filepath, ffprobe_path)
+        if "packets" not in info:
+            raise ValueError("Given probe has no packets.")
 
         if len(info.get("streams")) == 0:
             raise ValueError("File has no videos streams.")
@@ -150,7 +180,9 @@ class H264(UsmVideo):
         )
 
         frames = info.get("packets")
-        keyframes = [kf.get("dts") for kf in frames if "K" in kf.get("flags")]
+        keyframes = frozenset(
+            index for index, frame in enumerate(frames) if "K" in frame.get("flags")
+        )
         max_size = 0
         sizes = []
         for i, frame in enumerate(frames):
@@ -188,7 +220,7 @@ class H264(UsmVideo):
         )
 
         def packet_gen(
-            path: str, packet_sizes: List[int], keyframe_indexes: List[int]
+            path: str, packet_sizes: List[int], keyframe_indexes: Collection[int]
         ) -> Generator[Tuple[bytes, bool], None, None]:
             video = open(path, "rb")
             for index, size in enumerate(packet_sizes):
@@ -200,4 +232,6 @@ class H264(UsmVideo):
         self._stream = packet_gen(filepath, sizes, keyframes)
         self._length = len(frames)
         self._channel_number = channel_number
-        self._metadata_pages = None
\ No newline at end of file
+        self._metadata_pages = None
+        self._packet_sizes = sizes
+        self._keyframes = keyframes
\ No newline at end of file
@@ -1,6 +1,22 @@
+from __future__ import annotations
+
+import bisect
+import functools
 import struct
 import logging
-from typing import List, Any, Tuple, Dict, NamedTuple, Set, Optional, Union
+from array import array
+from typing import (
+    List,
+    Any,
+    Tuple,
+    Dict,
+    NamedTuple,
+    Optional,
+    Union,
+    FrozenSet,
+    Iterable,
+    Sequence,
+)
 
 from .tools import bytes_to_hex
 from .types import ElementOccurrence, ElementType
@@ -43,7 +59,75 @@ class UsmPage:
         return None
 
 
-def get_pages(info: bytearray, encoding: str = "UTF-8") -> List[UsmPage]:
+# Unique array field formats of each element type. I8 is read unsigned and
+# F32 is read as raw bytes since it's stored little-endian.
+_UNPACK_FORMATS = {
+    ElementType.I8: "B",
+    ElementType.U8: "B",
+    ElementType.I16: "h",
+    ElementType.U16: "H",
+    ElementType.I32: "i",
+    ElementType.U32: "I",
+    ElementType.I64: "q",
+    ElementType.U64: "Q",
+    ElementType.F32: "4s",
+    ElementType.STRING: "I",
+    ElementType.BYTES: "II",
+}
+_PACK_FORMATS = {**_UNPACK_FORMATS, ElementType.I8: "b"}
+# < means little-endian
+_F32 = struct.Struct("<f")
+
+# Ways an element's fields are turned into its value
+_PLAIN = 0
+_FLOAT = 1
+_STRING = 2
+_BYTES = 3
+
+
+def _element_kind(element_type: ElementType) -> int:
+    if element_type is ElementType.F32:
+        return _FLOAT
+    if element_type is ElementType.STRING:
+        return _STRING
+    if element_type is ElementType.BYTES:
+        return _BYTES
+
+    return _PLAIN
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_schema(
+    element_types: Tuple[ElementType, ...], pack: bool
+) -> struct.Struct:
+    """Compiles the element types of a page into a struct of its fields.
+    Cached since pages of the same kind share the same element types."""
+    formats = _PACK_FORMATS if pack else _UNPACK_FORMATS
+    try:
+        return struct.Struct(">" + "".join(formats[t] for t in element_types))
+    except KeyError as e:
+        raise ValueError(f"Unknown element type {e.args[0]}") from None
+
+
+def _read_string(string_array: bytearray, offset: int, encoding: str) -> str:
+    # Strings are null-byte terminated
+    end = string_array.index(0x00, offset)
+    return string_array[offset:end].decode(encoding)
+
+
+class _Schema(NamedTuple):
+    """Decoded layout of a list of pages. Columns hold the name, type, kind, and
+    row field of every element, or its element if it's recurring."""
+
+    page_name: str
+    columns: List[Tuple[str, ElementType, int, int, Optional[Element]]]
+    rows: Iterable[Tuple[Any, ...]]
+    num_pages: int
+    string_array: bytearray
+    byte_array: bytearray
+
+
+def _unpack_rows(info: bytearray, encoding: str) -> _Schema:
     # START OF 8 BYTE PAYLOAD HEADER
     if bytearray(info[0:4]) != bytearray("@UTF", "UTF-8"):
         raise ValueError(f"Invalid info data signature: {info[0:4]}")
@@ -66,10 +150,8 @@ def get_pages(info: bytearray, encoding: str = "UTF-8") -> List[UsmPage]:
     byte_array = info[8 + byte_array_offset : 8 + payload_size]
 
     try:
-        # Strings are null-byte terminated
-        page_name_end = page_name_offset + string_array[page_name_offset:].index(0x00)
-        page_name: Optional[str] = string_array[page_name_offset:page_name_end].decode(
-            "UTF-8"
+        page_name: Optional[str] = _read_string(
+            string_array, page_name_offset, "UTF-8"
         )
     except (ValueError, UnicodeDecodeError) as e:
         logging.error(
@@ -95,169 +177,178 @@ def get_pages(info: bytearray, encoding: str = "UTF-8") -> List[UsmPage]:
     if page_name is None:
         raise ValueError("Error occurred in processing page name")
 
-    pages = [UsmPage(page_name) for _ in range(num_pages)]
+    # The shared array describes every element once for all pages, along with
+    # the value of recurring elements. Non-recurring elements' values are
+    # packed per page in the unique array in the same order.
+    shared_array = memoryview(info)[0x20 : 8 + unique_array_offset]
+    recurring: Dict[int, Element] = {}
+    layout: List[Tuple[str, ElementType, int]] = []
+    unique_types: List[ElementType] = []
+    for i in range(num_elements_per_page):
+        try:
+            element_type: Union[ElementType, int] = ElementType.from_int(
+                shared_array[0] & 0x1F
+            )
+        except ValueError:
+            element_type = shared_array[0] & 0x1F
+
+        try:
+            element_occurrence: Union[
+                ElementOccurrence, int
+            ] = ElementOccurrence.from_int(shared_array[0] >> 5)
+        except ValueError:
+            element_occurrence = shared_array[0] >> 5
+
+        element_name_offset = int.from_bytes(shared_array[1:5], "big")
+
+        try:
+            element_name: Optional[str] = _read_string(
+                string_array, element_name_offset, encoding
+            )
+        except (ValueError, UnicodeDecodeError) as e:
+            logging.error(
+                "Error occurred in processing element name",
+                extra={
+                    "error": e,
+                    "element_name_offset": element_name_offset,
+                    "string_array_at_element_name": string_array[
+                        element_name_offset:
+                    ],
+                },
+            )
+            element_name = None
+
+        shared_array = shared_array[5:]
+
+        # Leave a note before we die
+        if (
+            element_name is None
+            or not isinstance(element_type, ElementType)
+            or not isinstance(element_occurrence, ElementOccurrence)
+        ):
+            logging.error(
+                "Error occurred in element processing",
+                extra={
+                    "page_name": element_name,
+                    "type": element_type,
+                    "occurrence": element_occurrence,
+                    "shared_array": bytes_to_hex(shared_array),
+                    "string_array": string_array,
+                    "byte_array": byte_array,
+                },
+            )
+
+        if element_name is None:
+            raise ValueError("Error occurred in processing element name")
+        if not isinstance(element_type, ElementType):
+            raise ValueError(f"Unknown element type {element_type}")
+        if not isinstance(element_occurrence, ElementOccurrence):
+            raise ValueError(f"Unknown element occurence {element_occurrence}")
+
+        layout.append((element_name, element_type, i))
+        if element_occurrence is ElementOccurrence.NON_RECURRING:
+            unique_types.append(element_type)
+            continue
+
+        value_struct = _compile_schema((element_type,), False)
+        fields = value_struct.unpack_from(shared_array)
+        shared_array = shared_array[value_struct.size :]
+        recurring[i] = Element(
+            _field_value(element_type, fields, 0, string_array, byte_array, encoding),
+            element_type,
+        )
 
-    unique_array = info[
-        8
-        + unique_array_offset : 8
-        + unique_array_offset
-        + unique_array_size_per_page * num_pages
-    ]
-    for page in pages:
-        shared_array = info[0x20 : 8 + unique_array_offset]
-        for _ in range(num_elements_per_page):
-            try:
-                element_type: Union[ElementType, int] = ElementType.from_int(
-                    shared_array[0] & 0x1F
-                )
-            except ValueError:
-                element_type = shared_array[0] & 0x1F
-
-            try:
-                element_occurrence: Union[
-                    ElementOccurrence, int
-                ] = ElementOccurrence.from_int(shared_array[0] >> 5)
-            except ValueError:
-                element_occurrence = shared_array[0] >> 5
-
-            element_name_offset = int.from_bytes(shared_array[1:5], "big")
-
-            try:
-                element_end = element_name_offset + string_array[
-                    element_name_offset:
-                ].index(0x00)
-                element_name: Optional[str] = string_array[
-                    element_name_offset:element_end
-                ].decode(encoding)
-            except (ValueError, UnicodeDecodeError) as e:
-                logging.error(
-                    "Error occurred in processing element name",
-                    extra={
-                        "error": e,
-                        "element_name_offset": element_name_offset,
-                        "string_array_at_element_name": string_array[
-                            element_name_offset:
-                        ],
-                    },
-                )
-                element_name = None
-
-            shared_array = shared_array[5:]
-
-            # Leave a note before we die
-            if (
-                element_name is None
-                or not isinstance(element_type, ElementType)
-                or not isinstance(element_occurrence, ElementOccurrence)
-            ):
-                logging.error(
-                    "Error occurred in element processing",
-                    extra={
-                        "page_name": element_name,
-                        "type": element_type,
-                        "occurrence": element_occurrence,
-                        "shared_array": bytes_to_hex(shared_array),
-                        "unique_array": bytes_to_hex(unique_array),
-                        "string_array": string_array,
-                        "byte_array": byte_array,
-                    },
-                )
+    # Compile the unique array's layout into a struct to unpack every page at once
+    row_struct = _compile_schema(tuple(unique_types), False)
+    unique_array_begin = 8 + unique_array_offset
+    unique_array_end = unique_array_begin + row_struct.size * num_pages
+    if unique_array_end > len(info):
+        raise ValueError("Unique array is larger than payload.")
+
+    if row_struct.size == 0:
+        rows: Iterable[Tuple[Any, ...]] = [()] * num_pages
+    else:
+        rows = row_struct.iter_unpack(
+            memoryview(info)[unique_array_begin:unique_array_end]
+        )
+
+    # Column of the first field of every non-recurring element in a row
+    columns: List[Tuple[str, ElementType, int, int, Optional[Element]]] = []
+    column = 0
+    for element_name, element_type, i in layout:
+        element = recurring.get(i)
+        columns.append(
+            (element_name, element_type, _element_kind(element_type), column, element)
+        )
+        if element is None:
+            column += 2 if element_type is ElementType.BYTES else 1
+
+    return _Schema(page_name, columns, rows, num_pages, string_array, byte_array)
 
-            if element_name is None:
-                raise ValueError("Error occurred in processing element name")
-            if not isinstance(element_type, ElementType):
-                raise ValueError(f"Unknown element type {element_type}")
-            if not isinstance(element_occurrence, ElementOccurrence):
-                raise ValueError(f"Unknown element occurence {element_occurrence}")
 
-            if element_occurrence is ElementOccurrence.RECURRING:
-                current_array = shared_array
+def get_pages(info: bytearray, encoding: str = "UTF-8") -> List[UsmPage]:
+    page_name, columns, rows, _, string_array, byte_array = _unpack_rows(
+        info, encoding
+    )
+
+    strings: Dict[int, str] = {}
+    pages = []
+    for row in rows:
+        page_dict: Dict[str, Element] = {}
+        for element_name, element_type, kind, column, element in columns:
+            if element is not None:
+                if kind == _BYTES:
+                    # Give every page its own copy of mutable values
+                    element = Element(bytearray(element.val), element_type)
+            elif kind == _PLAIN:
+                element = Element(row[column], element_type)
+            elif kind == _STRING:
+                string_offset = row[column]
+                string = strings.get(string_offset)
+                if string is None:
+                    string = _read_string(string_array, string_offset, encoding)
+                    strings[string_offset] = string
+
+                element = Element(string, element_type)
             else:
-                current_array = unique_array
-
-            if element_type == ElementType.I8:
-                page.update(element_name, ElementType.I8, current_array[0])
-                element_size = 1
-            elif element_type == ElementType.U8:
-                page.update(element_name, ElementType.U8, current_array[0])
-                element_size = 1
-            elif element_type == ElementType.I16:
-                page.update(
-                    element_name,
-                    ElementType.I16,
-                    int.from_bytes(current_array[0:2], "big", signed=True),
-                )
-                element_size = 2
-            elif element_type == ElementType.U16:
-                page.update(
-                    element_name,
-                    ElementType.U16,
-                    int.from_bytes(current_array[0:2], "big"),
-                )
-                element_size = 2
-            elif element_type == ElementType.I32:
-                page.update(
-                    element_name,
-                    ElementType.I32,
-                    int.from_bytes(current_array[0:4], "big", signed=True),
-                )
-                element_size = 4
-            elif element_type == ElementType.U32:
-                page.update(
-                    element_name,
-                    ElementType.U32,
-                    int.from_bytes(current_array[0:4], "big"),
-                )
-                element_size = 4
-            elif element_type == ElementType.I64:
-                page.update(
-                    element_name,
-                    ElementType.I64,
-                    int.from_bytes(current_array[0:8], "big", signed=True),
-                )
-                element_size = 8
-            elif element_type == ElementType.U64:
-                page.update(
-                    element_name,
-                    ElementType.U64,
-                    int.from_bytes(current_array[0:8], "big"),
-                )
-                element_size = 8
-            elif element_type == ElementType.F32:
-                page.update(
-                    element_name,
-                    ElementType.F32,
-                    # < means little-endian
-                    struct.unpack("<f", current_array[0:4]),
+                element = Element(
+                    _field_value(
+                        element_type, row, column, string_array, byte_array, encoding
+                    ),
+                    element_type,
                 )
-                element_size = 4
-            elif element_type == ElementType.STRING:
-                string_offset = int.from_bytes(current_array[0:4], "big")
-                string_end = string_offset + string_array[string_offset:].index(0x00)
-                string = string_array[string_offset:string_end].decode(encoding)
-                page.update(element_name, ElementType.STRING, string)
-                element_size = 4
-            elif element_type == ElementType.BYTES:
-                data_offset = int.from_bytes(current_array[0:4], "big")
-                data_end = int.from_bytes(current_array[4:8], "big")
-                page.update(
-                    element_name,
-                    ElementType.BYTES,
-                    byte_array[data_offset:data_end],
-                )
-                element_size = 8
-            else:
-                # Should be caught at element_type's initialization
-                raise ValueError(f"Unknown element type: {element_type}")
 
-            if element_occurrence is ElementOccurrence.RECURRING:
-                shared_array = shared_array[element_size:]
-            else:
-                unique_array = unique_array[element_size:]
+            if element_name == "fmtver":
+                continue
+            if element_name == "filename":
+                # Replace ugly Windows path style with Unix style
+                element = Element(element.val.replace("\\", "/"), element_type)
+
+            page_dict[element_name] = element
+
+        pages.append(UsmPage(page_name, page_dict))
 
     return pages
 
 
+def _field_value(
+    element_type: ElementType,
+    fields: Tuple[Any, ...],
+    column: int,
+    string_array: bytearray,
+    byte_array: bytearray,
+    encoding: str,
+) -> Any:
+    if element_type is ElementType.F32:
+        return _F32.unpack(fields[column])[0]
+    if element_type is ElementType.STRING:
+        return _read_string(string_array, fields[column], encoding)
+    if element_type is ElementType.BYTES:
+        return byte_array[fields[column] : fields[column + 1]]
+
+    return fields[column]
+
+
 def pack_pages(
     pages: List[UsmPage],
     encoding: str,
@@ -267,22 +358,42 @@ def pack_pages(
         return bytes()
 
     page_name = pages[0].name
-    keys = set()
-    num_keys = len(pages[0].dict.keys())
+    names = list(pages[0].dict.keys())
 
     # Check if pages have the same name and the same keys.
     for page in pages:
         if page_name != page.name:
             raise ValueError("Pages don't have the same names.")
 
-        if num_keys != len(page.dict.keys()):
+        if page.dict.keys() != pages[0].dict.keys():
             raise ValueError("Pages don't have the same keys.")
 
-        for key in page.dict.keys():
-            keys.add(key)
+    return _pack_columns(
+        page_name,
+        names,
+        [pages[0][name].type for name in names],
+        [[page[name].val for page in pages] for name in names],
+        len(pages),
+        encoding,
+        string_padding,
+    )
+
+
+def _pack_columns(
+    page_name: str,
+    names: List[str],
+    element_types: List[ElementType],
+    columns: List[Sequence[Any]],
+    num_pages: int,
+    encoding: str,
+    string_padding: int = 0,
+) -> bytes:
+    """Packs pages given as a column of values per element."""
+    if num_pages == 0:
+        return bytes()
 
-    if len(keys) != num_keys:
-        raise ValueError("Pages don't have the same keys.")
+    # Element names in page order, so the output doesn't depend on string hashing
+    keys = dict.fromkeys(names)
 
     # Initialize string array with "<NULL>" and terminate string with null-byte (C-string)
     # TODO: What does "<NULL>" suppose to mean?
@@ -292,91 +403,75 @@ def pack_pages(
     page_name_offset = len(string_array)
     string_array += bytes(page_name, "UTF-8") + bytes(1)
 
-    # Dict with all the values
-    # Key is page key
-    # Tuple is the element name offset and the set is a set of all pages' values
-    elements: Dict[str, Tuple[int, Set[Element]]] = {}
-
+    element_name_offsets: Dict[str, int] = {}
     for key in keys:
-        element_name_offset = len(string_array)
+        element_name_offsets[key] = len(string_array)
         string_array += bytes(key, "UTF-8") + bytes(1)
 
-        values = set()
-        for page in pages:
-            values.add(page[key])
+    # Elements with the same value in every page are only encoded once
+    layout: List[Tuple[str, ElementType, bool, Sequence[Any]]] = []
+    for name, element_type, column in zip(names, element_types, columns):
+        first = column[0]
+        is_recurring = num_pages > 1 and all(value == first for value in column)
+        layout.append((name, element_type, is_recurring, column))
 
-        elements.update({key: (element_name_offset, values)})
-
-    common_elements = [
-        name
-        for name, (_, values) in elements.items()
-        if len(values) == 1 and len(pages) > 1
-    ]
+    unique_types = tuple(
+        element_type for _, element_type, is_recurring, _ in layout if not is_recurring
+    )
+    row_struct = _compile_schema(unique_types, True)
+    is_plain = all(
+        _element_kind(element_type) == _PLAIN for element_type in unique_types
+    )
 
     # Generate s and d array
     shared_array = bytearray()
     unique_array = bytearray()
     byte_array = bytearray()
-    for i, page in enumerate(pages):
-        for element_name, element in page.dict.items():
-            element_type_packed = int(element.type.value)
-            if element_name in common_elements:
-                # We only need to encode payload once since it's recurring for the same key
-                if i != 0:
-                    continue
-
-                element_type_packed += int(ElementOccurrence.RECURRING.value) << 5
-                shared_array += element_type_packed.to_bytes(1, "big")
-
-                element_name_offset = elements[element_name][0]
-                shared_array += element_name_offset.to_bytes(4, "big")
-
-                current_array = shared_array
-            else:
-                # We only need to encode payload **about** non-recurring values once
-                # But we encode actual payload every time since they're not recurring
-                if i == 0:
-                    element_type_packed += (
-                        int(ElementOccurrence.NON_RECURRING.value) << 5
-                    )
-                    shared_array += element_type_packed.to_bytes(1, "big")
-
-                    element_name_offset = elements[element_name][0]
-                    shared_array += element_name_offset.to_bytes(4, "big")
-
-                current_array = unique_array
-
-            if element.type == ElementType.I8:
-                current_array += element.val.to_bytes(1, "big", signed=True)
-            elif element.type == ElementType.U8:
-                current_array += element.val.to_bytes(1, "big")
-            elif element.type == ElementType.I16:
-                current_array += element.val.to_bytes(2, "big", signed=True)
-            elif element.type == ElementType.U16:
-                current_array += element.val.to_bytes(2, "big")
-            elif element.type == ElementType.I32:
-                current_array += element.val.to_bytes(4, "big", signed=True)
-            elif element.type == ElementType.U32:
-                current_array += element.val.to_bytes(4, "big")
-            elif element.type == ElementType.I64:
-                current_array += element.val.to_bytes(8, "big", signed=True)
-            elif element.type == ElementType.U64:
-                current_array += element.val.to_bytes(8, "big")
-            elif element.type == ElementType.F32:
-                # < means little-endian
-                current_array += struct.pack("<f", element.val)
-            elif element.type == ElementType.STRING:
-                value_offset = len(string_array)
-                string_array += bytes(element.val, encoding) + bytes(1)
-                current_array += value_offset.to_bytes(4, "big")
-            elif element.type == ElementType.BYTES:
-                bytes_offset = len(byte_array)
-                bytes_end = bytes_offset + len(element.val)
-                current_array += bytes_offset.to_bytes(4, "big")
-                current_array += bytes_end.to_bytes(4, "big")
-                byte_array += element.val
+    for i in range(num_pages):
+        if i != 0 and is_plain:
+            # Pack the remaining pages' numbers in one go
+            unique_columns = [
+                column[i:]
+                for _, _, is_recurring, column in layout
+                if not is_recurring
+            ]
+            if len(unique_columns) != 0:
+                unique_array += b"".join(
+                    row_struct.pack(*row) for row in zip(*unique_columns)
+                )
+            break
+
+        fields: List[Any] = []
+        for element_name, element_type, is_recurring, column in layout:
+            # We only need to encode payload once since it's recurring for the same key
+            if is_recurring and i != 0:
+                continue
+
+            # We only need to encode payload **about** elements once
+            if i == 0:
+                occurrence = (
+                    ElementOccurrence.RECURRING
+                    if is_recurring
+                    else ElementOccurrence.NON_RECURRING
+                )
+                shared_array.append(element_type.value + (occurrence.value << 5))
+                shared_array += element_name_offsets[element_name].to_bytes(4, "big")
+
+            element_fields = _pack_fields(
+                element_type,
+                column[i],
+                string_array,
+                byte_array,
+                encoding,
+            )
+            if is_recurring:
+                shared_array += _compile_schema((element_type,), True).pack(
+                    *element_fields
+                )
             else:
-                raise ValueError(f"Unknown element type {element.type}.")
+                fields.extend(element_fields)
+
+        unique_array += row_struct.pack(*fields)
 
     string_array += bytes(string_padding)
 
@@ -399,10 +494,10 @@ def pack_pages(
     result += page_name_offset.to_bytes(4, "big")
     result += len(keys).to_bytes(2, "big")
 
-    unique_array_size_per_page = len(unique_array) // len(pages)
+    unique_array_size_per_page = len(unique_array) // num_pages
     result += unique_array_size_per_page.to_bytes(2, "big")
 
-    result += len(pages).to_bytes(4, "big")
+    result += num_pages.to_bytes(4, "big")
 
     result += shared_array
     result += unique_array
@@ -411,15 +506,179 @@ def pack_pages(
     return bytes(result)
 
 
-def keyframes_from_seek_pages(seek_pages: Optional[List[UsmPage]]) -> List[int]:
-    result = []
+def _pack_fields(
+    element_type: ElementType,
+    value: Any,
+    string_array: bytearray,
+    byte_array: bytearray,
+    encoding: str,
+) -> Tuple[Any, ...]:
+    if element_type is ElementType.F32:
+        return (_F32.pack(value),)
+    if element_type is ElementType.STRING:
+        value_offset = len(string_array)
+        string_array += bytes(value, encoding) + bytes(1)
+        return (value_offset,)
+    if element_type is ElementType.BYTES:
+        bytes_offset = len(byte_array)
+        byte_array += value
+        return bytes_offset, len(byte_array)
+
+    return (value,)
+
+
+class SeekTable:
+    """Columnar form of a video's VIDEO_SEEKINFO pages, with one entry per
+    keyframe. Holds the byte offset of each keyframe's chunk in ofs_byte and
+    its frame number in ofs_frmid, sorted by frame number."""
+
+    PAGE_NAME = "VIDEO_SEEKINFO"
+    DEFAULT_ELEMENT_TYPES = {
+        "ofs_byte": ElementType.I64,
+        "ofs_frmid": ElementType.U32,
+        "num_skip": ElementType.U16,
+        "resv": ElementType.U16,
+    }
+
+    def __init__(
+        self,
+        ofs_byte: Optional[Iterable[int]] = None,
+        ofs_frmid: Optional[Iterable[int]] = None,
+        num_skip: Optional[Iterable[int]] = None,
+        resv: Optional[Iterable[int]] = None,
+        element_types: Optional[Dict[str, ElementType]] = None,
+    ) -> None:
+        self.ofs_byte = array("q", [] if ofs_byte is None else ofs_byte)
+        self.ofs_frmid = array("q", [] if ofs_frmid is None else ofs_frmid)
+        zeros = [0] * len(self.ofs_byte)
+        self.num_skip = array("q", zeros if num_skip is None else num_skip)
+        self.resv = array("q", zeros if resv is None else resv)
+        if not (
+            len(self.ofs_byte)
+            == len(self.ofs_frmid)
+            == len(self.num_skip)
+            == len(self.resv)
+        ):
+            raise ValueError("Seek table columns don't have the same length.")
+
+        # Element names in page order and their types
+        if element_types is None:
+            self.element_types = dict(self.DEFAULT_ELEMENT_TYPES)
+        else:
+            self.element_types = element_types
+
+    def __len__(self) -> int:
+        return len(self.ofs_byte)
+
+    @property
+    def keyframes(self) -> FrozenSet[int]:
+        """Frame numbers of the keyframes."""
+        return frozenset(self.ofs_frmid)
+
+    def find(self, frame: int) -> Tuple[int, int]:
+        """Returns the frame number and byte offset of the closest keyframe at
+        or before the given frame."""
+        i = bisect.bisect_right(self.ofs_frmid, frame) - 1
+        if i < 0:
+            raise ValueError(f"No keyframe at or before frame {frame}")
+
+        return self.ofs_frmid[i], self.ofs_byte[i]
+
+    def shift(self, offset: int) -> None:
+        """Adds an offset to every ofs_byte."""
+        self.ofs_byte = array("q", [ofs + offset for ofs in self.ofs_byte])
+
+    @classmethod
+    def from_pages(cls, pages: List[UsmPage]) -> SeekTable:
+        if len(pages) == 0:
+            return cls()
+        if any(page.name != cls.PAGE_NAME for page in pages):
+            raise ValueError(f"Page name is not '{cls.PAGE_NAME}'")
+
+        element_types = {
+            name: element.type for name, element in pages[0].dict.items()
+        }
+        cls._check_element_types(element_types)
+        return cls(
+            **{name: [page[name].val for page in pages] for name in element_types},
+            element_types=element_types,
+        )
+
+    @classmethod
+    def from_bytes(cls, info: bytearray, encoding: str = "UTF-8") -> SeekTable:
+        """Loads a seek table from a list of pages payload without creating
+        a UsmPage for every keyframe."""
+        schema = _unpack_rows(info, encoding)
+        if schema.page_name != cls.PAGE_NAME:
+            raise ValueError(f"Page name is not '{cls.PAGE_NAME}'")
+
+        element_types = {
+            name: element_type for name, element_type, *_ in schema.columns
+        }
+        cls._check_element_types(element_types)
+
+        fields = list(zip(*schema.rows))
+        values: Dict[str, Iterable[int]] = {}
+        for name, _, _, column, element in schema.columns:
+            if element is None:
+                values[name] = fields[column]
+            else:
+                values[name] = [element.val] * schema.num_pages
+
+        return cls(**values, element_types=element_types)
+
+    @classmethod
+    def _check_element_types(cls, element_types: Dict[str, ElementType]) -> None:
+        if element_types.keys() != cls.DEFAULT_ELEMENT_TYPES.keys():
+            raise ValueError(
+                f"Unsupported seek info elements: {', '.join(element_types)}"
+            )
+        for element_type in element_types.values():
+            if _element_kind(element_type) != _PLAIN:
+                raise ValueError(
+                    f"Unsupported seek info element type {element_type}"
+                )
+
+    def to_pages(self) -> List[UsmPage]:
+        columns = {name: getattr(self, name) for name in self.element_types}
+        pages = []
+        for i in range(len(self)):
+            page = UsmPage(self.PAGE_NAME)
+            for name, element_type in self.element_types.items():
+                page.update(name, element_type, columns[name][i])
+
+            pages.append(page)
+
+        return pages
+
+    def pack(self, encoding: str = "UTF-8") -> bytes:
+        """Packs the seek table the same way as pack_pages would its pages."""
+        names = list(self.element_types)
+        return _pack_columns(
+            self.PAGE_NAME,
+            names,
+            list(self.element_types.values()),
+            [getattr(self, name) for name in names],
+            len(self),
+            encoding,
+        )
+
+
+def keyframes_from_seek_pages(
+    seek_pages: Optional[Union[List[UsmPage], SeekTable]],
+) -> FrozenSet[int]:
+    """Returns the frame numbers of the keyframes listed in VIDEO_SEEKINFO pages
+    or a seek table."""
     if seek_pages is None:
-        return result
+        return frozenset()
+    if isinstance(seek_pages, SeekTable):
+        return seek_pages.keyframes
 
+    result = []
     for seek in seek_pages:
         if seek.name != "VIDEO_SEEKINFO":
             raise ValueError("Page name is not 'VIDEO_SEEKINFO'")
 
         result.append(seek["ofs_frmid"].val)
 
-    return result
+    return frozenset(result)
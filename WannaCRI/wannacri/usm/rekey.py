@@ -0,0 +1,117 @@
+import logging
+import mmap
+import os
+import pathlib
+import shutil
+from typing import Callable, List, Optional, Tuple, Union
+
+from .index import UsmIndex
+from .tools import (
+    bytes_to_hex,
+    decrypt_audio_packet,
+    decrypt_video_packet,
+    encrypt_audio_packet,
+    encrypt_video_packet,
+    generate_keys,
+    is_usm,
+)
+
+
+def rekey_usm(
+    filepath: Union[str, pathlib.Path],
+    key: Optional[int],
+    old_key: Optional[int] = None,
+    out: Optional[Union[str, pathlib.Path]] = None,
+    encoding: str = "UTF-8",
+) -> int:
+    """Changes the key of a Usm by rewriting only its stream payloads.
+
+    Encryption doesn't change the size of payloads, so the chunks are left
+    where they are and every payload is transformed within a writable mmap,
+    in file order. Payloads are decrypted with old_key, or taken as plaintext
+    if it's None, then encrypted with key, or left as plaintext if it's None.
+
+    The Usm is changed in place unless given out, in which case it's copied
+    to out first and the copy is changed. An interrupted in place rekey
+    leaves a Usm with payloads under both keys.
+
+    Returns the number of payloads rewritten."""
+    if key is None and old_key is None:
+        raise ValueError("No keys given for rekeying.")
+
+    if out is not None and os.path.abspath(out) != os.path.abspath(filepath):
+        shutil.copyfile(filepath, out)
+        filepath = out
+
+    filesize = os.path.getsize(filepath)
+    if filesize <= 0x20:
+        raise ValueError(f"File {filepath} too small.")
+
+    video_crypt, audio_crypt = _rekey_functions(key, old_key)
+    logging.info(
+        "Rekeying USM.",
+        extra={
+            "usm_name": os.path.basename(filepath),
+            "size": filesize,
+            "is_old_key_given": old_key is not None,
+            "is_key_given": key is not None,
+        },
+    )
+
+    with open(filepath, "r+b") as usmfile, mmap.mmap(
+        usmfile.fileno(), 0, access=mmap.ACCESS_WRITE
+    ) as data:
+        with memoryview(data) as view:
+            if not is_usm(view[:4]):
+                raise ValueError(f"Invalid file signature: {bytes_to_hex(view[:4])}")
+
+            index = UsmIndex.from_file(view, filesize, encoding)
+
+        # Payloads of every channel sorted by offset, so the file is
+        # read and written sequentially
+        payloads: List[Tuple[int, int, bool]] = []
+        for channels, is_audio in (
+            (index.videos, False),
+            (index.alphas, False),
+            (index.audios, True),
+        ):
+            for channel in channels.values():
+                payloads.extend(
+                    (offset, size, is_audio) for offset, size in channel.stream
+                )
+
+        payloads.sort()
+        for offset, size, is_audio in payloads:
+            crypt = audio_crypt if is_audio else video_crypt
+            data[offset : offset + size] = crypt(data[offset : offset + size])
+
+        data.flush()
+
+    return len(payloads)
+
+
+def _rekey_functions(
+    key: Optional[int], old_key: Optional[int]
+) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    """Video and audio payload functions decrypting with old_key then
+    encrypting with key, skipping either step if its key is None."""
+    old_video_key, old_audio_key = (
+        (None, None) if old_key is None else generate_keys(old_key)
+    )
+    video_key, audio_key = (None, None) if key is None else generate_keys(key)
+
+    def video_crypt(packet: bytes) -> bytes:
+        if old_video_key is not None:
+            packet = decrypt_video_packet(packet, old_video_key)
+        if video_key is not None:
+            packet = encrypt_video_packet(packet, video_key)
+        return packet
+
+    def audio_crypt(packet: bytes) -> bytes:
+        if old_audio_key is not None:
+            packet = decrypt_audio_packet(packet, old_audio_key)
+        if audio_key is not None:
+            packet = encrypt_audio_packet(packet, audio_key)
+        return packet
+
+    return video_crypt, audio_crypt
@@ -1,6 +1,7 @@
 from collections.abc import Generator
+import functools
 import math
-from typing import Tuple, IO, List, Callable, Union
+from typing import Tuple, IO, Iterable, List, Callable, Union, Collection
 import threading
 import unicodedata
 import re
@@ -103,6 +104,37 @@ def generate_keys(key_num: int) -> Tuple[bytes, bytes]:
     return bytes(video_key), bytes(audio_key)
 
 
+def _tile_key(key: bytes, size: int) -> bytes:
+    """Repeats key until it is size bytes long."""
+    repeats, remainder = divmod(size, len(key))
+    return key * repeats + key[:remainder]
+
+
+def _xor_scan(value: int, stride: int, size: int) -> int:
+    """Prefix XOR of a big-endian integer of size bytes along a byte stride.
+    Byte i of the result is the XOR of bytes i, i - stride, i - 2 * stride, ...
+    of the input. Runs in log2(size / stride) whole-buffer operations.
+    """
+    shift = stride * 8
+    total_bits = size * 8
+    while shift < total_bits:
+        value ^= value >> shift
+        shift <<= 1
+
+    return value
+
+
+def _crypt_video_prefix(data: bytearray, video_key: bytes) -> None:
+    """Encrypt/decrypt the 0x100 bytes at 0x40 of a video packet in place. The
+    rolling key of this section is seeded by the plaintext bytes at 0x140.
+    """
+    plaintext = int.from_bytes(data[0x140:0x240], "big")
+    rolling = _xor_scan(plaintext, 0x20, 0x100)
+    rolling ^= int.from_bytes(_tile_key(video_key[:0x20], 0x100), "big")
+    section = int.from_bytes(data[0x40:0x140], "big") ^ rolling
+    data[0x40:0x140] = section.to_bytes(0x100, "big")
+
+
 def decrypt_video_packet(packet: bytes, video_key: bytes) -> bytes:
     """Decrypt an encrypted videos stream payload. Skips decryption if packet is
     less than 0x240 bytes.
@@ -111,16 +143,16 @@ def decrypt_video_packet(packet: bytes, video_key: bytes) -> bytes:
         raise ValueError(f"Video key should be 0x40 bytes long. Given {len(video_key)}")
 
     data = bytearray(packet)
-    encrypted_part_size = len(data) - 0x40
-    if encrypted_part_size >= 0x200:
-        rolling = bytearray(video_key)
-        for i in range(0x100, encrypted_part_size):
-            data[0x40 + i] ^= rolling[0x20 + i % 0x20]
-            rolling[0x20 + i % 0x20] = data[0x40 + i] ^ video_key[0x20 + i % 0x20]
+    if len(data) >= 0x240:
+        # Every byte after 0x140 is XORed with the plaintext byte 0x20 before it
+        # and the second half of the key, which unrolls into a strided prefix XOR.
+        size = len(data) - 0x140
+        key = int.from_bytes(_tile_key(video_key[0x20:0x40], size), "big")
+        ciphertext = int.from_bytes(data[0x140:], "big")
+        plaintext = _xor_scan(ciphertext ^ key, 0x20, size)
+        data[0x140:] = plaintext.to_bytes(size, "big")
 
-        for i in range(0x100):
-            rolling[i % 0x20] ^= data[0x140 + i]
-            data[0x40 + i] ^= rolling[i % 0x20]
+        _crypt_video_prefix(data, video_key)
 
     return bytes(data)
 
@@ -134,28 +166,36 @@ def encrypt_video_packet(packet: bytes, video_key: bytes) -> bytes:
 
     data = bytearray(packet)
     if len(data) >= 0x240:
-        encrypted_part_size = len(data) - 0x40
-        rolling = bytearray(video_key)
-        for i in range(0x100):
-            rolling[i % 0x20] ^= data[0x140 + i]
-            data[0x40 + i] ^= rolling[i % 0x20]
+        _crypt_video_prefix(data, video_key)
 
-        for i in range(0x100, encrypted_part_size):
-            plainbyte = data[0x40 + i]
-            data[0x40 + i] ^= rolling[0x20 + i % 0x20]
-            rolling[0x20 + i % 0x20] = plainbyte ^ video_key[0x20 + i % 0x20]
+        size = len(data) - 0x140
+        key = int.from_bytes(_tile_key(video_key[0x20:0x40], size), "big")
+        plaintext = int.from_bytes(data[0x140:], "big")
+        ciphertext = plaintext ^ (plaintext >> 0x100) ^ key
+        data[0x140:] = ciphertext.to_bytes(size, "big")
 
     return bytes(data)
 
 
+@functools.lru_cache(maxsize=16)
+def _audio_key_tile(key: bytes, size: int) -> int:
+    """The audio key repeated over size bytes as a big-endian integer. Audio
+    packets of a stream mostly share the same size, so this is cached per key
+    and size to make every packet a single XOR.
+    """
+    return int.from_bytes(_tile_key(key[:0x20], size), "big")
+
+
 def _crypt_audio_packet(packet: bytes, key: bytes) -> bytes:
     """Encrypt/decrypt a plaintext/encrypted audios stream payload. Skips encryption/decryption
     if packet is less than or equal to 0x140 bytes.
     """
     data = bytearray(packet)
     if len(data) > 0x140:
-        for i in range(0x140, len(data)):
-            data[i] ^= key[i % 0x20]
+        # 0x140 is a multiple of the key length, so the tile lines up with i % 0x20
+        size = len(data) - 0x140
+        tail = int.from_bytes(data[0x140:], "big") ^ _audio_key_tile(bytes(key), size)
+        data[0x140:] = tail.to_bytes(size, "big")
 
     return bytes(data)
 
@@ -218,18 +258,16 @@ def is_usm(magic: bytes) -> bool:
 def video_sink(
     usmfile: IO,
     usmmutex: threading.Lock,
-    offsets_and_sizes: List[Tuple[int, int]],
-    keyframes: List[int],
+    offsets_and_sizes: Iterable[Tuple[int, int]],
+    keyframes: Collection[int],
 ) -> Generator[Tuple[bytes, bool], None, None]:
     """A generator for videos chunk payloads. Takes a handle of a usm file, a mutex,
-    a list of tuples of a chunk payload's offset and size, and a list of keyframes'
+    a list of tuples of a chunk payload's offset and size, and a set of keyframes'
     frame number.
 
     Yields the raw chunk payload and a bool whether the frame is a keyframe or not.
     All in chronological order."""
-    num_frames = len(offsets_and_sizes)
-    for i in range(num_frames):
-        offset, size = offsets_and_sizes[i]
+    for i, (offset, size) in enumerate(offsets_and_sizes):
         is_keyframe = i in keyframes
         with usmmutex:
             usmfile.seek(offset)
@@ -239,17 +277,40 @@ def video_sink(
 
 
 def audio_sink(
-    usmfile: IO, usmmutex: threading.Lock, offsets_and_sizes: list
+    usmfile: IO, usmmutex: threading.Lock, offsets_and_sizes: Iterable[Tuple[int, int]]
 ) -> Generator[bytes, None, None]:
     """A generator for audios chunk payloads. Takes a handle of a usm file, a mutex,
     and a list of tuples of a chunk payload's offset and size.
 
     Yields the raw chunk payload in chronological order."""
-    num_frames = len(offsets_and_sizes)
-    for i in range(num_frames):
-        offset, size = offsets_and_sizes[i]
+    for offset, size in offsets_and_sizes:
         with usmmutex:
             usmfile.seek(offset)
             frame = usmfile.read(size)
 
         yield frame
+
+
+def video_view_sink(
+    buffer: memoryview,
+    offsets_and_sizes: Iterable[Tuple[int, int]],
+    keyframes: Collection[int],
+) -> Generator[Tuple[memoryview, bool], None, None]:
+    """Same as video_sink but for a usm that's mapped in memory. Takes a memoryview
+    of the whole usm instead of a file handle and a mutex.
+
+    Yields zero-copy views of the chunk payloads and a bool whether the frame is a
+    keyframe or not. All in chronological order."""
+    for i, (offset, size) in enumerate(offsets_and_sizes):
+        yield buffer[offset : offset + size], i in keyframes
+
+
+def audio_view_sink(
+    buffer: memoryview, offsets_and_sizes: Iterable[Tuple[int, int]]
+) -> Generator[memoryview, None, None]:
+    """Same as audio_sink but for a usm that's mapped in memory. Takes a memoryview
+    of the whole usm instead of a file handle and a mutex.
+
+    Yields zero-copy views of the chunk payloads in chronological order."""
+    for offset, size in offsets_and_sizes:
+        yield buffer[offset : offset + size]
@@ -21,13 +21,13 @@ class ChunkType(Enum):
 
     @staticmethod
     def from_bytes(data: bytes) -> ChunkType:
-        data = bytearray(data)
-        enums = [(enum.value, enum) for enum in ChunkType]
-        for enum_value, enum_type in enums:
-            if data[:4] == enum_value:
-                return enum_type
-
-        raise ValueError(f"Unknown chunk signature: {bytes_to_hex(data[:4])}")
+        signature = bytes(data[:4])
+        try:
+            return ChunkType(signature)
+        except ValueError:
+            raise ValueError(
+                f"Unknown chunk signature: {bytes_to_hex(signature)}"
+            ) from None
 
     @staticmethod
     def all_values() -> List[bytes]:
@@ -60,12 +60,10 @@ class PayloadType(Enum):
 
     @staticmethod
     def from_int(value: int) -> PayloadType:
-        enums = [(enum.value, enum) for enum in PayloadType]
-        for enum_value, enum_type in enums:
-            if value == enum_value:
-                return enum_type
-
-        raise ValueError(f"Value {value} is outside of valid values.")
+        try:
+            return PayloadType(value)
+        except ValueError:
+            raise ValueError(f"Value {value} is outside of valid values.") from None
 
 
 class ElementOccurrence(Enum):
@@ -1,41 +1,52 @@
 from __future__ import annotations
 
 import math
+import mmap
 import os
 import logging
 import pathlib
 import threading
-from collections import defaultdict
-from dataclasses import dataclass
+from collections import defaultdict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
 from tempfile import TemporaryFile
-from typing import List, Optional, Union, Tuple, Dict, Generator, IO, Callable
+from typing import (
+    List,
+    Optional,
+    Union,
+    Tuple,
+    Dict,
+    Generator,
+    IO,
+    Callable,
+    Sequence,
+    Collection,
+    Iterable,
+    Deque,
+)
 
 from .tools import (
     generate_keys,
+    encrypt_video_packet,
+    decrypt_video_packet,
+    encrypt_audio_packet,
+    decrypt_audio_packet,
     chunk_size_and_padding,
     bytes_to_hex,
     is_usm,
     video_sink,
     audio_sink,
+    video_view_sink,
+    audio_view_sink,
     slugify,
     pad_to_next_sector,
 )
 from .types import ChunkType, PayloadType, ElementType, OpMode
-from .page import UsmPage, keyframes_from_seek_pages
+from .page import UsmPage, SeekTable, keyframes_from_seek_pages
 from .chunk import UsmChunk
+from .index import UsmChannel, UsmIndex, UsmIndexCache
 from .media import GenericVideo, GenericAudio, UsmVideo, UsmAudio
 
 
-@dataclass
-class UsmChannel:
-    """Intermediate class for holding information on a UsmVideo
-    and UsmAudio from a parsed Usm."""
-
-    stream: List[Tuple[int, int]]
-    header: UsmPage
-    metadata: Optional[List[UsmPage]] = None
-
-
 class Usm:
     def __init__(
         self,
@@ -67,6 +78,10 @@ class Usm:
 
         self._usm_crid = usm_crid
         self._max_packet_size = 1
+        # Index and file of a Usm loaded with open, for reading single frames
+        self._index: Optional[UsmIndex] = None
+        self._source: Optional[Union[IO, memoryview]] = None
+        self._source_mutex = threading.Lock()
 
         logging.info(
             "Initialising USM",
@@ -98,8 +113,8 @@ class Usm:
         if self._usm_crid is not None:
             crid_filename = self._usm_crid.get("filename")
             if crid_filename is not None:
-                assert isinstance(crid_filename, str)
-                return crid_filename.split("/")[-1]
+                assert isinstance(crid_filename.val, str)
+                return crid_filename.val.split("/")[-1]
 
         video_filename = self.videos[0].crid_page.get("filename")
         video_filename = './videos'
@@ -146,12 +161,28 @@ class Usm:
         filepath: Union[str, pathlib.Path],
         key: Optional[int] = None,
         encoding: str = "UTF-8",
+        use_mmap: bool = False,
+        index: Optional[UsmIndex] = None,
+        index_cache: Optional[UsmIndexCache] = None,
     ) -> Usm:
+        """Load a Usm from a file. With use_mmap the file is memory-mapped and
+        the videos and audios of the returned Usm yield zero-copy memoryviews
+        of their payloads instead of reading them from a file handle.
+
+        A UsmIndex of the same file can be given to skip indexing it again. Or
+        given a UsmIndexCache, the index is loaded from it when the file hasn't
+        changed and saved to it otherwise."""
         filesize = os.path.getsize(filepath)
         if filesize <= 0x20:
             raise ValueError(f"File {filepath} too small.")
 
-        usmfile = open(filepath, "rb")
+        usmfile: Union[IO, memoryview] = open(filepath, "rb")
+        if use_mmap:
+            with usmfile:
+                usmfile = memoryview(
+                    mmap.mmap(usmfile.fileno(), 0, access=mmap.ACCESS_READ)
+                )
+
         filename = os.path.basename(filepath)
         logging.info(
             "Loading USM from file.",
@@ -160,20 +191,46 @@ class Usm:
                 "size": filesize,
                 "encoding": encoding,
                 "is_key_given": key is not None,
+                "use_mmap": use_mmap,
             },
         )
 
-        signature = usmfile.read(4)
+        if isinstance(usmfile, memoryview):
+            signature = usmfile[:4]
+        else:
+            signature = usmfile.read(4)
 
         if not is_usm(signature):
             raise ValueError(f"Invalid file signature: {bytes_to_hex(signature)}")
 
-        crids, video_channels, audio_channels, alpha_channels = _process_chunks(
-            usmfile, filesize, encoding
-        )
+        if index is None and index_cache is not None:
+            index = index_cache.get(filepath, encoding)
+            if index is None:
+                index = UsmIndex.from_file(usmfile, filesize, encoding)
+                index_cache.put(filepath, index, encoding)
+        elif index is None:
+            index = UsmIndex.from_file(usmfile, filesize, encoding)
+
+        crids = index.crids
+        video_channels = index.videos
+        audio_channels = index.audios
+        alpha_channels = index.alphas
 
         # We don't need a mutex because of the GIL, but it feels dirty without one
         usmmutex = threading.Lock()
+
+        def make_video_sink(channel: UsmChannel, keyframes: Collection[int]):
+            if isinstance(usmfile, memoryview):
+                return video_view_sink(usmfile, channel.stream, keyframes)
+
+            return video_sink(usmfile, usmmutex, channel.stream, keyframes)
+
+        def make_audio_sink(channel: UsmChannel):
+            if isinstance(usmfile, memoryview):
+                return audio_view_sink(usmfile, channel.stream)
+
+            return audio_sink(usmfile, usmmutex, channel.stream)
+
         videos = []
         audios = []
         alphas = []
@@ -195,18 +252,21 @@ class Usm:
                 if video_fmtver is not None and isinstance(video_fmtver.val, int):
                     version = video_fmtver.val
 
+            if video_channel.seek_table is not None:
+                keyframes = video_channel.seek_table.keyframes
+            else:
+                keyframes = keyframes_from_seek_pages(video_channel.metadata)
+
             videos.append(
                 GenericVideo(
-                    video_sink(
-                        usmfile,
-                        usmmutex,
-                        video_channel.stream,
-                        keyframes_from_seek_pages(video_channel.metadata),
-                    ),
+                    make_video_sink(video_channel, keyframes),
                     crid[0],
                     video_channel.header,
-                    len(video_channel.stream),
+                    len(video_channel),
                     channel_number=channel_number,
+                    packet_sizes=video_channel.sizes,
+                    keyframes=keyframes,
+                    seek_table=video_channel.seek_table,
                 )
             )
 
@@ -225,11 +285,12 @@ class Usm:
 
             audios.append(
                 GenericAudio(
-                    audio_sink(usmfile, usmmutex, audio_channel.stream),
+                    make_audio_sink(audio_channel),
                     crid[0],
                     audio_channel.header,
-                    len(audio_channel.stream),
+                    len(audio_channel),
                     channel_number=channel_number,
+                    packet_sizes=audio_channel.sizes,
                 )
             )
 
@@ -246,18 +307,21 @@ class Usm:
             if len(crid) == 0:
                 raise ValueError(f"No crid page found for alpha ch {channel_number}")
 
+            if alpha_channel.seek_table is not None:
+                keyframes = alpha_channel.seek_table.keyframes
+            else:
+                keyframes = keyframes_from_seek_pages(alpha_channel.metadata)
+
             alphas.append(
                 GenericVideo(
-                    video_sink(
-                        usmfile,
-                        usmmutex,
-                        alpha_channel.stream,
-                        keyframes_from_seek_pages(alpha_channel.metadata),
-                    ),
+                    make_video_sink(alpha_channel, keyframes),
                     crid[0],
                     alpha_channel.header,
-                    len(alpha_channel.stream),
+                    len(alpha_channel),
                     channel_number=channel_number,
+                    packet_sizes=alpha_channel.sizes,
+                    keyframes=keyframes,
+                    seek_table=alpha_channel.seek_table,
                     is_alpha=True,
                 )
             )
@@ -270,7 +334,7 @@ class Usm:
         if len(usm_crid) == 0:
             raise ValueError("No usm crid page found.")
 
-        return cls(
+        usm = cls(
             version=version,
             videos=videos,
             audios=audios,
@@ -278,6 +342,118 @@ class Usm:
             key=key,
             usm_crid=usm_crid[0],
         )
+        usm._index = index
+        usm._source = usmfile
+        usm._source_mutex = usmmutex
+        return usm
+
+    def close(self) -> None:
+        """Closes the file, or releases the memory map, of a Usm loaded with
+        open. Its videos and audios can't be streamed afterwards. A memory
+        map is only unmapped once no payload views of it remain."""
+        source, self._source = self._source, None
+        if source is None:
+            return
+
+        if isinstance(source, memoryview):
+            mapping = source.obj
+            source.release()
+            try:
+                mapping.close()
+            except BufferError:
+                # Payload views are still alive, the map is unmapped with them
+                pass
+        else:
+            source.close()
+
+    def __enter__(self) -> Usm:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def read_frame(
+        self, channel: int, index: int, chunk_type: ChunkType = ChunkType.VIDEO
+    ) -> bytes:
+        """Reads a single packet of a channel from the file of a Usm loaded with
+        open. The packet is decrypted if the Usm has a key. Only that packet's
+        payload is read from the file."""
+        usm_channel = self._indexed_channel(channel, chunk_type)
+        if index < 0:
+            index += len(usm_channel)
+        if not 0 <= index < len(usm_channel):
+            raise IndexError(f"Frame {index} out of range for channel {channel}")
+
+        return self._read_packet(
+            usm_channel.offsets[index], usm_channel.sizes[index], chunk_type
+        )
+
+    def iter_frames(
+        self,
+        channel: int,
+        start: int = 0,
+        stop: Optional[int] = None,
+        chunk_type: ChunkType = ChunkType.VIDEO,
+        from_keyframe: bool = False,
+    ) -> Generator[bytes, None, None]:
+        """Reads packets start up to stop of a channel from the file of a Usm
+        loaded with open, decrypted if the Usm has a key. Start and stop follow
+        slice semantics. With from_keyframe, reading starts from the closest
+        keyframe at or before start according to the video's seek info."""
+        usm_channel = self._indexed_channel(channel, chunk_type)
+        frames = range(len(usm_channel))[start:stop]
+        if len(frames) == 0:
+            return
+
+        first = frames.start
+        if from_keyframe:
+            if chunk_type is ChunkType.AUDIO:
+                raise ValueError("Audio channels don't have keyframes.")
+            if usm_channel.seek_table is None or len(usm_channel.seek_table) == 0:
+                raise ValueError(f"No seek info for channel {channel}.")
+
+            first, _ = usm_channel.seek_table.find(first)
+
+        for index in range(first, frames.stop, frames.step):
+            yield self._read_packet(
+                usm_channel.offsets[index], usm_channel.sizes[index], chunk_type
+            )
+
+    def _indexed_channel(self, channel: int, chunk_type: ChunkType) -> UsmChannel:
+        if self._index is None or self._source is None:
+            raise ValueError("Usm was not loaded from a file.")
+
+        if chunk_type is ChunkType.VIDEO:
+            channels = self._index.videos
+        elif chunk_type is ChunkType.AUDIO:
+            channels = self._index.audios
+        elif chunk_type is ChunkType.ALPHA:
+            channels = self._index.alphas
+        else:
+            raise ValueError(f"Unsupported chunk type {chunk_type}.")
+
+        usm_channel = channels.get(channel)
+        if usm_channel is None:
+            raise ValueError(f"No {chunk_type} channel {channel}.")
+
+        return usm_channel
+
+    def _read_packet(self, offset: int, size: int, chunk_type: ChunkType) -> bytes:
+        if isinstance(self._source, memoryview):
+            packet = bytes(self._source[offset : offset + size])
+        else:
+            assert self._source is not None
+            with self._source_mutex:
+                self._source.seek(offset)
+                packet = self._source.read(size)
+
+        if chunk_type is ChunkType.AUDIO:
+            if self.audio_key is not None:
+                packet = decrypt_audio_packet(packet, self.audio_key)
+        elif self.video_key is not None:
+            packet = decrypt_video_packet(packet, self.video_key)
+
+        return packet
 
     def demux(
         self,
@@ -374,6 +550,11 @@ class Usm:
     def chunks(
         self, mode: OpMode = OpMode.NONE, encoding: str = "UTF-8"
     ) -> Generator[UsmChunk, None, None]:
+        plan = _plan_stream(self.max_frame, self.videos, self.audios)
+        if plan is not None:
+            yield from self._planned_chunks(plan, mode, encoding)
+            return
+
         (
             stream_file,
             filesize,
@@ -402,12 +583,21 @@ class Usm:
             stream_file.seek(-0x20, 1)
 
             chunk_size, chunk_padding = chunk_size_and_padding(temp_buf)
-            yield UsmChunk.from_bytes(stream_file.read(chunk_size), encoding=encoding)
+            yield UsmChunk.from_bytes(
+                stream_file.read(chunk_size + 0x20), encoding=encoding
+            )
             stream_file.seek(chunk_padding, 1)
 
     def stream(
         self, mode: OpMode = OpMode.NONE, encoding: str = "UTF-8"
     ) -> Generator[bytes, None, None]:
+        plan = _plan_stream(self.max_frame, self.videos, self.audios)
+        if plan is not None:
+            for chunk in self._planned_chunks(plan, mode, encoding):
+                yield chunk.pack()
+
+            return
+
         (
             stream_file,
             filesize,
@@ -433,99 +623,110 @@ class Usm:
         while filesize > stream_file.tell():
             yield stream_file.read(0x800)
 
+    def write(
+        self,
+        usmfile: IO,
+        mode: OpMode = OpMode.NONE,
+        encoding: str = "UTF-8",
+        workers: Optional[int] = None,
+        batch_size: int = 64,
+    ) -> int:
+        """Writes the Usm to a binary file handle. Chunks are packed into a single
+        reused buffer when the stream can be laid out in advance. Returns the
+        number of bytes written.
+
+        Given a number of workers when encrypting or decrypting, packets are
+        processed in batches of batch_size chunks by a pool of worker processes
+        while finished batches are written. The output is the same as without
+        workers."""
+        if workers is not None and workers <= 0:
+            raise ValueError(f"Given non-positive number of workers: {workers}")
+        if batch_size <= 0:
+            raise ValueError(f"Given non-positive batch size: {batch_size}")
+
+        plan = _plan_stream(self.max_frame, self.videos, self.audios)
+        if plan is None:
+            written = 0
+            for packet in self.stream(mode, encoding):
+                written += usmfile.write(packet)
+
+            return written
+
+        writer = _ChunkWriter(usmfile)
+        if workers is None or mode is OpMode.NONE:
+            return sum(
+                writer.write(chunk)
+                for chunk in self._planned_chunks(plan, mode, encoding)
+            )
 
-def _chunk_helper(default_dict_ch: Dict[int, UsmChannel], chunk: UsmChunk, offset: int):
-    """Helper function for _process_chunks. Fills default_dict_ch with information about
-    the passed chunk and offset."""
-    if chunk.payload_type == PayloadType.STREAM:
-        default_dict_ch[chunk.channel_number].stream.append(
-            (offset + chunk.payload_offset, len(chunk.payload))
-        )
-    elif chunk.payload_type == PayloadType.SECTION_END:
-        logging.debug(
-            f"{chunk.chunk_type} section end",
-            extra={
-                "payload": bytes_to_hex(chunk.payload)
-                if isinstance(chunk.payload, bytes)
-                else chunk.payload,
-                "offset": offset,
-            },
-        )
-    elif chunk.payload_type == PayloadType.HEADER:
-        default_dict_ch[chunk.channel_number].header = chunk.payload[0]
-    elif chunk.payload_type == PayloadType.METADATA:
-        default_dict_ch[chunk.channel_number].metadata = chunk.payload
-    else:
-        raise ValueError(f"Unknown payload type: {chunk.payload_type}")
-
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return sum(
+                writer.write(chunk)
+                for chunk in self._planned_chunks(
+                    plan,
+                    mode,
+                    encoding,
+                    executor=executor,
+                    batch_size=batch_size,
+                    max_pending=workers * 2,
+                )
+            )
 
-def _process_chunks(
-    usmfile: IO,
-    filesize: int,
-    encoding: str,
-) -> Tuple[
-    List[UsmPage], Dict[int, UsmChannel], Dict[int, UsmChannel], Dict[int, UsmChannel]
-]:
-    """Helper function that reads all the chunks in a USM file and returns a tuple of
-    1. A list of USM pages about the contents of the USM file.
-    2. A dictionary of USM video channels.
-    3. A dictionary of USM audio channels.
-    4. A dictionary of USM alpha video channels."""
-    crids: List[UsmPage] = []
-    video_ch: Dict[int, UsmChannel] = defaultdict(
-        lambda: UsmChannel(stream=[], header=UsmPage(""))
-    )
-    audio_ch: Dict[int, UsmChannel] = defaultdict(
-        lambda: UsmChannel(stream=[], header=UsmPage(""))
-    )
-    alpha_ch: Dict[int, UsmChannel] = defaultdict(
-        lambda: UsmChannel(stream=[], header=UsmPage(""))
-    )
+    def _planned_chunks(
+        self,
+        plan: Tuple[int, int, Dict[int, List[Tuple[int, int]]]],
+        mode: OpMode,
+        encoding: str,
+        executor: Optional[Executor] = None,
+        batch_size: int = 64,
+        max_pending: int = 2,
+    ) -> Generator[UsmChunk, None, None]:
+        """Generates all chunks in a single pass given a layout from _plan_stream,
+        instead of packing the stream section into a temporary file first.
 
-    usmfile.seek(0, 0)
-    while filesize > usmfile.tell():
-        # Peek to read chunk's true size and _padding.
-        temp_buf = usmfile.read(0x20)
-        usmfile.seek(-0x20, 1)
-
-        chunk_size, chunk_padding = chunk_size_and_padding(temp_buf)
-        offset = usmfile.tell()
-
-        # Read chunk payload and the 0x20 byte chunk header. Then skip _padding.
-        data = usmfile.read(chunk_size + 0x20)
-        usmfile.seek(chunk_padding, 1)
-
-        try:
-            chunk = UsmChunk.from_bytes(data, encoding=encoding)
-        except ValueError as e:
-            # If in debug mode, continue gathering information about the problematic usm
-            if logging.root.level <= logging.DEBUG:
-                logging.error(e)
-                continue
-            else:
-                raise
+        Given an executor, stream payloads are encrypted or decrypted in batches
+        by the executor, with at most max_pending batches in flight."""
+        filesize, max_packet_size, keyframe_index_and_offsets = plan
+        self._max_packet_size = max_packet_size
 
-        if chunk.chunk_type is ChunkType.INFO:
-            if isinstance(chunk.payload, list):
-                crids.extend(chunk.payload)
-            else:
-                logging.warning(
-                    "Received info chunk payload that's not a list",
-                    extra={"payload": chunk.payload},
-                )
-        # Video chunk
-        elif chunk.chunk_type is ChunkType.VIDEO:
-            _chunk_helper(video_ch, chunk, offset)
+        yield from self._generate_prestream_chunks(
+            stream_filesize=filesize,
+            keyframe_index_and_offsets=keyframe_index_and_offsets,
+            encoding=encoding,
+        )
 
-        # Alpha chunk
-        elif chunk.chunk_type is ChunkType.ALPHA:
-            _chunk_helper(alpha_ch, chunk, offset)
+        stream_chunks: Iterable[UsmChunk] = (
+            chunk
+            for chunks, _, _ in _interleave_chunks(
+                self.max_frame,
+                self.videos,
+                self.audios,
+                mode if executor is None else OpMode.NONE,
+                self.video_key,
+                self.audio_key,
+            )
+            for chunk in chunks
+        )
+        if executor is not None and mode is not OpMode.NONE:
+            stream_chunks = _pipeline_crypt(
+                stream_chunks,
+                mode,
+                self.video_key,
+                self.audio_key,
+                executor,
+                batch_size,
+                max_pending,
+            )
 
-        # Audio chunk
-        elif chunk.chunk_type is ChunkType.AUDIO:
-            _chunk_helper(audio_ch, chunk, offset)
+        position = 0
+        for chunk in stream_chunks:
+            position += len(chunk)
+            yield chunk
 
-    return crids, video_ch, audio_ch, alpha_ch
+        if position != filesize:
+            raise RuntimeError(
+                f"Streamed {position} bytes but packet sizes add up to {filesize}."
+            )
 
 
 def _generate_header_metadata_chunks(
@@ -598,35 +799,33 @@ def _generate_header_metadata_chunks(
             return math.ceil(size / 0x8) * 0x8 - size
 
     metadata_section_size = 0
-    metadata_section_chunks_vid = []
+    metadata_section_chunks_vid: List[Tuple[UsmChunk, Optional[SeekTable]]] = []
     metadata_section_chunks_aud = []
     metadata_section_chunks_sec_end = []
 
     for video in videos:
+        seek_table: Optional[SeekTable] = None
         if video.metadata_pages is None:
             index_and_offsets = keyframe_index_and_offsets[video.channel_number]
-            metadata_pages: List[UsmPage] = []
-            for index, offset in index_and_offsets:
-                page = UsmPage("VIDEO_SEEKINFO")
-                # ofs_byte is modified later
-                page.update("ofs_byte", ElementType.I64, offset)
-                page.update("ofs_frmid", ElementType.U32, index)
-                page.update("num_skip", ElementType.U16, 0)
-                page.update("resv", ElementType.U16, 0)
-                metadata_pages.append(page)
+            # ofs_byte is modified later
+            seek_table = SeekTable(
+                ofs_byte=[offset for _, offset in index_and_offsets],
+                ofs_frmid=[index for index, _ in index_and_offsets],
+            )
+            metadata: Union[bytes, List[UsmPage]] = seek_table.pack(encoding)
         else:
-            metadata_pages = video.metadata_pages
+            metadata = video.metadata_pages
 
         chunk = UsmChunk(
             chunk_type=ChunkType.VIDEO,
             payload_type=PayloadType.METADATA,
-            payload=metadata_pages,
+            payload=metadata,
             padding=metadata_pad,
             channel_number=video.channel_number,
             encoding=encoding,
         )
         metadata_section_size += len(chunk)
-        metadata_section_chunks_vid.append(chunk)
+        metadata_section_chunks_vid.append((chunk, seek_table))
 
     for audio in audios:
         if audio.metadata_pages is None:
@@ -673,16 +872,21 @@ def _generate_header_metadata_chunks(
 
     # ========= YIELD METADATA CHUNKS ==========
 
-    for chunk in metadata_section_chunks_vid:
+    for chunk, seek_table in metadata_section_chunks_vid:
+        # Add 0x800(crid chunks and _padding) and the size of the entire
+        # metadata section to offsets of stream file
+        stream_offset = 0x800 + current_position + metadata_section_size
         payload = chunk.payload
-        if isinstance(payload, bytes):
+        if seek_table is not None:
+            # Shifting offsets doesn't change the packed size of the seek table
+            seek_table.shift(stream_offset)
+            chunk.payload = seek_table.pack(encoding)
+        elif isinstance(payload, bytes):
             raise ValueError("Video metadata is not list of pages.")
         else:
-            # Add 0x800(crid chunks and _padding) and the size of the entire
-            # metadata section to offsets of stream file
             for metadata in payload:
                 offset = metadata["ofs_byte"].val
-                offset += 0x800 + current_position + metadata_section_size
+                offset += stream_offset
                 metadata.update("ofs_byte", ElementType.I64, offset)
 
         yield chunk, current_position + metadata_section_size
@@ -694,14 +898,19 @@ def _generate_header_metadata_chunks(
         yield chunk, current_position + metadata_section_size
 
 
-def _pack_stream(
+def _interleave_chunks(
     max_frames: int,
     videos: List[UsmVideo],
     audios: List[UsmAudio],
     mode: OpMode = OpMode.NONE,
     video_key: Optional[bytes] = None,
     audio_key: Optional[bytes] = None,
-) -> Tuple[IO, int, int, Dict[int, List[Tuple[int, int]]]]:
+) -> Generator[Tuple[List[UsmChunk], int, bool], None, None]:
+    """Generates the stream chunks of videos and audios in the order they're
+    stored in a Usm. Frame by frame, every video then every audio.
+
+    Yields the chunks of a packet, the frame number of the packet, and a bool
+    whether it's a video keyframe or not."""
     videos_iter: List[Callable[[], Tuple[List[UsmChunk], bool]]] = [
         vid.chunks(mode=mode, key=video_key).__next__ for vid in videos
     ]
@@ -709,11 +918,6 @@ def _pack_stream(
         aud.chunks(mode=mode, key=audio_key).__next__ for aud in audios
     ]
 
-    stream_file = TemporaryFile("wb+")
-    keyframe_index_and_offsets: Dict[int, List[Tuple[int, int]]] = defaultdict(
-        lambda: list()
-    )
-    max_packet_size = 1
     for index in range(max_frames):
         finished_video_iters = []
         finished_audio_iters = []
@@ -722,29 +926,22 @@ def _pack_stream(
         for i, vid_tuple in enumerate(videos_iter):
             try:
                 chunks, is_keyframe = vid_tuple()
-                if is_keyframe:
-                    keyframe_index_and_offsets[chunks[0].channel_number].append(
-                        (index, stream_file.tell())
-                    )
-
-                for chunk in chunks:
-                    max_packet_size = max(len(chunk), max_packet_size)
-                    stream_file.write(chunk.pack())
             except StopIteration:
                 finished_video_iters.append(i)
                 continue
 
+            yield chunks, index, is_keyframe
+
         # Process audios generators
         for i, aud_chunk in enumerate(audios_iter):
             try:
                 chunks = aud_chunk()
-                for chunk in chunks:
-                    max_packet_size = max(len(chunk), max_packet_size)
-                    stream_file.write(chunk.pack())
             except StopIteration:
                 finished_audio_iters.append(i)
                 continue
 
+            yield chunks, index, False
+
         # Remove finished audios generators
         videos_iter = [
             vid for i, vid in enumerate(videos_iter) if i not in finished_video_iters
@@ -753,6 +950,187 @@ def _pack_stream(
             aud for i, aud in enumerate(audios_iter) if i not in finished_audio_iters
         ]
 
+
+def _stream_chunk_size(payload_size: int) -> int:
+    """Packed size of a stream chunk made by UsmVideo and UsmAudio's chunks method."""
+    padding = 0x20 - (payload_size % 0x20) if payload_size % 0x20 != 0 else 0
+    return 0x20 + payload_size + padding
+
+
+def _plan_stream(
+    max_frames: int,
+    videos: List[UsmVideo],
+    audios: List[UsmAudio],
+) -> Optional[Tuple[int, int, Dict[int, List[Tuple[int, int]]]]]:
+    """Lays out the stream section of a Usm from packet sizes alone, without
+    reading any packet. Mirrors the order of _interleave_chunks.
+
+    Returns the same stream size, max packet size, and keyframe offsets as
+    _pack_stream. Or None if any video or audio doesn't know its packet sizes."""
+    # Size of the "#CONTENTS END" section end chunk after every last packet
+    section_end_size = 0x40
+
+    medias: List[Tuple[Sequence[int], Optional[Collection[int]], int]] = []
+    for video in videos:
+        if (
+            video.packet_sizes is None
+            or video.keyframes is None
+            or len(video.packet_sizes) != len(video)
+        ):
+            return None
+
+        medias.append((video.packet_sizes, video.keyframes, video.channel_number))
+
+    for audio in audios:
+        if audio.packet_sizes is None or len(audio.packet_sizes) != len(audio):
+            return None
+
+        medias.append((audio.packet_sizes, None, audio.channel_number))
+
+    keyframe_index_and_offsets: Dict[int, List[Tuple[int, int]]] = defaultdict(
+        lambda: list()
+    )
+    position = 0
+    max_packet_size = 1
+    for index in range(max_frames):
+        for sizes, keyframes, channel_number in medias:
+            if index >= len(sizes):
+                continue
+
+            if keyframes is not None and index in keyframes:
+                keyframe_index_and_offsets[channel_number].append((index, position))
+
+            chunk_size = _stream_chunk_size(sizes[index])
+            max_packet_size = max(chunk_size, max_packet_size)
+            position += chunk_size
+            if index == len(sizes) - 1:
+                max_packet_size = max(section_end_size, max_packet_size)
+                position += section_end_size
+
+    return position, max_packet_size, keyframe_index_and_offsets
+
+
+def _crypt_packets(
+    packets: List[Tuple[bytes, bool]],
+    mode: OpMode,
+    video_key: Optional[bytes],
+    audio_key: Optional[bytes],
+) -> List[bytes]:
+    """Encrypts or decrypts a batch of stream payloads. Takes a list of tuples of
+    a payload and a bool whether it's an audio payload. Runs in worker processes
+    for _pipeline_crypt."""
+    if mode is OpMode.ENCRYPT:
+        video_crypt, audio_crypt = encrypt_video_packet, encrypt_audio_packet
+    elif mode is OpMode.DECRYPT:
+        video_crypt, audio_crypt = decrypt_video_packet, decrypt_audio_packet
+    else:
+        raise ValueError(f"Unknown mode {mode}.")
+
+    return [
+        audio_crypt(packet, audio_key) if is_audio else video_crypt(packet, video_key)
+        for packet, is_audio in packets
+    ]
+
+
+def _pipeline_crypt(
+    chunks: Iterable[UsmChunk],
+    mode: OpMode,
+    video_key: Optional[bytes],
+    audio_key: Optional[bytes],
+    executor: Executor,
+    batch_size: int,
+    max_pending: int,
+) -> Generator[UsmChunk, None, None]:
+    """Encrypts or decrypts the stream payloads of plaintext chunks in batches
+    submitted to an executor. Yields the chunks in the same order as given,
+    once their batch is done, while later batches are still being processed."""
+    if video_key is None or audio_key is None:
+        raise ValueError("No keys given for encrypt or decrypt mode.")
+
+    pending: Deque[Tuple[List[UsmChunk], Future]] = deque()
+
+    def submit(batch: List[UsmChunk]):
+        packets = [
+            (bytes(chunk.payload), chunk.chunk_type is ChunkType.AUDIO)
+            for chunk in batch
+            if chunk.payload_type is PayloadType.STREAM
+        ]
+        future = executor.submit(_crypt_packets, packets, mode, video_key, audio_key)
+        pending.append((batch, future))
+
+    def finish() -> Generator[UsmChunk, None, None]:
+        batch, future = pending.popleft()
+        payloads = iter(future.result())
+        for chunk in batch:
+            if chunk.payload_type is PayloadType.STREAM:
+                chunk.payload = next(payloads)
+
+            yield chunk
+
+    batch: List[UsmChunk] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) < batch_size:
+            continue
+
+        submit(batch)
+        batch = []
+        if len(pending) >= max_pending:
+            yield from finish()
+
+    if len(batch) > 0:
+        submit(batch)
+
+    while len(pending) > 0:
+        yield from finish()
+
+
+class _ChunkWriter:
+    """Packs chunks into a single reused buffer and writes them to a file.
+    The buffer only grows when a chunk doesn't fit."""
+
+    def __init__(self, usmfile: IO) -> None:
+        self.usmfile = usmfile
+        self._buffer = bytearray(0x800)
+        self._view = memoryview(self._buffer)
+
+    def write(self, chunk: UsmChunk) -> int:
+        size = len(chunk)
+        if size > len(self._buffer):
+            self._view.release()
+            self._buffer = bytearray(size)
+            self._view = memoryview(self._buffer)
+
+        chunk.pack_into(self._buffer)
+        self.usmfile.write(self._view[:size])
+        return size
+
+
+def _pack_stream(
+    max_frames: int,
+    videos: List[UsmVideo],
+    audios: List[UsmAudio],
+    mode: OpMode = OpMode.NONE,
+    video_key: Optional[bytes] = None,
+    audio_key: Optional[bytes] = None,
+) -> Tuple[IO, int, int, Dict[int, List[Tuple[int, int]]]]:
+    stream_file = TemporaryFile("wb+")
+    writer = _ChunkWriter(stream_file)
+    keyframe_index_and_offsets: Dict[int, List[Tuple[int, int]]] = defaultdict(
+        lambda: list()
+    )
+    max_packet_size = 1
+    for chunks, index, is_keyframe in _interleave_chunks(
+        max_frames, videos, audios, mode, video_key, audio_key
+    ):
+        if is_keyframe:
+            keyframe_index_and_offsets[chunks[0].channel_number].append(
+                (index, stream_file.tell())
+            )
+
+        for chunk in chunks:
+            max_packet_size = max(writer.write(chunk), max_packet_size)
+
     stream_file.flush()
     filesize = stream_file.tell()
     stream_file.seek(0, 0)
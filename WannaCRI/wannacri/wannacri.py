@@ -7,14 +7,36 @@ import shutil
 import string
 import tempfile
 import random
-from typing import List, Optional
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, NamedTuple, Callable, Iterable
 
 import ffmpeg
 from pythonjsonlogger import jsonlogger
 
 import wannacri
-from .codec import Sofdec2Codec
-from .usm import is_usm, Usm, Vp9, H264, HCA, OpMode, generate_keys
+from .create import build_usm
+from .usm import (
+    is_usm,
+    Usm,
+    UsmIndexCache,
+    OpMode,
+    ChunkType,
+    generate_keys,
+    analyze_usm,
+    probe_keyframe,
+    rekey_usm,
+)
+
+
+class JobResult(NamedTuple):
+    """Outcome of processing one USM in extract_usm or probe_usm."""
+
+    path: str
+    is_ok: bool
+    seconds: float
+    message: str
 
 
 def create_usm():
@@ -63,33 +85,30 @@ def create_usm():
     parser.add_argument(
         "-k", "--key", type=key, default=None, help="Encryption key for encrypted USMs."
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="Number of worker processes used to encrypt packets. Defaults to encrypting in this process.",
+    )
     args = parser.parse_args()
 
-    ffprobe_path = find_ffprobe(args.ffprobe)
-
-    # TODO: Add support for more video codecs and audio codecs
-    codec = Sofdec2Codec.from_file(args.input)
-    if codec is Sofdec2Codec.VP9:
-        video = Vp9(args.input, ffprobe_path=ffprobe_path)
-    elif codec is Sofdec2Codec.H264:
-        video = H264(args.input, ffprobe_path=ffprobe_path)
-    else:
-        raise NotImplementedError("Non-Vp9/H.264 files are not yet implemented.")
-
-    audios = None
-    if args.input_audio:
-        audios = [HCA(args.input_audio)]
-
-    filename = os.path.splitext(args.input)[0]
-
-    usm = Usm(videos=[video], audios=audios, key=args.key)
-    with open(filename + ".dat", "wb") as f:
-        mode = OpMode.NONE if args.key is None else OpMode.ENCRYPT
-
-        print(args)
-        print(args.key)
-        for packet in usm.stream(mode, encoding=args.encoding):
-            f.write(packet)
+    out = None
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        filename = os.path.splitext(os.path.basename(args.input))[0]
+        out = os.path.join(args.output, filename + ".dat")
+
+    build_usm(
+        args.input,
+        audio_path=args.input_audio,
+        key=args.key,
+        out=out,
+        encoding=args.encoding,
+        ffprobe_path=find_ffprobe(args.ffprobe),
+        workers=args.jobs,
+    )
 
     print("Done creating DAT file.")
 
@@ -136,28 +155,66 @@ def extract_usm():
         default="./output",
         help="Output path. Defaults to a folder named output in CWD.",
     )
+    parser.add_argument(
+        "--index_cache",
+        type=dir_path,
+        default=None,
+        help="Directory for caching USM indexes. Speeds up reopening unchanged USMs.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="Number of USMs processed at once in worker processes. Defaults to one at a time.",
+    )
     args = parser.parse_args()
 
     usmfiles = find_usm(args.input)
+    options = {
+        "encoding": args.encoding,
+        "key": args.key,
+        "output": args.output,
+        "pages": args.pages,
+        "index_cache": args.index_cache,
+    }
+    results = run_jobs(extract_job, usmfiles, options, args.jobs)
+    print_summary(results)
+
+
+def extract_job(usmfile: str, options: dict) -> JobResult:
+    """Extracts a single USM for extract_usm. Runs in worker processes."""
+    start = time.perf_counter()
+    filename = os.path.basename(usmfile)
+    index_cache = options["index_cache"]
+    try:
+        usm = Usm.open(
+            usmfile,
+            encoding=options["encoding"],
+            key=options["key"],
+            use_mmap=True,
+            index_cache=None if index_cache is None else UsmIndexCache(index_cache),
+        )
 
-    for i, usmfile in enumerate(usmfiles):
-        filename = os.path.basename(usmfile)
-        print(f"Processing {i+1} of {len(usmfiles)}... ", end="", flush=True)
-        try:
-            usm = Usm.open(usmfile, encoding=args.encoding, key=args.key)
-
-            usm.demux(
-                path=args.output,
-                save_video=True,
-                save_audio=True,
-                save_pages=args.pages,
-                folder_name=filename,
-            )
-        except ValueError:
-            print("ERROR")
-            print(f"Please run probe on {usmfile}")
-        else:
-            print("DONE")
+        usm.demux(
+            path=options["output"],
+            save_video=True,
+            save_audio=True,
+            save_pages=options["pages"],
+            folder_name=filename,
+        )
+    except ValueError:
+        return JobResult(
+            usmfile,
+            False,
+            time.perf_counter() - start,
+            f"Please run probe on {usmfile}",
+        )
+    except Exception as e:
+        # Don't stop other USMs from being processed
+        return JobResult(usmfile, False, time.perf_counter() - start, repr(e))
+
+    return JobResult(usmfile, True, time.perf_counter() - start, "")
 
 
 def probe_usm():
@@ -191,22 +248,60 @@ def probe_usm():
         default="./usmlogs",
         help="Output path. Defaults to a folder named usmlogs in CWD.",
     )
+    parser.add_argument(
+        "--index_cache",
+        type=dir_path,
+        default=None,
+        help="Directory for caching USM indexes. Speeds up reopening unchanged USMs.",
+    )
     parser.add_argument(
         "--ffprobe",
         type=str,
         default=".",
         help="Path to ffprobe executable or directory. Defaults to CWD.",
     )
+    parser.add_argument(
+        "--no_demux",
+        action="store_true",
+        help="Describe streams from the USM's pages and chunk index instead of demuxing them for ffprobe.",
+    )
+    parser.add_argument(
+        "--probe_keyframe",
+        action="store_true",
+        help="With --no_demux, also run ffprobe on the first keyframe of every video.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="Number of USMs processed at once in worker processes. Defaults to one at a time.",
+    )
     args = parser.parse_args()
 
     usmfiles = find_usm(args.input)
-
     os.makedirs(args.output, exist_ok=True)
-    temp_dir = tempfile.mkdtemp()
-    ffprobe_path = find_ffprobe(args.ffprobe)
+    options = {
+        "encoding": args.encoding,
+        "input": args.input,
+        "output": args.output,
+        "index_cache": args.index_cache,
+        "ffprobe_path": find_ffprobe(args.ffprobe),
+        "no_demux": args.no_demux,
+        "probe_keyframe": args.probe_keyframe,
+    }
+    results = run_jobs(probe_job, usmfiles, options, args.jobs)
+    print_summary(results)
+    print(f'Probe complete. All logs are stored in "{args.output}" folder')
 
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
+
+def probe_job(usmfile: str, options: dict) -> JobResult:
+    """Probes a single USM for probe_usm into its own log file. Runs in worker
+    processes, where the log handler only receives this USM's records."""
+    start = time.perf_counter()
+    filename = os.path.basename(usmfile)
+    random_str = "".join(random.choices(string.ascii_letters + string.digits, k=3))
+    logname = os.path.join(options["output"], f"{filename}_{random_str}.log")
 
     keys = [
         "levelname",
@@ -217,106 +312,199 @@ def probe_usm():
         "message",
     ]
     format_str = " ".join(["%({0:s})s".format(key) for key in keys])
-    for i, usmfile in enumerate(usmfiles):
-        print(f"Processing {i + 1} of {len(usmfiles)}")
-
-        filename = os.path.basename(usmfile)
-        random_str = "".join(random.choices(string.ascii_letters + string.digits, k=3))
-        logname = os.path.join(args.output, f"{filename}_{random_str}.log")
-
-        # Initialize logger
-        file_handler = logging.FileHandler(logname, "w", encoding="UTF-8")
-        file_handler.setFormatter(jsonlogger.JsonFormatter(format_str))
-
-        [logger.removeHandler(handler) for handler in logger.handlers.copy()]
-        logger.addHandler(file_handler)
-
-        # Start logging
-        logging.info(
-            "Info",
-            extra={
-                "path": usmfile.replace(args.input, ""),
-                "version": wannacri.__version__,
-                "os": f"{platform.system()} {platform.release()}",
-                "is_local_ffprobe": ffprobe_path is not None,
-            },
+
+    # Initialize logger
+    logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG)
+    file_handler = logging.FileHandler(logname, "w", encoding="UTF-8")
+    file_handler.setFormatter(jsonlogger.JsonFormatter(format_str))
+
+    [logger.removeHandler(handler) for handler in logger.handlers.copy()]
+    logger.addHandler(file_handler)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        error = _probe(usmfile, options, temp_dir)
+    except Exception as e:
+        # Don't stop other USMs from being processed
+        logging.exception("Unexpected error occurred in probing usm file")
+        error = repr(e)
+    finally:
+        logger.removeHandler(file_handler)
+        file_handler.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return JobResult(
+        usmfile,
+        error is None,
+        time.perf_counter() - start,
+        logname if error is None else f"{error}. See {logname}",
+    )
+
+
+def _probe(usmfile: str, options: dict, temp_dir: str) -> Optional[str]:
+    """Logs info about a USM and its demuxed videos and audios. Returns an
+    error message or None if successful."""
+    ffprobe_path = options["ffprobe_path"]
+    index_cache = options["index_cache"]
+
+    # Start logging
+    logging.info(
+        "Info",
+        extra={
+            "path": usmfile.replace(options["input"], ""),
+            "version": wannacri.__version__,
+            "os": f"{platform.system()} {platform.release()}",
+            "is_local_ffprobe": ffprobe_path is not None,
+        },
+    )
+
+    try:
+        usm = Usm.open(
+            usmfile,
+            encoding=options["encoding"],
+            use_mmap=True,
+            index_cache=None if index_cache is None else UsmIndexCache(index_cache),
         )
+    except ValueError:
+        logging.exception("Error occurred in parsing usm file")
+        return "Error occurred in parsing usm file"
 
-        try:
-            usm = Usm.open(usmfile, encoding=args.encoding)
-        except ValueError:
-            logging.exception("Error occurred in parsing usm file")
-            continue
+    if options["no_demux"]:
+        return _analyze(usm, options)
 
-        logging.info("Extracting files")
-        try:
-            videos, audios = usm.demux(
-                path=temp_dir, save_video=True, save_audio=True, save_pages=False
-            )
-        except ValueError:
-            logging.exception("Error occurred in demuxing usm file")
-            continue
+    logging.info("Extracting files")
+    try:
+        videos, audios = usm.demux(
+            path=temp_dir, save_video=True, save_audio=True, save_pages=False
+        )
+    except ValueError:
+        logging.exception("Error occurred in demuxing usm file")
+        return "Error occurred in demuxing usm file"
 
-        logging.info("Probing videos")
+    for name, paths in (("videos", videos), ("audios", audios)):
+        logging.info(f"Probing {name}")
         try:
-            for video in videos:
+            for path in paths:
                 info = ffmpeg.probe(
-                    video,
+                    path,
                     show_entries="packet=dts,pts_time,pos,flags",
                     cmd="ffprobe" if ffprobe_path is None else ffprobe_path,
                 )
                 logging.info(
-                    "Video info",
+                    "Video info" if name == "videos" else "Audio info",
                     extra={
-                        "path": video,
+                        "path": path,
                         "format": info.get("format"),
                         "streams": info.get("streams"),
                         "packets": info.get("packets"),
                     },
                 )
         except (ValueError, RuntimeError):
-            logging.exception("Program error occurred in ffmpeg probe in videos")
-            continue
+            logging.exception(f"Program error occurred in ffmpeg probe in {name}")
+            return f"Program error occurred in ffmpeg probe in {name}"
         except ffmpeg.Error as e:
             logging.exception(
-                "FFmpeg error occurred in ffmpeg probe in videos.",
+                f"FFmpeg error occurred in ffmpeg probe in {name}.",
                 extra={"stderr": e.stderr},
             )
-            continue
+            return f"FFmpeg error occurred in ffmpeg probe in {name}"
+
+    logging.info("Done probing usm file")
+    return None
+
+
+def _analyze(usm: Usm, options: dict) -> Optional[str]:
+    """Logs info about the streams of a USM from its pages and chunk index.
+    Only the first keyframe of each video is read, and only if probing
+    keyframes. Returns an error message or None if successful."""
+    ffprobe_path = options["ffprobe_path"]
+    analysis = analyze_usm(usm)
+    logging.info(
+        "Stream analysis",
+        extra={
+            "format_version": analysis["format_version"],
+            "videos": analysis["videos"],
+            "audios": analysis["audios"],
+            "alphas": analysis["alphas"],
+        },
+    )
+
+    if options["probe_keyframe"]:
+        for chunk_type, videos in (
+            (ChunkType.VIDEO, usm.videos),
+            (ChunkType.ALPHA, usm.alphas),
+        ):
+            for video in videos:
+                try:
+                    info = probe_keyframe(
+                        usm, video.channel_number, chunk_type, ffprobe_path
+                    )
+                except ValueError:
+                    logging.exception("Program error occurred in probing keyframe")
+                    return "Program error occurred in probing keyframe"
+                except ffmpeg.Error as e:
+                    logging.exception(
+                        "FFmpeg error occurred in probing keyframe",
+                        extra={"stderr": e.stderr},
+                    )
+                    return "FFmpeg error occurred in probing keyframe"
 
-        logging.info("Probing audios")
-        try:
-            for audio in audios:
-                info = ffmpeg.probe(
-                    audio,
-                    show_entries="packet=dts,pts_time,pos,flags",
-                    cmd="ffprobe" if ffprobe_path is None else ffprobe_path,
-                )
                 logging.info(
-                    "Audio info",
+                    "Keyframe info",
                     extra={
-                        "path": audio,
+                        "channel_number": video.channel_number,
+                        "chunk_type": str(chunk_type),
                         "format": info.get("format"),
                         "streams": info.get("streams"),
-                        "packets": info.get("packets"),
                     },
                 )
-        except (ValueError, RuntimeError):
-            logging.exception("Program error occurred in ffmpeg probe in audios")
-            continue
-        except ffmpeg.Error as e:
-            logging.exception(
-                "FFmpeg error occurred in ffmpeg probe in audios.",
-                extra={"stderr": e.stderr},
-            )
-            continue
 
-        logging.info("Done probing usm file")
-        for filename in os.listdir(temp_dir):
-            shutil.rmtree(os.path.join(temp_dir, filename))
+    logging.info("Done probing usm file")
+    return None
 
-    shutil.rmtree(temp_dir)
-    print(f'Probe complete. All logs are stored in "{args.output}" folder')
+
+def run_jobs(
+    job: Callable[[str, dict], JobResult],
+    usmfiles: List[str],
+    options: dict,
+    jobs: Optional[int] = None,
+) -> List[JobResult]:
+    """Runs a job on every USM, in worker processes if given a number of jobs.
+    Progress is reported in the same order as the given USMs."""
+
+    def report(results: Iterable[JobResult]) -> List[JobResult]:
+        finished = []
+        for i, result in enumerate(results):
+            status = "DONE" if result.is_ok else "ERROR"
+            print(f"Processed {i + 1} of {len(usmfiles)}... {status}", flush=True)
+            finished.append(result)
+
+        return finished
+
+    if jobs is None:
+        return report(job(usmfile, options) for usmfile in usmfiles)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return report(executor.map(job, usmfiles, itertools.repeat(options)))
+
+
+def print_summary(results: List[JobResult]) -> None:
+    if len(results) == 0:
+        return
+
+    name_width = max(len(os.path.basename(result.path)) for result in results)
+    name_width = max(name_width, len("File"))
+    print(f"{'File':<{name_width}}  Status  Seconds  Message")
+    for result in results:
+        status = "DONE" if result.is_ok else "ERROR"
+        print(
+            f"{os.path.basename(result.path):<{name_width}}  {status:<6}  "
+            f"{result.seconds:>7.2f}  {result.message}"
+        )
+
+    num_errors = sum(1 for result in results if not result.is_ok)
+    print(f"{len(results) - num_errors} done, {num_errors} errors")
 
 
 def encrypt_usm():
@@ -351,18 +539,56 @@ def encrypt_usm():
         default=None,
         help="Output path. Defaults to the same place as input.",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="Number of worker processes used to encrypt packets. Defaults to encrypting in this process.",
+    )
+    parser.add_argument(
+        "--rekey",
+        action="store_true",
+        help="Rewrite only the stream payloads of the USMs, in place when outputting to the input's folder.",
+    )
+    parser.add_argument(
+        "--old_key",
+        type=key,
+        default=None,
+        help="Key the USMs are currently encrypted with when using --rekey. Defaults to unencrypted.",
+    )
     args = parser.parse_args()
 
     outdir = dir_or_parent_dir(args.input) if args.output is None else pathlib.Path(args.output)
     usmfiles = find_usm(args.input)
 
+    if args.rekey:
+        for filepath in usmfiles:
+            filename = pathlib.PurePath(filepath).name
+            rekey_usm(
+                filepath,
+                args.key,
+                old_key=args.old_key,
+                out=outdir.joinpath(filename),
+                encoding=args.encoding,
+            )
+
+        return
+
     for filepath in usmfiles:
         filename = pathlib.PurePath(filepath).name
-        usm = Usm.open(filepath)
-        usm.video_key, usm.audio_key = generate_keys(args.key)
-        with open(outdir.joinpath(filename), "wb") as out:
-            for packet in usm.stream(OpMode.ENCRYPT, encoding=args.encoding):
-                out.write(packet)
+        # Usm reads from the input while writing, so don't truncate it
+        temp_path = outdir.joinpath(f"{filename}.{os.getpid()}.tmp")
+        with Usm.open(filepath, encoding=args.encoding) as usm, open(
+            temp_path, "wb"
+        ) as out:
+            usm.video_key, usm.audio_key = generate_keys(args.key)
+            usm.write(
+                out, OpMode.ENCRYPT, encoding=args.encoding, workers=args.jobs
+            )
+
+        # Windows can't replace a file that is still open
+        os.replace(temp_path, outdir.joinpath(filename))
 
 
 OP_DICT = {"extractusm": extract_usm, "createusm": create_usm, "probeusm": probe_usm, "encryptusm": encrypt_usm}
@@ -450,6 +676,14 @@ def existing_file(path) -> str:
     return path
 
 
+def positive_int(value) -> int:
+    value = int(value)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+
+    return value
+
+
 def dir_path(path) -> str:
     if os.path.isfile(path):
         raise FileExistsError(path)
@@ -459,6 +693,6 @@ def dir_path(path) -> str:
 def dir_or_parent_dir(path) -> pathlib.Path:
     path = pathlib.Path(path)
     if path.is_dir():
-        return path.parent.resolve()
+        return path
 
-    return path
+    return path.parent.resolve()
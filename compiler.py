@@ -0,0 +1,523 @@
+import math
+from fractions import Fraction
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from ma2 import BREAK, HOLD, RESOLUTION, SLIDE, TAP, TOUCH, note_category
+from maidata import Maidata, parse_maidata
+
+# default slide wait, one beat in 4/4
+BEAT = RESOLUTION // 4
+
+CHART_TYPES = ('Ma2', 'Ma2_104')
+
+SLIDE_SHAPES = '-^<>vpqszVw'
+TOUCH_AREAS = 'ABCDE'
+
+# order of the notes of a group, like the previous converter writes them:
+# touches, taps and holds, stars, slides of a star, then slides without a star
+TOUCH_RANK, TAP_RANK, STAR_RANK, SLIDE_RANK, STARLESS_SLIDE_RANK = range(5)
+
+# T_REC_ lines of each chart type. Records count notes by their ma2 1.04 type, so they tell
+# break holds and break slides apart even in 1.03, which writes them as holds and slides
+RECORDS = {
+    'Ma2': ('TAP', 'BRK', 'XTP', 'HLD', 'XHO', 'STR', 'BST', 'XST', 'TTP', 'THO', 'SLD'),
+    'Ma2_104': ('TAP', 'BRK', 'XTP', 'BXX', 'HLD', 'XHO', 'BHO', 'BXH', 'STR', 'BST', 'XST', 'XBS', 'TTP', 'THO',
+                'SLD', 'BSL'),
+}
+# record of a note by its kind, then by whether it is a break and whether it is an ex note
+RECORD_NAMES = {
+    'TAP': {(False, False): 'TAP', (True, False): 'BRK', (False, True): 'XTP', (True, True): 'BXX'},
+    'HLD': {(False, False): 'HLD', (True, False): 'BHO', (False, True): 'XHO', (True, True): 'BXH'},
+    'STR': {(False, False): 'STR', (True, False): 'BST', (False, True): 'XST', (True, True): 'XBS'},
+}
+
+# TTM_SCR_ score of a note by its T_NUM_ count
+SCORES = {'TAP': 500, 'BRK': 2600, 'HLD': 1000, 'SLD': 1500}
+
+
+class Ma2Note(NamedTuple):
+    # absolute tick, bar * RESOLUTION + tick
+    time: int
+    # TAP, STR, HLD, TTP, THO or a slide shape like SI_
+    kind: str
+    is_break: bool
+    is_ex: bool
+    # values after bar and tick, e.g. key and length
+    values: Tuple
+    # a slide segment following the previous one of a chain, which counts as part of that slide
+    is_connected: bool = False
+
+
+def compile_maidata(text: str, chart_type: str = 'Ma2') -> Dict[int, str]:
+    """Compiles every chart of a maidata.txt with a single parse.
+    Returns the ma2 text of each chart by its inote number."""
+    return compile_charts(parse_maidata(text), chart_type)
+
+
+def compile_charts(maidata: Maidata, chart_type: str = 'Ma2') -> Dict[int, str]:
+    """Compiles every chart of a parsed maidata.txt. Returns the ma2 text of each chart by its inote number."""
+    return {num: compile_simai(chart, chart_type) for num, chart in maidata.charts.items()}
+
+
+def compile_simai(chart: str, chart_type: str = 'Ma2') -> str:
+    """Compiles the notes of a single simai chart, as given by SimaiTransformer, to ma2 text."""
+    if chart_type not in CHART_TYPES:
+        raise ValueError(f'Unknown chart type {chart_type}')
+
+    bpms, notes = parse_simai(chart)
+    return compose_ma2(bpms, notes, chart_type)
+
+
+def parse_simai(chart: str) -> Tuple[List[Tuple[int, Fraction]], List[Ma2Note]]:
+    """Parses a simai chart into its BPM changes and its notes, both sorted by time.
+    Notes at the same time are sorted by note_rank, then as they are written."""
+    bpms: List[Tuple[int, Fraction]] = []
+    ranked: List[Tuple[int, Ma2Note]] = []
+
+    # current position in bars
+    position = Fraction(0)
+    bpm: Optional[Fraction] = None
+    # length of a comma in bars, or in seconds if step_seconds is set
+    step = Fraction(1, 4)
+    step_seconds: Optional[Fraction] = None
+
+    group = ''
+    i = 0
+    while i < len(chart):
+        c = chart[i]
+        if c == '(':
+            end = chart.index(')', i)
+            bpm = Fraction(chart[i + 1:end])
+            if bpms and bpms[-1][0] == to_ticks(position):
+                bpms[-1] = (to_ticks(position), bpm)
+            else:
+                bpms.append((to_ticks(position), bpm))
+            i = end + 1
+        elif c == '{':
+            end = chart.index('}', i)
+            value = chart[i + 1:end]
+            if value.startswith('#'):
+                step_seconds = Fraction(value[1:])
+            else:
+                step = Fraction(1, int(value))
+                step_seconds = None
+            i = end + 1
+        elif chart.startswith('<HS', i):
+            # hi-speed changes don't exist in ma2
+            i = chart.index('>', i) + 1
+        elif c == '[':
+            end = chart.index(']', i)
+            group += chart[i:end + 1]
+            i = end + 1
+        elif c == ',':
+            if group == 'E':
+                break
+            if group:
+                if bpm is None:
+                    raise ValueError('Chart has notes before its first BPM')
+                ranked.extend(parse_group(group, to_ticks(position), bpm))
+            group = ''
+
+            if step_seconds is not None:
+                if bpm is None:
+                    raise ValueError('Chart has a step in seconds before its first BPM')
+                position += seconds_to_bars(step_seconds, bpm)
+            else:
+                position += step
+            i += 1
+        else:
+            group += c
+            i += 1
+
+    if group and group != 'E':
+        if bpm is None:
+            raise ValueError('Chart has notes before its first BPM')
+        ranked.extend(parse_group(group, to_ticks(position), bpm))
+
+    ranked.sort(key=lambda item: (item[1].time, item[0]))
+    return bpms, [note for _, note in ranked]
+
+
+def parse_group(group: str, time: int, bpm: Fraction) -> List[Tuple[int, Ma2Note]]:
+    """Parses the notes between two commas, which are all at the same time except for
+    pseudo each notes split by backticks, each one tick after the previous ones.
+    Returns every note with its note_rank, in the order they are written."""
+    ranked = []
+    for offset, part in enumerate(group.split('`')):
+        for text in part.split('/'):
+            if not text:
+                continue
+
+            # each tap shorthand, e.g. 12 is 1/2
+            for note_text in text if text.isdigit() else [text]:
+                notes = parse_note(note_text, time + offset, bpm)
+                has_star = notes[0].kind in ('TAP', 'STR')
+                ranked.extend((note_rank(note, has_star), note) for note in notes)
+    return ranked
+
+
+def note_rank(note: Ma2Note, has_star: bool) -> int:
+    """Position of a note among the notes at its time, like the previous converter orders them."""
+    if note.kind in ('TTP', 'THO'):
+        return TOUCH_RANK
+    if note.kind in ('TAP', 'HLD'):
+        return TAP_RANK
+    if note.kind == 'STR':
+        return STAR_RANK
+    return SLIDE_RANK if has_star else STARLESS_SLIDE_RANK
+
+
+def parse_note(text: str, time: int, bpm: Fraction) -> List[Ma2Note]:
+    if text[0] in TOUCH_AREAS:
+        return [parse_touch(text, time, bpm)]
+
+    if not '1' <= text[0] <= '8':
+        raise ValueError(f'Unknown note {text}')
+
+    key = int(text[0])
+    flags = set()
+    duration = None
+    i = 1
+    while i < len(text) and text[i] not in SLIDE_SHAPES:
+        if text[i] == '[':
+            end = text.index(']', i)
+            duration = text[i + 1:end]
+            i = end + 1
+        else:
+            flags.add(text[i])
+            i += 1
+
+    is_break = 'b' in flags
+    is_ex = 'x' in flags
+
+    if 'h' in flags:
+        length = 0 if duration is None else parse_length(duration, bpm)
+        return [Ma2Note(time, 'HLD', is_break, is_ex, (key - 1, length))]
+
+    if i == len(text):
+        kind = 'STR' if '$' in flags else 'TAP'
+        return [Ma2Note(time, kind, is_break, is_ex, (key - 1,))]
+
+    notes = []
+    if '?' not in flags and '!' not in flags:
+        kind = 'TAP' if '@' in flags else 'STR'
+        notes.append(Ma2Note(time, kind, is_break, is_ex, (key - 1,)))
+
+    for branch in text[i:].split('*'):
+        notes.extend(parse_slide(key, branch, time, bpm))
+    return notes
+
+
+def parse_touch(text: str, time: int, bpm: Fraction) -> Ma2Note:
+    area = text[0]
+    i = 1
+    key = 0
+    if i < len(text) and text[i].isdigit():
+        # C1 and C2 are both the center
+        key = 0 if area == 'C' else int(text[i]) - 1
+        i += 1
+
+    flags = set()
+    duration = None
+    while i < len(text):
+        if text[i] == '[':
+            end = text.index(']', i)
+            duration = text[i + 1:end]
+            i = end + 1
+        else:
+            flags.add(text[i])
+            i += 1
+
+    firework = 1 if 'f' in flags else 0
+    if 'h' in flags:
+        length = 0 if duration is None else parse_length(duration, bpm)
+        return Ma2Note(time, 'THO', False, False, (key, length, area, firework, 'M1'))
+
+    return Ma2Note(time, 'TTP', False, False, (key, area, firework, 'M1'))
+
+
+def parse_slide(key: int, branch: str, time: int, bpm: Fraction) -> List[Ma2Note]:
+    """Parses a slide from key, which can be a chain of segments sharing one duration
+    or each with its own. Segments after the first start when the previous one ends,
+    and are connected to it. A break on any segment makes the whole chain a break."""
+    # (shape, end key, mid key, duration, is break)
+    segments = []
+    i = 0
+    while i < len(branch):
+        if branch.startswith(('pp', 'qq'), i):
+            shape = branch[i:i + 2]
+            i += 2
+        elif branch[i] in SLIDE_SHAPES:
+            shape = branch[i]
+            i += 1
+        else:
+            raise ValueError(f'Unknown slide {branch}')
+
+        mid = None
+        if shape == 'V':
+            mid = int(branch[i])
+            i += 1
+        end_key = int(branch[i])
+        i += 1
+
+        duration = None
+        is_break = False
+        while i < len(branch) and branch[i] not in SLIDE_SHAPES:
+            if branch[i] == '[':
+                end = branch.index(']', i)
+                duration = branch[i + 1:end]
+                i = end + 1
+            else:
+                is_break = is_break or branch[i] == 'b'
+                i += 1
+        segments.append((shape, end_key, mid, duration, is_break))
+
+    if not segments or segments[-1][3] is None:
+        raise ValueError(f'Slide without duration {branch}')
+
+    chain_is_break = any(segment[4] for segment in segments)
+    notes = []
+    start = time
+    wait = None
+    pending = []
+    for segment in segments:
+        pending.append(segment)
+        if segment[3] is None:
+            continue
+
+        segment_wait, length = parse_slide_duration(segment[3], bpm)
+        # the first slide waits for the star, the others follow the previous slide
+        wait = segment_wait if wait is None else 0
+        for n, (shape, end_key, mid, _, _) in enumerate(pending):
+            # split a shared duration evenly between chained segments
+            part = round_half_up(Fraction(length * (n + 1), len(pending))) - round_half_up(
+                Fraction(length * n, len(pending)))
+            kind = slide_kind(shape, key, end_key, mid)
+            is_connected = bool(notes)
+            notes.append(Ma2Note(start, kind, chain_is_break and not is_connected, False,
+                                 (key - 1, wait, part, end_key - 1), is_connected))
+            start += wait + part
+            key = end_key
+            wait = 0
+        pending = []
+
+    return notes
+
+
+def slide_kind(shape: str, start: int, end: int, mid: Optional[int]) -> str:
+    """The ma2 slide type of a simai slide shape between keys 1 to 8."""
+    if shape == '-':
+        return 'SI_'
+    if shape == 'v':
+        return 'SV_'
+    if shape == 'w':
+        return 'SF_'
+    if shape == 'p':
+        return 'SUL'
+    if shape == 'q':
+        return 'SUR'
+    if shape == 'pp':
+        return 'SXL'
+    if shape == 'qq':
+        return 'SXR'
+    if shape == 's':
+        return 'SSL'
+    if shape == 'z':
+        return 'SSR'
+    if shape == '^':
+        # shortest way around, keys go up clockwise
+        distance = (end - start) % 8
+        if distance in (0, 4):
+            raise ValueError(f'Invalid ^ slide {start}^{end}')
+        return 'SCR' if distance < 4 else 'SCL'
+    if shape == '>':
+        # clockwise from the upper half of the screen
+        return 'SCR' if start in (1, 2, 7, 8) else 'SCL'
+    if shape == '<':
+        return 'SCL' if start in (1, 2, 7, 8) else 'SCR'
+    if shape == 'V':
+        if (mid - start) % 8 == 2:
+            return 'SLR'
+        if (mid - start) % 8 == 6:
+            return 'SLL'
+        raise ValueError(f'Invalid V slide {start}V{mid}{end}')
+    raise ValueError(f'Unknown slide shape {shape}')
+
+
+def parse_length(duration: str, bpm: Fraction) -> int:
+    """Length in ticks of a hold duration like 4:1, 150#4:1 or #1.5."""
+    if '#' in duration:
+        custom_bpm, length = duration.split('#', 1)
+        if ':' not in length:
+            return to_ticks(seconds_to_bars(Fraction(length), bpm))
+        scale = bpm / Fraction(custom_bpm) if custom_bpm else Fraction(1)
+        return round_half_up(ratio_to_ticks(length) * scale)
+    return round_half_up(ratio_to_ticks(duration))
+
+
+def parse_slide_duration(duration: str, bpm: Fraction) -> Tuple[int, int]:
+    """Wait and length in ticks of a slide duration like 8:1, 150#8:1, 150#1.5 or 0.5##1.5."""
+    if '##' in duration:
+        wait, length = duration.split('##', 1)
+        wait_ticks = to_ticks(seconds_to_bars(Fraction(wait), bpm))
+        if ':' in length:
+            return wait_ticks, round_half_up(ratio_to_ticks(length))
+        return wait_ticks, to_ticks(seconds_to_bars(Fraction(length), bpm))
+
+    if '#' in duration:
+        custom_bpm, length = duration.split('#', 1)
+        scale = bpm / Fraction(custom_bpm) if custom_bpm else Fraction(1)
+        wait_ticks = round_half_up(BEAT * scale)
+        if ':' in length:
+            return wait_ticks, round_half_up(ratio_to_ticks(length) * scale)
+        return wait_ticks, to_ticks(seconds_to_bars(Fraction(length), bpm))
+
+    return BEAT, round_half_up(ratio_to_ticks(duration))
+
+
+def ratio_to_ticks(ratio: str) -> Fraction:
+    division, count = ratio.split(':')
+    return Fraction(RESOLUTION * int(count), int(division))
+
+
+def seconds_to_bars(seconds: Fraction, bpm: Fraction) -> Fraction:
+    return seconds * bpm / 240
+
+
+def to_ticks(bars: Fraction) -> int:
+    return round_half_up(bars * RESOLUTION)
+
+
+def round_half_up(value: Fraction) -> int:
+    return math.floor(value + Fraction(1, 2))
+
+
+def note_type(note: Ma2Note, chart_type: str) -> str:
+    """The ma2 note type of a note. Ma2 has no break holds, break slides or connected slides."""
+    if chart_type == 'Ma2_104':
+        if note.is_connected:
+            prefix = 'CN'
+        elif note.is_break and note.is_ex:
+            prefix = 'BX'
+        elif note.is_break:
+            prefix = 'BR'
+        elif note.is_ex:
+            prefix = 'EX'
+        else:
+            prefix = 'NM'
+        return prefix + note.kind
+
+    if note.kind == 'TAP':
+        return 'BRK' if note.is_break else 'XTP' if note.is_ex else 'TAP'
+    if note.kind == 'STR':
+        return 'BST' if note.is_break else 'XST' if note.is_ex else 'STR'
+    if note.kind == 'HLD':
+        return 'XHO' if note.is_ex else 'HLD'
+    return note.kind
+
+
+def record_name(note: Ma2Note) -> str:
+    """Name of the T_REC_ line counting a note."""
+    if note.kind in RECORD_NAMES:
+        return RECORD_NAMES[note.kind][note.is_break, note.is_ex]
+    if note.kind in ('TTP', 'THO'):
+        return note.kind
+    return 'BSL' if note.is_break else 'SLD'
+
+
+def note_counts(notes: List[Ma2Note], chart_type: str = 'Ma2') -> Dict[str, int]:
+    """T_NUM_ counts of taps, breaks, holds and slides, and all of them, by the note types
+    written for chart_type like Ma2Document.stats counts them. Touches count as taps,
+    and a chain of slides counts once."""
+    counts = [0] * (BREAK + 1)
+    for note in notes:
+        if not note.is_connected:
+            counts[note_category(note_type(note, chart_type))] += 1
+    return {
+        'TAP': counts[TAP] + counts[TOUCH],
+        'BRK': counts[BREAK],
+        'HLD': counts[HOLD],
+        'SLD': counts[SLIDE],
+        'ALL': sum(counts),
+    }
+
+
+def compose_trailer(notes: List[Ma2Note], chart_type: str) -> List[str]:
+    """Lines of the last section: note records, note counts, judgements, and scores."""
+    notes = [note for note in notes if not note.is_connected]
+    records = dict.fromkeys(RECORDS[chart_type], 0)
+    judges = {'TAP': 0, 'HLD': 0, 'SLD': 0}
+    # notes at each time that have to be hit together, slides aside
+    hits: Dict[int, int] = {}
+    for note in notes:
+        name = record_name(note)
+        if name in records:
+            records[name] += 1
+        if note.kind in ('HLD', 'THO'):
+            # a hold is judged when pressed and when released
+            judges['HLD'] += 2
+        elif note.kind in ('TAP', 'STR', 'TTP'):
+            judges['TAP'] += 1
+        else:
+            judges['SLD'] += 1
+            continue
+        hits[note.time] = hits.get(note.time, 0) + 1
+
+    counts = note_counts(notes, chart_type)
+    scores = {name: score * counts[name] for name, score in SCORES.items()}
+    total_score = sum(scores.values())
+    # achievement in hundredths of a percent with every break a critical perfect
+    achievement = 10000 + (round_half_up(Fraction(1000000 * counts['BRK'], total_score)) if total_score else 0)
+
+    lines = [f'T_REC_{name}\t{count}' for name, count in records.items()]
+    lines.append(f'T_REC_ALL\t{len(notes)}')
+    lines.extend(f'T_NUM_{name}\t{count}' for name, count in counts.items())
+    lines.extend(f'T_JUDGE_{name}\t{count}' for name, count in judges.items())
+    lines.append(f'T_JUDGE_ALL\t{sum(judges.values())}')
+    lines.append(f'TTM_EACHPAIRS\t{sum(1 for count in hits.values() if count > 1)}')
+    lines.extend(f'TTM_SCR_{name}\t{score}' for name, score in scores.items())
+    lines.append(f'TTM_SCR_ALL\t{total_score}')
+    lines.append(f'TTM_SCR_S\t{total_score * 97 // 100}')
+    lines.append(f'TTM_SCR_SS\t{total_score * 99 // 100}')
+    lines.append(f'TTM_RAT_ACV\t{achievement}')
+    return lines
+
+
+def format_number(value: Fraction) -> str:
+    """Shortest text of a number, without a fractional part when it is whole, e.g. 190 or 150.5."""
+    text = repr(float(value))
+    return text[:-2] if text.endswith('.0') else text
+
+
+def compose_ma2(bpms: List[Tuple[int, Fraction]], notes: List[Ma2Note], chart_type: str = 'Ma2') -> str:
+    """Writes BPM changes and notes sorted by time as ma2 text. The header, the BPM and
+    meter changes, the notes, and the note statistics are separated by blank lines."""
+    version = '1.04.00' if chart_type == 'Ma2_104' else '1.03.00'
+    bpm_values = [bpm for _, bpm in bpms] or [Fraction(0)]
+    first_bpm = bpm_values[0]
+
+    lines = [
+        f'VERSION\t0.00.00\t{version}',
+        'FES_MODE\t0',
+        f'BPM_DEF\t{float(first_bpm):.3f}\t{float(min(bpm_values)):.3f}\t{float(max(bpm_values)):.3f}\t{float(first_bpm):.3f}\t',
+        'MET_DEF\t4\t4',
+        f'RESOLUTION\t{RESOLUTION}',
+        f'CLK_DEF\t{RESOLUTION}',
+        'COMPATIBLE_CODE\tMA2',
+        '',
+    ]
+    for time, bpm in bpms:
+        lines.append(f'BPM\t{time // RESOLUTION}\t{time % RESOLUTION}\t{format_number(bpm)}')
+    lines.append('MET\t0\t0\t4\t4')
+    lines.append('')
+
+    for note in notes:
+        values = '\t'.join(str(value) for value in note.values)
+        lines.append(f'{note_type(note, chart_type)}\t{note.time // RESOLUTION}\t{note.time % RESOLUTION}\t{values}')
+    lines.append('')
+
+    lines.extend(compose_trailer(notes, chart_type))
+    lines.append('')
+    lines.append('')
+
+    return '\n'.join(lines)
@@ -0,0 +1,186 @@
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+# ticks per bar
+RESOLUTION = 384
+
+# sections of an ma2 are separated by blank lines: header, BPM and meter changes, notes, statistics
+BPM_SECTION = 1
+NOTE_SECTION = 2
+
+# ma2 1.04 note types are one of these prefixes followed by the note kind, e.g. BRTAP
+NOTE_PREFIXES = ('NM', 'BR', 'EX', 'BX')
+# prefix of ma2 1.04 slide segments following the previous one of a chain, which count as part of it
+CONNECTED_PREFIX = 'CN'
+# ma2 1.03 note types for breaks and ex notes, by their note kind and whether they are breaks
+LEGACY_NOTE_TYPES = {
+    'BRK': ('TAP', True),
+    'XTP': ('TAP', False),
+    'BST': ('STR', True),
+    'XST': ('STR', False),
+    'XHO': ('HLD', False),
+}
+
+# note categories of Ma2Stats, in the order of its fields
+TAP, HOLD, SLIDE, TOUCH, BREAK = range(5)
+
+
+class Ma2Stats(NamedTuple):
+    # counted like T_NUM_TAP, T_NUM_HLD, T_NUM_SLD and T_NUM_BRK, with touches apart from taps.
+    # Ma2 1.04 break holds and break slides are breaks, ma2 1.03 writes them as holds and slides
+    taps: int
+    holds: int
+    slides: int
+    touches: int
+    breaks: int
+    total: int
+    # bar that bar_counts starts from, 0 unless notes were shifted before the start
+    first_bar: int
+    # number of notes in every bar from first_bar to the last note
+    bar_counts: np.ndarray
+    # time of the last note in seconds
+    duration: float
+
+
+def note_category(note_type: str) -> int:
+    """Ma2Stats category of an ma2 1.03 or 1.04 note type."""
+    if len(note_type) == 5 and note_type[:2] in NOTE_PREFIXES:
+        kind, is_break = note_type[2:], note_type[:2] in ('BR', 'BX')
+    else:
+        kind, is_break = LEGACY_NOTE_TYPES.get(note_type, (note_type, False))
+
+    if kind == 'TTP':
+        return TOUCH
+    if kind == 'THO':
+        return HOLD
+    if is_break:
+        return BREAK
+    if kind == 'HLD':
+        return HOLD
+    if kind in ('TAP', 'STR'):
+        return TAP
+    return SLIDE
+
+
+def seconds_to_ticks(seconds: float, bpm: float) -> int:
+    """Number of ticks closest to a duration at a BPM."""
+    one_bar_time = 60 / (bpm / 4)
+    one_grid_time = one_bar_time / RESOLUTION
+    return round(seconds / one_grid_time)
+
+
+class Ma2Document:
+    """An ma2 chart with its notes held as columns: note type, bar, tick, and the
+    rest of the line after the tick. The other sections are kept as they are, so
+    writing an unchanged document gives back the same text."""
+
+    def __init__(self, sections: List[str], types: np.ndarray, bars: np.ndarray, ticks: np.ndarray,
+                 params: List[str]):
+        self.sections = sections
+        self.types = types
+        self.bars = bars
+        self.ticks = ticks
+        # rest of each note line including its leading tab, e.g. '\t2\t96'
+        self.params = params
+        # ticks the notes were moved by, which the BPM changes weren't
+        self.offset = 0
+
+    @classmethod
+    def from_text(cls, text: str) -> 'Ma2Document':
+        sections = text.split('\n\n')
+        if len(sections) <= NOTE_SECTION:
+            raise ValueError('ma2 has no note section')
+
+        note_section = sections[NOTE_SECTION]
+        lines = note_section.split('\n') if note_section else []
+        fields = [line.split('\t', 3) for line in lines]
+        if any(len(field) < 3 for field in fields):
+            raise ValueError('ma2 has a note without bar or tick')
+
+        types = np.array([field[0] for field in fields], dtype=str)
+        bars = np.array([field[1] for field in fields], dtype=np.int64)
+        ticks = np.array([field[2] for field in fields], dtype=np.int64)
+        params = ['\t' + field[3] if len(field) == 4 else '' for field in fields]
+        return cls(sections, types, bars, ticks, params)
+
+    @classmethod
+    def read(cls, path: str) -> 'Ma2Document':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_text(f.read())
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    @property
+    def times(self) -> np.ndarray:
+        """Time of every note in ticks from the start of the chart."""
+        return self.bars * RESOLUTION + self.ticks
+
+    def shift(self, ticks: int):
+        """Moves every note by a number of ticks. Notes moved before the start get negative bars."""
+        self.bars, self.ticks = np.divmod(self.times + ticks, RESOLUTION)
+        self.offset += ticks
+
+    def shift_seconds(self, seconds: float, bpm: float) -> int:
+        """Moves every note by a duration at a BPM. Returns the number of ticks moved."""
+        offset = seconds_to_ticks(seconds, bpm)
+        self.shift(offset)
+        return offset
+
+    def bpm_changes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Time in ticks and BPM of every BPM change, from the BPM section."""
+        changes = [
+            line.split('\t') for line in self.sections[BPM_SECTION].split('\n') if line.startswith('BPM\t')
+        ]
+        times = np.array([int(bar) * RESOLUTION + int(tick) for _, bar, tick, _ in changes], dtype=np.int64)
+        bpms = np.array([float(bpm) for _, _, _, bpm in changes], dtype=np.float64)
+        return times, bpms
+
+    def note_seconds(self) -> np.ndarray:
+        """Time of every note in seconds, following the BPM changes. Notes that were
+        shifted are timed where they were written, then moved by the shift at the first BPM."""
+        change_times, bpms = self.bpm_changes()
+        if len(change_times) == 0:
+            raise ValueError('ma2 has no BPM')
+
+        # seconds per tick between each change and the next
+        tick_seconds = 240 / (bpms * RESOLUTION)
+        change_seconds = np.concatenate(([0.0], np.cumsum(np.diff(change_times) * tick_seconds[:-1])))
+
+        # the BPM changes are where the notes were before any shift
+        times = self.times - self.offset
+        # notes before the first change use the first BPM
+        index = np.maximum(np.searchsorted(change_times, times, side='right') - 1, 0)
+        seconds = change_seconds[index] + (times - change_times[index]) * tick_seconds[index]
+        return seconds + self.offset * tick_seconds[0]
+
+    def stats(self) -> Ma2Stats:
+        """Note counts, notes per bar, and duration of the chart."""
+        if len(self) == 0:
+            return Ma2Stats(0, 0, 0, 0, 0, 0, 0, np.zeros(0, dtype=np.int64), 0.0)
+
+        duration = float(self.note_seconds().max())
+        is_counted = np.char.find(self.types, CONNECTED_PREFIX) != 0
+        types = self.types[is_counted]
+        bars = self.bars[is_counted]
+
+        # classify each distinct note type once, then count the whole column
+        note_types, inverse = np.unique(types, return_inverse=True)
+        categories = np.array([note_category(note_type) for note_type in note_types.tolist()], dtype=np.int64)
+        counts = np.bincount(categories[inverse.ravel()], minlength=BREAK + 1).tolist()
+
+        first_bar = min(int(self.bars.min()), 0)
+        bar_counts = np.bincount(bars - first_bar, minlength=int(self.bars.max()) - first_bar + 1)
+        return Ma2Stats(*counts, len(types), first_bar, bar_counts, duration)
+
+    def to_text(self) -> str:
+        lines = map('{}\t{}\t{}{}'.format, self.types.tolist(), self.bars.tolist(), self.ticks.tolist(),
+                    self.params)
+        sections = list(self.sections)
+        sections[NOTE_SECTION] = '\n'.join(lines)
+        return '\n\n'.join(sections)
+
+    def write(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_text())
@@ -0,0 +1,102 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, Optional
+
+from lark import Lark
+
+from transformer import SimaiTransformer
+
+GRAMMAR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simai.lark')
+
+_parser = None
+
+
+@dataclass
+class Maidata:
+    title: str = ''
+    artist: str = ''
+    wholebpm: Optional[str] = None
+    # &first, offset of the music in seconds
+    first: float = 0
+    # first_N by chart number
+    firsts: Dict[int, float] = field(default_factory=dict)
+    # des_N by chart number, -1 for &des which applies to every chart
+    des: Dict[int, str] = field(default_factory=dict)
+    # lv_N by chart number
+    levels: Dict[int, str] = field(default_factory=dict)
+    # inote_N by chart number, without whitespace and comments
+    charts: Dict[int, str] = field(default_factory=dict)
+
+    def chart_bpm(self, num: int) -> Optional[str]:
+        """The first BPM of a chart, or None if it has none."""
+        chart = self.charts.get(num, '')
+        start = chart.find('(')
+        if start == -1:
+            return None
+        return chart[start + 1:chart.index(')', start)]
+
+
+def get_parser() -> Lark:
+    """The maidata parser, built once per process. It's an LALR parser that runs
+    SimaiTransformer while parsing, so no parse tree is built. Lark caches the
+    analysed grammar on disk, so later processes skip building the parse table."""
+    global _parser
+    if _parser is None:
+        with open(GRAMMAR_PATH, encoding='utf-8') as f:
+            _parser = Lark(f.read(), parser='lalr', transformer=SimaiTransformer(), cache=True)
+    return _parser
+
+
+def parse_maidata(text: str) -> Maidata:
+    maidata = Maidata()
+    _add_values(maidata, text)
+    return maidata
+
+
+def read_maidata(path: str) -> Maidata:
+    """Reads maidata.txt a few lines at a time, so only one key's value is in memory at once."""
+    maidata = Maidata()
+    # utf-8-sig as some editors save maidata.txt with a BOM
+    with open(path, encoding='utf-8-sig') as f:
+        for entry in _entries(f):
+            _add_values(maidata, entry)
+    return maidata
+
+
+def _entries(lines: Iterable[str]) -> Iterator[str]:
+    """Joins lines into runs that each start at a key. No value can hold a line
+    starting with &, so every run is whole values and parses on its own."""
+    entry = []
+    for line in lines:
+        if line.startswith('&') and entry:
+            yield ''.join(entry)
+            entry = []
+        entry.append(line)
+    if entry:
+        yield ''.join(entry)
+
+
+def _add_values(maidata: Maidata, text: str):
+    for value in get_parser().parse(text):
+        kind, value = value['type'], value['value']
+        if kind == 'title':
+            maidata.title = value
+        elif kind == 'artist':
+            maidata.artist = value
+        elif kind == 'wholebpm':
+            maidata.wholebpm = value
+        elif kind == 'first':
+            num, first = value
+            if num == -1:
+                maidata.first = first
+            else:
+                maidata.firsts[num] = first
+        elif kind == 'des':
+            num, des = value
+            maidata.des[num] = des
+        elif kind == 'level':
+            num, level = value
+            maidata.levels[num] = level
+        elif kind == 'chart':
+            num, chart = value
+            maidata.charts[num] = chart
@@ -1,6 +1,5 @@
 import shutil
 import os
-import sys
 import traceback
 import subprocess
 
@@ -8,12 +7,15 @@ import ffmpeg
 import UnityPy
 from PIL import Image
 from pathlib import Path
-from wannacri.wannacri import create_usm
-from unittest.mock import patch
+from wannacri import build_usm
+from compiler import compile_charts
+from ma2 import Ma2Document
+from maidata import read_maidata
+from registry import IdRegistry
 import xmltodict
 from xml.etree import ElementTree
 from concurrent.futures import ThreadPoolExecutor
-import pandas as pd
+from functools import partial
 
 
 def recursive_string_replace(obj, old, new):
@@ -50,39 +52,15 @@ def write_xml(tree: ElementTree, path: str):
         xml_file.write(xml_str)
 
 
-def get_or_new_id(cache_path: str, name: str, initial_value: int):
-    if not os.path.exists(cache_path):
-        new_id = initial_value
-        df = pd.DataFrame({'id': [new_id], 'name': [name]})
-        df.to_csv(cache_path, index=False, sep='\t')
-        return new_id
-
-    df = pd.read_csv(cache_path, sep='\t')
-    tmp_df = df[df['name'] == name]
-    if len(tmp_df) > 0:
-        return tmp_df['id'].iloc[0]
-
-    new_id = int(df['id'].max()) + 1
-    df = pd.concat([df, pd.DataFrame({'id': [new_id], 'name': [name]})])
-    df.to_csv(cache_path, index=False, sep='\t')
-    return new_id
-
-
-def get_or_new_genre_id(cache_path: str, name: str):
-    if name == 'POPSアニメ':
-        return 101
-    if name == 'niconicoボーカロイド':
-        return 102
-    if name == '東方Project':
-        return 103
-    if name == 'ゲームバラエティ':
-        return 104
-    if name == 'maimai':
-        return 105
-    if name == 'オンゲキCHUNITHM':
-        return 106
-
-    return get_or_new_id(cache_path, name, 1000)
+# genres of the game, other genres get ids from genre_id.tsv
+GENRE_IDS = {
+    'POPSアニメ': 101,
+    'niconicoボーカロイド': 102,
+    '東方Project': 103,
+    'ゲームバラエティ': 104,
+    'maimai': 105,
+    'オンゲキCHUNITHM': 106,
+}
 
 
 class Chart:
@@ -97,24 +75,25 @@ class Chart:
     temp_path: str
     maidata_path: str
 
-    def __init__(self, inputs_path: str, in_path: str, out_path: str, genre_name: str):
+    def __init__(self, in_path: str, out_path: str, genre_name: str, genre_id: int, music_id: int):
         if not os.path.exists(f'{in_path}/maidata.txt'):
             raise FileNotFoundError(f'{in_path}/maidata.txt')
 
         self.in_path = in_path
         self.out_path = out_path
 
-        self.genre_id = '%06d' % get_or_new_genre_id(f'{inputs_path}/genre_id.tsv', genre_name)
+        self.genre_id = '%06d' % genre_id
         self.genre_name = genre_name
 
-        self.music_id = '%06d' % get_or_new_id(f'{inputs_path}/music_id.tsv', in_path, 5000)
+        self.music_id = '%06d' % music_id
 
         self.temp_path = f'{out_path}/tmp_{self.music_id}'
         self.maidata_path = f'{out_path}/maidata.txt'
 
 
 def read_charts(inputs_path: str, out_path: str) -> list:
-    charts = []
+    # (in_path, genre_name) of every chart, ids are assigned for all of them at once
+    found = []
 
     for folder_name in os.listdir(inputs_path):
         if not os.path.isdir(f'{inputs_path}/{folder_name}'):
@@ -123,7 +102,7 @@ def read_charts(inputs_path: str, out_path: str) -> list:
         if os.path.exists(f'{inputs_path}/{folder_name}/maidata.txt'):
             # it is chart
             in_path = f'{inputs_path}/{folder_name}'
-            charts.append(Chart(inputs_path, in_path, out_path, genre_name='maimai'))
+            found.append((in_path, 'maimai'))
             continue
 
         # it is genre, use stack for iterative deep traversal
@@ -135,11 +114,23 @@ def read_charts(inputs_path: str, out_path: str) -> list:
                 if os.path.isdir(sub_path):
                     if os.path.exists(f'{sub_path}/maidata.txt'):
                         # it is chart
-                        charts.append(Chart(inputs_path, sub_path, out_path, genre_name=folder_name))
+                        found.append((sub_path, folder_name))
                     else:
                         # Push the subdirectory onto the stack
                         stack.append(sub_path)
 
+    genre_names = [genre_name for _, genre_name in found if genre_name not in GENRE_IDS]
+    genre_ids = IdRegistry(f'{inputs_path}/genre_id.tsv', 1000).load()
+    genre_ids.get_many(genre_names)
+
+    music_ids = IdRegistry(f'{inputs_path}/music_id.tsv', 5000).load()
+    music_id_list = music_ids.get_many([in_path for in_path, _ in found])
+
+    charts = []
+    for (in_path, genre_name), music_id in zip(found, music_id_list):
+        genre_id = GENRE_IDS[genre_name] if genre_name in GENRE_IDS else genre_ids.get(genre_name)
+        charts.append(Chart(in_path, out_path, genre_name, genre_id, music_id))
+
     return charts
 
 
@@ -241,11 +232,11 @@ def convert_movie(chart: Chart, skip_if_converted: bool = True):
      .filter('scale', 1080, 1080)
      .output(temp_ivf_path, vcodec='vp9', r=30).overwrite_output().run())
 
-    with patch.object(sys, 'argv', ['wannacri', 'createusm', temp_ivf_path, '--key', '0x7F4551499DF55E68']):
-        create_usm()  # .ivf to .dat 파일 변환됨.
+    # .ivf 를 ffprobe 없이 직접 인덱싱해서 .dat 파일 생성
+    temp_dat_path = build_usm(temp_ivf_path, key=0x7F4551499DF55E68)
 
     os.makedirs(f'{chart.out_path}/MovieData', exist_ok=True)
-    shutil.move(f'{chart.temp_path}/{chart.music_id}.dat', result_path)
+    shutil.move(temp_dat_path, result_path)
 
     shutil.rmtree(temp_ivf_path, ignore_errors=True)
 
@@ -279,7 +270,7 @@ def convert_music(chart: Chart, skip_if_converted: bool = True):
     shutil.move(f'{chart.temp_path}/music.awb', result_path_awb)
 
 
-def convert_chart_and_metadata(chart: Chart, is_festival: bool = False):
+def convert_chart_and_metadata(chart: Chart, is_festival: bool = False, report_stats: bool = False):
     shutil.copyfile(f'{chart.in_path}/maidata.txt', f'{chart.temp_path}/maidata.txt')
 
     level_dict = {
@@ -297,46 +288,28 @@ def convert_chart_and_metadata(chart: Chart, is_festival: bool = False):
         '15': 23, '15+': 24
     }
 
-    title = None
-    artist = None
-    bpm = None
-    first = 0
+    maidata = read_maidata(f'{chart.temp_path}/maidata.txt')
+    title = maidata.title
+    artist = maidata.artist
+    bpm = maidata.wholebpm or None  # 10 bpm은 넘길 거임.
+    first = maidata.first
     charters = {}
     levels = {}
     first_bpms = {}
 
-    txt_data = open(f'{chart.temp_path}/maidata.txt', encoding='UTF8').read()
-    for data in txt_data.split('&'):
-        data = data.removesuffix('\n').strip()
-        index = data.find('=')
-        if index == -1:
-            continue
-        key = data[:index]
-        value = data[index + 1:]
-
-        if key == 'artist':
-            artist = value
-        if key == 'title':
-            title = value
-        if key == 'wholebpm':  # 10 bpm은 넘길 거임.
-            bpm = value
-        if key == 'first':
-            first = float(value)
-        if key.startswith('des') and value != '':
-            index = key.find('_')
-            if index == -1:
-                for i in range(6):
-                    charters[i] = str(value)
-            else:
-                charters[int(key[index + 1:]) - 2] = str(value)
-        if key.startswith('lv') and value != '':
-            index = key.find('_')
-            if index != -1:
-                levels[int(key[index + 1:]) - 2] = value if value in level_dict else '15+'
-        if key.startswith('inote') and value != '':
-            index = key.find('_')
-            if index != -1:
-                first_bpms[int(key[index + 1:]) - 2] = value.split('(')[1].split(')')[0]
+    if maidata.des.get(-1):
+        for i in range(6):
+            charters[i] = maidata.des[-1]
+    for num, des in maidata.des.items():
+        if num != -1 and des != '':
+            charters[num - 2] = des
+    for num, level in maidata.levels.items():
+        if level != '':
+            levels[num - 2] = level if level in level_dict else '15+'
+    for num in maidata.charts:
+        chart_bpm = maidata.chart_bpm(num)
+        if chart_bpm is not None:
+            first_bpms[num - 2] = chart_bpm
 
     for i in range(6, 0, -1):
         if i in first_bpms:
@@ -374,6 +347,10 @@ def convert_chart_and_metadata(chart: Chart, is_festival: bool = False):
             'isEnable': 'false'
         })
 
+    # 모든 난이도의 채보를 한 번에 변환
+    chart_type = 'Ma2_104' if is_festival else 'Ma2'
+    compiled_charts = compile_charts(maidata, chart_type)
+
     for i in range(6):
         if i not in levels:
             continue
@@ -384,40 +361,21 @@ def convert_chart_and_metadata(chart: Chart, is_festival: bool = False):
         if '+' in level:
             leveldecimal = '7'
 
-        # 채보 변환 (result.ma2 생성)
-        chart_type = 'Ma2_104' if is_festival else 'Ma2'
-        os.system(
-            f'.\\MaichartConverter_Win1071\\MaichartConverter.exe CompileSimai '
-            f'-p {chart.temp_path}/maidata.txt '
-            f'-f {chart_type} '
-            f'-o {chart.temp_path} '
-            f'-d {i + 2} '
-        )
+        document = Ma2Document.from_text(compiled_charts[i + 2])
 
         # offset 미루는 부분
-        with open(f'{chart.temp_path}/result.ma2', encoding='utf-8') as f:
-            data = f.read()
-
-        one_bar_time = 60 / (float(first_bpms[i]) / 4)
-        one_grid_time = one_bar_time / 384
-        offset = round(first / one_grid_time)
-
-        data = data.split('\n\n')
-        new_chart = []
-        for line in data[2].split('\n'):
-            line = line.split('\t')
-            total = int(line[1]) * 384 + int(line[2]) + offset
-            line[1] = str(total // 384)
-            line[2] = str(total % 384)
-            new_chart.append('\t'.join(line))
-        data[2] = '\n'.join(new_chart)
-        data = '\n\n'.join(data)
+        document.shift_seconds(first, float(first_bpms[i]))
 
         difficulty = i if i < 5 else 0
 
-        with open(f'{chart.out_path}/music/music{metadata_music_id}/{metadata_music_id}_0{difficulty}.ma2', 'w',
-                  encoding='utf-8') as f:
-            f.write(data)
+        document.write(f'{chart.out_path}/music/music{metadata_music_id}/{metadata_music_id}_0{difficulty}.ma2')
+
+        stats = document.stats()
+        if report_stats:
+            print(f'chart stats [{chart.music_id}] {difficulty} {level} : '
+                  f'tap {stats.taps}, hold {stats.holds}, slide {stats.slides}, touch {stats.touches}, '
+                  f'break {stats.breaks}, total {stats.total}, '
+                  f'max {int(stats.bar_counts.max(initial=0))} notes/bar, {stats.duration:.1f}s')
 
         # metadata 작성
         notes[difficulty] = {
@@ -427,7 +385,7 @@ def convert_chart_and_metadata(chart: Chart, is_festival: bool = False):
             'notesDesigner': ({'id': '0', 'str': charters[i]}) if i in charters else None,
             'notesType': '0',
             'musicLevelID': str(level_dict[level]),
-            'maxNotes': '0',
+            'maxNotes': str(stats.total),
             'isEnable': 'true'
         }
 
@@ -453,14 +411,14 @@ def convert_chart_and_metadata(chart: Chart, is_festival: bool = False):
     write_xml(tree, f'{chart.out_path}/music/music{metadata_music_id}/Music.xml')
 
 
-def convert(chart: Chart):
+def convert(chart: Chart, report_stats: bool = False):
     try:
         shutil.rmtree(chart.temp_path, ignore_errors=True)
         os.makedirs(chart.temp_path, exist_ok=True)
         convert_jacket(chart, skip_if_converted=True)
         convert_movie(chart, skip_if_converted=True)
         convert_music(chart, skip_if_converted=True)
-        convert_chart_and_metadata(chart, is_festival=True)
+        convert_chart_and_metadata(chart, is_festival=True, report_stats=report_stats)
         shutil.rmtree(chart.temp_path, ignore_errors=True)
     except Exception:
         print(f'conversion failed [{chart.music_id}] : {chart.in_path}')
@@ -544,6 +502,7 @@ def main():
 
     param_inputs_path = './inputs'
     param_out_path = './outputs'
+    param_report_stats = False
 
     charts = read_charts(param_inputs_path, param_out_path)
 
@@ -551,7 +510,7 @@ def main():
     add_genres(charts)
     with ThreadPoolExecutor() as executor:
         results = []
-        for result in executor.map(convert, charts):
+        for result in executor.map(partial(convert, report_stats=param_report_stats), charts):
             results.append(result)
             print(f"Task completed. Progress: {len(results)}/{len(charts)}")
     print('end')
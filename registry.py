@@ -0,0 +1,124 @@
+import csv
+import io
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterable, List
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+HEADER = ['id', 'name']
+
+
+@contextmanager
+def _locked(lock_path: str):
+    """Holds an exclusive lock on a lock file, waiting for other processes to release it."""
+    with open(lock_path, 'a+b') as f:
+        if os.name == 'nt':
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class IdRegistry:
+    """Ids by name, kept in a tab separated file with id and name columns.
+
+    The file is read once and then only appended to, so looking up a name
+    is a dict lookup and assigning ids doesn't rewrite the file. Rows are
+    appended while holding a lock on a .lock file next to it, after reading
+    the rows other processes appended since, so concurrent runs never give
+    the same id to different names."""
+
+    def __init__(self, path: str, initial_value: int):
+        self.path = path
+        self.initial_value = initial_value
+        self.ids: Dict[str, int] = {}
+        self.max_id = None
+        # bytes of the file read so far
+        self._read_size = 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _read_new_rows(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._read_size)
+            data = f.read()
+        # reading doesn't take the lock, so leave a row that is still being appended for the next read
+        data = data[:data.rfind(b'\n') + 1]
+        if not data:
+            return
+
+        rows = csv.reader(io.StringIO(data.decode('utf-8-sig' if self._read_size == 0 else 'utf-8'), newline=''),
+                          delimiter='\t')
+        if self._read_size == 0:
+            next(rows, None)
+        for row in rows:
+            if len(row) < 2:
+                continue
+            new_id = int(row[0])
+            # the first row of a name wins, like looking up the first match
+            self.ids.setdefault(row[1], new_id)
+            if self.max_id is None or new_id > self.max_id:
+                self.max_id = new_id
+        self._read_size += len(data)
+
+    def load(self) -> 'IdRegistry':
+        self._read_new_rows()
+        return self
+
+    def get(self, name: str) -> int:
+        return self.get_many([name])[0]
+
+    def get_many(self, names: Iterable[str]) -> List[int]:
+        """Ids of names, assigning the next ids to names without one, in order.
+        A name given more than once gets one id. New names are written with a single append."""
+        names = list(names)
+        if all(name in self.ids for name in names):
+            return [self.ids[name] for name in names]
+
+        with _locked(f'{self.path}.lock'):
+            self._read_new_rows()
+
+            buffer = io.StringIO(newline='')
+            writer = csv.writer(buffer, delimiter='\t', lineterminator=os.linesep)
+            if self._read_size == 0:
+                writer.writerow(HEADER)
+            for name in dict.fromkeys(names):
+                if name in self.ids:
+                    continue
+                new_id = self.initial_value if self.max_id is None else self.max_id + 1
+                self.ids[name] = new_id
+                self.max_id = new_id
+                writer.writerow([new_id, name])
+
+            data = buffer.getvalue().encode('utf-8')
+            with open(self.path, 'ab') as f:
+                f.write(data)
+            self._read_size += len(data)
+
+        return [self.ids[name] for name in names]
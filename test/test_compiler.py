@@ -0,0 +1,208 @@
+import os
+from fractions import Fraction
+
+import pytest
+
+from compiler import (CHART_TYPES, Ma2Note, compile_maidata, compile_simai, note_counts, parse_length, parse_note,
+                      parse_simai, parse_slide, slide_kind)
+from ma2 import NOTE_SECTION
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(TEST_DIR, 'golden')
+EXAMPLE_PATH = os.path.join(os.path.dirname(TEST_DIR), 'example', 'maidata.txt')
+
+# Charts compiled by MaichartConverter into test/golden/<name>.<chart type>.ma2.
+# Every note kind, slide shape and duration syntax, at three BPMs
+FEATURES = ('(150.5){4}1/A1/2h[4:1]/Ch[4:1],3x-7[8:1]/4b/5$,{8}6bx,1-3-5[8:1],(90)E1f/B2/8xh[2:1],'
+            '{16}1-4[8:1]*-5[8:1]/8,2^5[4:1],3>7[4:1],4<8[4:1],5v1[4:1],6pp2[4:1],7qq3[4:1],8s4[4:1],1z5[4:1],'
+            '2w6[4:1],3V15[4:1],4p8[4:1],5q1[4:1],(200){4}12,1-5[150#8:1],2-6[#2],3-7[0.5##1],4h[#1.5],7`8,')
+# break and ex holds, stars and slide chains, which only ma2 1.04 tells apart
+BREAKS = '(120){4}1x-5[8:1]/2bx/3xh[4:1]/5bx,1-3-5[8:1]b,6h[4:1]/1-5[8:1]/2$/A2,3-7[8:1]/4-8[8:1]/C'
+
+# MaichartConverter rounds every step down to whole ticks. The example's {639} and {641}
+# steps are under a tick, so from bar 33 its notes pile up on one tick and run late
+EXAMPLE_EXACT_BARS = 33
+
+BPM = Fraction(120)
+
+
+def read_golden(name: str) -> str:
+    with open(os.path.join(GOLDEN_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def bars_before(note_section: str, bar: int):
+    return [line for line in note_section.split('\n') if int(line.split('\t')[1]) < bar]
+
+
+@pytest.mark.parametrize('chart_type', CHART_TYPES)
+def test_features_match_converter(chart_type):
+    assert compile_simai(FEATURES, chart_type) == read_golden(f'features.{chart_type}.ma2')
+
+
+def test_breaks_match_converter():
+    assert compile_simai(BREAKS, 'Ma2_104') == read_golden('breaks.Ma2_104.ma2')
+
+
+@pytest.mark.parametrize('chart_type', CHART_TYPES)
+def test_example_matches_converter(chart_type):
+    with open(EXAMPLE_PATH, encoding='utf-8-sig') as f:
+        sections = compile_maidata(f.read(), chart_type)[7].split('\n\n')
+    golden = read_golden(f'example.{chart_type}.ma2').split('\n\n')
+
+    assert sections[:NOTE_SECTION] == golden[:NOTE_SECTION]
+    assert bars_before(sections[NOTE_SECTION], EXAMPLE_EXACT_BARS) == bars_before(golden[NOTE_SECTION],
+                                                                                  EXAMPLE_EXACT_BARS)
+    # 20 {639} steps make a 32nd note
+    fields = [line.split('\t') for line in sections[NOTE_SECTION].split('\n')]
+    assert [int(tick) for _, bar, tick, *_ in fields if bar == str(EXAMPLE_EXACT_BARS)][:4] == [0, 12, 24, 36]
+
+
+def test_comments_are_cut_from_lines():
+    charts = compile_maidata('&inote_5=(120){4}1,2,3,4,||first bar\n5,6,7,8,\nE')
+    note_lines = charts[5].split('\n\n')[NOTE_SECTION].split('\n')
+    assert [line.split('\t')[3] for line in note_lines] == [str(key) for key in range(8)]
+
+
+def test_parse_note_taps():
+    assert parse_note('1', 0, BPM) == [Ma2Note(0, 'TAP', False, False, (0,))]
+    assert parse_note('3bx', 96, BPM) == [Ma2Note(96, 'TAP', True, True, (2,))]
+    assert parse_note('8$', 0, BPM) == [Ma2Note(0, 'STR', False, False, (7,))]
+    assert parse_note('5h[4:1]', 0, BPM) == [Ma2Note(0, 'HLD', False, False, (4, 96))]
+    assert parse_note('5bh', 0, BPM) == [Ma2Note(0, 'HLD', True, False, (4, 0))]
+
+
+def test_parse_note_touches():
+    assert parse_note('E1f', 0, BPM) == [Ma2Note(0, 'TTP', False, False, (0, 'E', 1, 'M1'))]
+    assert parse_note('B8', 0, BPM) == [Ma2Note(0, 'TTP', False, False, (7, 'B', 0, 'M1'))]
+    assert parse_note('Ch[2:1]', 0, BPM) == [Ma2Note(0, 'THO', False, False, (0, 192, 'C', 0, 'M1'))]
+
+
+def test_parse_note_slides():
+    assert parse_note('1b-5[8:1]', 0, BPM) == [
+        Ma2Note(0, 'STR', True, False, (0,)),
+        Ma2Note(0, 'SI_', False, False, (0, 96, 48, 4)),
+    ]
+    assert parse_note('2@-6[8:1]', 0, BPM)[0] == Ma2Note(0, 'TAP', False, False, (1,))
+    # no star
+    assert parse_note('3?-7[8:1]', 0, BPM) == [Ma2Note(0, 'SI_', False, False, (2, 96, 48, 6))]
+    assert parse_note('4!-8[8:1]', 0, BPM) == [Ma2Note(0, 'SI_', False, False, (3, 96, 48, 7))]
+    # two slides from one star
+    assert [note.kind for note in parse_note('1-4[8:1]*>5[8:1]', 0, BPM)] == ['STR', 'SI_', 'SCR']
+
+
+def test_parse_note_rejects_unknown_notes():
+    with pytest.raises(ValueError):
+        parse_note('9', 0, BPM)
+
+
+def test_parse_slide_chain_shares_its_duration():
+    assert parse_slide(1, '-3-5[8:1]', 0, BPM) == [
+        Ma2Note(0, 'SI_', False, False, (0, 96, 24, 2)),
+        Ma2Note(120, 'SI_', False, False, (2, 0, 24, 4), True),
+    ]
+    assert [note.values[2] for note in parse_slide(1, '-2-3-4[8:1]', 0, BPM)] == [16, 16, 16]
+    # a shared length that doesn't split evenly
+    assert [note.values[2] for note in parse_slide(1, '-2-3[128:1]', 0, BPM)] == [2, 1]
+
+
+def test_parse_slide_chain_with_own_durations():
+    assert parse_slide(1, '-3[8:1]-5[4:1]', 0, BPM) == [
+        Ma2Note(0, 'SI_', False, False, (0, 96, 48, 2)),
+        Ma2Note(144, 'SI_', False, False, (2, 0, 96, 4), True),
+    ]
+
+
+def test_parse_slide_break_makes_chain_a_break():
+    for branch in ('-3-5[8:1]b', '-3b-5[8:1]', '-3[8:1]b-5[8:1]'):
+        notes = parse_slide(1, branch, 0, BPM)
+        assert [(note.is_break, note.is_connected) for note in notes] == [(True, False), (False, True)]
+
+
+def test_parse_slide_needs_a_duration():
+    with pytest.raises(ValueError):
+        parse_slide(1, '-5', 0, BPM)
+    with pytest.raises(ValueError):
+        parse_slide(1, '-5[8:1]-3', 0, BPM)
+
+
+@pytest.mark.parametrize('shape, start, end, mid, kind', [
+    ('-', 1, 5, None, 'SI_'),
+    ('v', 1, 4, None, 'SV_'),
+    ('w', 1, 5, None, 'SF_'),
+    ('p', 1, 5, None, 'SUL'),
+    ('q', 1, 5, None, 'SUR'),
+    ('pp', 1, 5, None, 'SXL'),
+    ('qq', 1, 5, None, 'SXR'),
+    ('s', 1, 5, None, 'SSL'),
+    ('z', 1, 5, None, 'SSR'),
+    ('^', 1, 3, None, 'SCR'),
+    ('^', 3, 1, None, 'SCL'),
+    ('^', 7, 1, None, 'SCR'),
+    ('^', 1, 6, None, 'SCL'),
+    ('>', 1, 5, None, 'SCR'),
+    ('>', 8, 5, None, 'SCR'),
+    ('>', 3, 7, None, 'SCL'),
+    ('<', 2, 5, None, 'SCL'),
+    ('<', 5, 1, None, 'SCR'),
+    ('V', 1, 5, 3, 'SLR'),
+    ('V', 1, 5, 7, 'SLL'),
+])
+def test_slide_kind(shape, start, end, mid, kind):
+    assert slide_kind(shape, start, end, mid) == kind
+
+
+@pytest.mark.parametrize('shape, start, end, mid', [
+    ('^', 1, 5, None),
+    ('^', 1, 1, None),
+    ('V', 1, 5, 2),
+    ('?', 1, 5, None),
+])
+def test_slide_kind_rejects_invalid_slides(shape, start, end, mid):
+    with pytest.raises(ValueError):
+        slide_kind(shape, start, end, mid)
+
+
+@pytest.mark.parametrize('duration, bpm, ticks', [
+    ('4:1', 120, 96),
+    ('8:3', 120, 144),
+    ('1:2', 120, 768),
+    ('3:1', 120, 128),
+    ('12:1', 120, 32),
+    # at another BPM
+    ('150#4:1', 200, 128),
+    ('#4:1', 200, 96),
+    # in seconds
+    ('#1.5', 120, 288),
+    ('#0.1', 190, 30),
+])
+def test_parse_length(duration, bpm, ticks):
+    assert parse_length(duration, Fraction(bpm)) == ticks
+
+
+def test_notes_at_the_same_time_are_ordered_like_the_converter():
+    _, notes = parse_simai('(120){4}1?-5[8:1]/6-2[8:1]/7h[4:1]/A1/3$,')
+    assert [note.kind for note in notes] == ['TTP', 'HLD', 'STR', 'STR', 'SI_', 'SI_']
+    assert [note.values[0] for note in notes] == [0, 6, 5, 2, 5, 0]
+
+
+def test_pseudo_each_notes_follow_one_tick_apart():
+    _, notes = parse_simai('(120){4}1`2/3`4,5')
+    assert [(note.time, note.values[0]) for note in notes] == [(0, 0), (1, 1), (1, 2), (2, 3), (96, 4)]
+
+
+def test_step_in_seconds_before_bpm():
+    with pytest.raises(ValueError, match='first BPM'):
+        parse_simai('{#0.5},(120)1,')
+
+
+def test_notes_before_bpm():
+    with pytest.raises(ValueError, match='first BPM'):
+        parse_simai('{4}1,(120)2,')
+
+
+def test_note_counts_follow_written_note_types():
+    _, notes = parse_simai('(120){4}1bh[4:1]/2-6[8:1]b,3-5-7[8:1],4b/A1,')
+    # ma2 1.03 writes break holds and break slides as holds and slides
+    assert note_counts(notes, 'Ma2') == {'TAP': 3, 'BRK': 1, 'HLD': 1, 'SLD': 2, 'ALL': 7}
+    assert note_counts(notes, 'Ma2_104') == {'TAP': 3, 'BRK': 3, 'HLD': 0, 'SLD': 1, 'ALL': 7}
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pytest
+
+from compiler import compile_simai
+from ma2 import BPM_SECTION, NOTE_SECTION, RESOLUTION, Ma2Document, seconds_to_ticks
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+CHART = '(120){4}1,2h[4:1]/A1,{8}3-7[8:1],4,{4}5,(240)6,7,E'
+
+
+def read_golden(name: str) -> str:
+    with open(os.path.join(GOLDEN_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name', ['example.Ma2.ma2', 'example.Ma2_104.ma2', 'features.Ma2_104.ma2'])
+def test_round_trip(name):
+    text = read_golden(name)
+    document = Ma2Document.from_text(text)
+    assert len(document) == len(text.split('\n\n')[NOTE_SECTION].split('\n'))
+    assert document.to_text() == text
+
+
+def test_write(tmp_path):
+    text = compile_simai(CHART)
+    path = str(tmp_path / 'chart.ma2')
+    Ma2Document.from_text(text).write(path)
+    assert Ma2Document.read(path).to_text() == text
+
+
+def test_shift_moves_notes_only():
+    text = compile_simai(CHART)
+    document = Ma2Document.from_text(text)
+    times = document.times
+
+    document.shift(RESOLUTION + 100)
+    assert np.array_equal(document.times, times + RESOLUTION + 100)
+
+    shifted = document.to_text().split('\n\n')
+    sections = text.split('\n\n')
+    assert [section for i, section in enumerate(shifted) if i != NOTE_SECTION] == [
+        section for i, section in enumerate(sections) if i != NOTE_SECTION
+    ]
+    # each note keeps its type and values
+    lines = [line.split('\t') for line in sections[NOTE_SECTION].split('\n')]
+    shifted_lines = [line.split('\t') for line in shifted[NOTE_SECTION].split('\n')]
+    assert [line[:1] + line[3:] for line in shifted_lines] == [line[:1] + line[3:] for line in lines]
+    assert shifted_lines[0][:3] == ['TAP', '1', '100']
+    assert shifted_lines[1][:3] == ['TTP', '1', '196']
+
+
+def test_shift_before_start():
+    document = Ma2Document.from_text(compile_simai(CHART))
+    document.shift(-100)
+    assert document.bars[0] == -1
+    assert document.ticks[0] == RESOLUTION - 100
+    assert document.to_text().split('\n\n')[NOTE_SECTION].startswith(f'TAP\t-1\t{RESOLUTION - 100}\t0')
+
+
+def test_shift_seconds():
+    text = compile_simai(CHART)
+    document = Ma2Document.from_text(text)
+    times = document.times
+
+    # a bar at 120 BPM is 2 seconds
+    assert document.shift_seconds(1.25, 120) == RESOLUTION * 5 // 8
+    assert np.array_equal(document.times, times + RESOLUTION * 5 // 8)
+    assert document.to_text().split('\n\n')[BPM_SECTION] == text.split('\n\n')[BPM_SECTION]
+
+
+def test_seconds_to_ticks():
+    assert seconds_to_ticks(2, 120) == RESOLUTION
+    assert seconds_to_ticks(-0.5, 120) == -RESOLUTION // 4
+    assert seconds_to_ticks(0.001, 120) == 0
+
+
+def test_stats():
+    stats = Ma2Document.from_text(compile_simai(CHART)).stats()
+    assert (stats.taps, stats.holds, stats.slides, stats.touches, stats.breaks) == (6, 1, 1, 1, 0)
+    assert stats.total == 9
+    assert stats.first_bar == 0
+    assert stats.bar_counts.tolist() == [7, 2]
+    # a bar at 120 BPM, then a beat at 240 BPM
+    assert stats.duration == pytest.approx(2.25)
+
+
+def test_stats_count_chains_once():
+    stats = Ma2Document.from_text(compile_simai('(120){4}1-3-5[8:1]b,2,E', 'Ma2_104')).stats()
+    assert (stats.taps, stats.breaks, stats.total) == (2, 1, 3)
+
+
+def test_stats_duration_after_shift():
+    document = Ma2Document.from_text(compile_simai(CHART))
+    document.shift_seconds(1.25, 120)
+    stats = document.stats()
+    assert stats.duration == pytest.approx(2.25 + 1.25)
+
+    document.shift_seconds(-4, 120)
+    stats = document.stats()
+    assert stats.first_bar == -2
+    assert stats.bar_counts.tolist() == [3, 6]
+    assert stats.duration == pytest.approx(2.25 + 1.25 - 4)
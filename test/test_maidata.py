@@ -0,0 +1,70 @@
+import pytest
+
+from maidata import Maidata, parse_maidata, read_maidata
+
+
+def test_values():
+    maidata = parse_maidata('&title=Song \n&artist=Artist\n&wholebpm=190\n&first=1.5\n&first_3=-0.25\n'
+                            '&des=Charter\n&des_5=Other\n&lv_5=13+\n&inote_5=(190){4}1,\n2,\nE\n&cabinet=DX\n')
+    assert maidata == Maidata(
+        title='Song',
+        artist='Artist',
+        wholebpm='190',
+        first=1.5,
+        firsts={3: -0.25},
+        des={-1: 'Charter', 5: 'Other'},
+        levels={5: '13+'},
+        charts={5: '(190){4}1,2,E'},
+    )
+    assert maidata.chart_bpm(5) == '190'
+
+
+@pytest.mark.parametrize('key', [
+    'title', 'artist', 'smsg', 'smsg_2', 'des', 'des_2', 'freemsg', 'first', 'first_2', 'PVStart', 'PVEnd',
+    'wholebpm', 'clock_count', 'lv_2', 'inote_2', 'amsg_first', 'amsg_time', 'amsg_content', 'demo_seek',
+    'demo_len', 'cabinet',
+])
+def test_empty_values(key):
+    maidata = parse_maidata(f'&{key}=\n&title=Song\n')
+    assert maidata.title == 'Song'
+    assert maidata.first == 0
+    assert maidata.firsts == {}
+    assert maidata.wholebpm is None
+
+
+@pytest.mark.parametrize('value', ['1', '-1', '1.5', '-0.5'])
+def test_amsg_first_numbers(value):
+    assert parse_maidata(f'&amsg_first={value}\n&title=Song\n').title == 'Song'
+
+
+def test_chart_comments():
+    maidata = parse_maidata('&inote_5=(120){4}1,2,3,4,||first bar\n|| whole line\n5,6,7,8,\nE')
+    assert maidata.charts == {5: '(120){4}1,2,3,4,5,6,7,8,E'}
+
+
+@pytest.mark.parametrize('text', ['&first=1.5 \n', '&first= 1.5\n', '&first=\t1.5\t\n'])
+def test_spaces_around_numbers(text):
+    assert parse_maidata(text + '&title=Song\n').first == 1.5
+
+
+@pytest.mark.parametrize('key', ['PVStart', 'PVEnd', 'clock_count', 'amsg_first', 'demo_seek', 'demo_len'])
+@pytest.mark.parametrize('value', ['-1', ' 2.5 ', '3'])
+def test_ignored_numbers(key, value):
+    assert parse_maidata(f'&{key}={value}\n&title=Song\n').title == 'Song'
+
+
+def test_text_before_first_key():
+    maidata = parse_maidata('made with an editor\n\nnotes: 1 & 2\n&title=Song\n&first=2\n')
+    assert (maidata.title, maidata.first) == ('Song', 2)
+
+
+def test_read_maidata(tmp_path):
+    text = ('notes\n&title=A&B\n&first=0.5\n&inote_5=(120){4}1,\n\n2,\nE\n&lv_5=13\n'
+            '&amsg_content=┃a\n┃b\n&des=Charter\n')
+    path = tmp_path / 'maidata.txt'
+    path.write_text('﻿' + text, encoding='utf-8')
+    maidata = read_maidata(str(path))
+    assert maidata == parse_maidata(text)
+    assert maidata.title == 'A&B'
+    assert maidata.charts == {5: '(120){4}1,2,E'}
+    assert maidata.des == {-1: 'Charter'}
@@ -0,0 +1,68 @@
+import os
+
+from registry import IdRegistry
+
+
+def read_rows(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return [line.rstrip('\r\n').split('\t') for line in f]
+
+
+def test_assigns_ids_in_order(tmp_path):
+    path = str(tmp_path / 'ids.tsv')
+    registry = IdRegistry(path, 1000).load()
+    assert registry.get_many(['a', 'b']) == [1000, 1001]
+    assert registry.get('c') == 1002
+    assert registry.get('a') == 1000
+    assert read_rows(path) == [['id', 'name'], ['1000', 'a'], ['1001', 'b'], ['1002', 'c']]
+
+    reloaded = IdRegistry(path, 1000).load()
+    assert reloaded.ids == {'a': 1000, 'b': 1001, 'c': 1002}
+    assert reloaded.get('d') == 1003
+
+
+def test_repeated_names_get_one_id(tmp_path):
+    path = str(tmp_path / 'ids.tsv')
+    registry = IdRegistry(path, 1).load()
+    assert registry.get_many(['a', 'b', 'a', 'a', 'b']) == [1, 2, 1, 1, 2]
+    assert read_rows(path) == [['id', 'name'], ['1', 'a'], ['2', 'b']]
+
+
+def test_first_row_of_a_name_wins(tmp_path):
+    path = tmp_path / 'ids.tsv'
+    path.write_text('id\tname\n5\ta\n7\ta\n6\tb\n', encoding='utf-8')
+    registry = IdRegistry(str(path), 1).load()
+    assert registry.ids == {'a': 5, 'b': 6}
+    assert registry.get('c') == 8
+
+
+def test_reads_files_with_bom(tmp_path):
+    path = tmp_path / 'ids.tsv'
+    path.write_text('﻿id\tname\r\n3\ta\r\n', encoding='utf-8')
+    assert IdRegistry(str(path), 1).load().ids == {'a': 3}
+
+
+def test_leaves_partly_written_rows(tmp_path):
+    path = str(tmp_path / 'ids.tsv')
+    with open(path, 'wb') as f:
+        f.write(b'id\tname\n1\ta\n2\tb')
+    registry = IdRegistry(path, 1).load()
+    assert registry.ids == {'a': 1}
+
+    with open(path, 'ab') as f:
+        f.write(b'cd' + os.linesep.encode())
+    registry.load()
+    assert registry.ids == {'a': 1, 'bcd': 2}
+    assert registry.max_id == 2
+
+
+def test_registries_sharing_a_file(tmp_path):
+    path = str(tmp_path / 'ids.tsv')
+    first = IdRegistry(path, 1).load()
+    second = IdRegistry(path, 1).load()
+
+    assert first.get_many(['a', 'b']) == [1, 2]
+    # second hasn't seen first's rows, it reads them before assigning
+    assert second.get_many(['b', 'c']) == [2, 3]
+    assert first.get_many(['c', 'd']) == [3, 4]
+    assert IdRegistry(path, 1).load().ids == {'a': 1, 'b': 2, 'c': 3, 'd': 4}
@@ -2,28 +2,33 @@ from lark import Lark, Transformer
 
 class SimaiTransformer(Transformer):
     def title(self, n):
-        n = n[0]
+        n = n[0] or ""
         return {"type": "title", "value": n.rstrip()}
 
     def artist(self, n):
-        n = n[0]
+        n = n[0] or ""
         return {"type": "artist", "value": n.rstrip()}
 
     def smsg(self, n):
         pass
 
     def des(self, n):
-        if len(n) == 2:
-            num, des = n
-            return {"type": "des", "value": (int(num), str(des))}
+        num, des = n
+        des = "" if des is None else str(des).rstrip()
+        if num is not None:
+            return {"type": "des", "value": (int(num), des)}
         else:
-            return {"type": "des", "value": (-1, str(n[0]))}
+            return {"type": "des", "value": (-1, des)}
 
     def freemsg(self, n):
         pass
 
     def first(self, n):
-        return {"type": "wholebpm", "value": float(n[0])}
+        num, first = n
+        first = (first or "").strip()
+        if not first:
+            return None
+        return {"type": "first", "value": (-1 if num is None else int(num), float(first))}
 
     def pvstart(self, n):
         pass
@@ -32,18 +37,21 @@ class SimaiTransformer(Transformer):
         pass
 
     def wholebpm(self, n):
-        return {"type": "wholebpm", "value": int(n[0])}
+        wholebpm = (n[0] or "").rstrip()
+        return {"type": "wholebpm", "value": wholebpm or None}
 
     def level(self, n):
         num, level = n
+        level = level or ""
         return {"type": "level", "value": (int(num), level.rstrip())}
 
     def chart(self, n):
         num, raw_chart = n
+        raw_chart = raw_chart or ""
         chart = ""
         for x in raw_chart.splitlines():
-            if "||" not in x:
-                chart += x
+            # comments run from || to the end of the line
+            chart += x.split("||", 1)[0]
 
         chart = "".join(chart.split())
         return {"type": "chart", "value": (int(num), chart)}
@@ -63,6 +71,9 @@ class SimaiTransformer(Transformer):
     def demo_len(self, n):
         pass
 
+    def other(self, n):
+        pass
+
     def chain(self, values):
         result = []
         for value in values: